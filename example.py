@@ -1,111 +1,17 @@
-import copy
 import dataclasses
 
 import harvest
-from harvest import Settings
+import harvest_sweep
+from harvest_presets import EXAMPLE_SWEEPS, WANDERING_PATH_ATLAS_SETTINGS
 import matplotlib.pyplot as plt
 
-BASE_NO_ATLAS_SETTINGS = Settings(
-    bumper_crop=False,
-    bountiful_harvest=False,
-    heart_of_the_grove=False,
-    doubling_season=False,
-    crop_rotation=False,
-    increased_t3_crop_chance=0,
-    increased_quantity_of_lifeforce=0,
-    duplicated_monsters_chance=0,
-    additional_sacred_grove_chance=0,
-    additional_extra_content_chance=0,
-    reduced_blue_chance=0,
-    reduced_purple_chance=0,
-    reduced_yellow_chance=0,
-    increased_quantity=0,
-    increased_map_modifier_effect=0,
-    stream_of_consciousness=False
-)
-
-REGULAR_ATLAS_SETTINGS = Settings(
-    reduced_blue_chance=45,
-    reduced_purple_chance=45,
-    reduced_yellow_chance=0,
-    bumper_crop=True,
-    bountiful_harvest=True,
-    heart_of_the_grove=True,
-    doubling_season=True,
-    increased_t3_crop_chance=30,
-    increased_quantity_of_lifeforce=18,
-    duplicated_monsters_chance=6,
-    additional_sacred_grove_chance=45,
-    additional_extra_content_chance=14,
-    increased_quantity=15,
-    increased_map_modifier_effect=30,
-    increased_pack_size=0,
-    stream_of_consciousness=True
-)
-
-GRAND_DESIGN_ATLAS_SETTINGS = Settings(
-    bumper_crop=True,
-    bountiful_harvest=True,
-    heart_of_the_grove=True,
-    doubling_season=True,
-    increased_t3_crop_chance=0,
-    increased_quantity_of_lifeforce=0,
-    duplicated_monsters_chance=0,
-    additional_sacred_grove_chance=15,
-    additional_extra_content_chance=8,
-    reduced_blue_chance=25,
-    reduced_purple_chance=25,
-    reduced_yellow_chance=0,
-    increased_quantity=0,
-    increased_map_modifier_effect=0,
-    increased_pack_size=40,
-    stream_of_consciousness=True
-)
-
-WANDERING_PATH_ATLAS_SETTINGS = Settings(
-    bumper_crop=False,
-    bountiful_harvest=False,
-    heart_of_the_grove=False,
-    doubling_season=False,
-    increased_t3_crop_chance=60,
-    increased_quantity_of_lifeforce=36,
-    duplicated_monsters_chance=12,
-    additional_sacred_grove_chance=60,
-    additional_extra_content_chance=0,
-    reduced_blue_chance=40,
-    reduced_purple_chance=40,
-    reduced_yellow_chance=0,
-    increased_quantity=30,
-    increased_map_modifier_effect=60,
-    stream_of_consciousness=True
-)
-
-
 def base_comparison():
-    map_quantities = list(range(0, 130, 10))
-    regular_values = []
-    grand_design_values = []
-    wandering_path_values = []
-    for map_quantity in map_quantities:
-        regular_atlas_settings = copy.copy(REGULAR_ATLAS_SETTINGS)
-        regular_atlas_settings.base_map_quantity = map_quantity
-        regular_atlas_settings.guaranteed_harvest_spawn = True
-        regular_atlas_settings.yellow_sextant = True
-        regular_atlas_settings.fragment_pack_size = 40
-        regular_values.append(harvest.get_overall_map_value(regular_atlas_settings))
-        wandering_path_settings = copy.copy(WANDERING_PATH_ATLAS_SETTINGS)
-        wandering_path_settings.base_map_quantity = map_quantity
-        wandering_path_settings.guaranteed_harvest_spawn = True
-        wandering_path_settings.yellow_sextant = True
-        wandering_path_settings.fragment_pack_size = 40
-        # wandering_path_settings.increased_map_modifier_effect = 0
-        wandering_path_values.append(harvest.get_overall_map_value(wandering_path_settings))
-        grand_design_settings = copy.copy(GRAND_DESIGN_ATLAS_SETTINGS)
-        grand_design_settings.base_map_quantity = map_quantity
-        grand_design_settings.guaranteed_harvest_spawn = True
-        grand_design_settings.yellow_sextant = True
-        grand_design_settings.fragment_pack_size = 40
-        grand_design_values.append(harvest.get_overall_map_value(grand_design_settings))
+    presets, axes = EXAMPLE_SWEEPS["base_comparison"]
+    map_quantities = axes["base_map_quantity"]
+    results = harvest_sweep.sweep(presets, axes)
+    regular_values = results.where(preset="Regular Tree").values
+    wandering_path_values = results.where(preset="Wandering Path").values
+    grand_design_values = results.where(preset="Grand Design").values
     plt.plot(map_quantities, regular_values, marker='x', label="Regular Tree")
     plt.plot(map_quantities, wandering_path_values, marker='o', label="Wandering Path")
     plt.plot(map_quantities, grand_design_values, marker='+', label="Grand Design")
@@ -126,23 +32,11 @@ def base_comparison():
 
 
 def t3_comparison():
-    map_quantities = list(range(0, 130, 10))
-    regular_values = []
-    t3_values = []
-    for map_quantity in map_quantities:
-        regular_atlas_settings = copy.copy(GRAND_DESIGN_ATLAS_SETTINGS)
-        regular_atlas_settings.base_map_quantity = map_quantity
-        regular_atlas_settings.guaranteed_harvest_spawn = True
-        regular_atlas_settings.purple_sextant = True
-        regular_atlas_settings.fragment_pack_size = 28
-        regular_values.append(harvest.get_overall_map_value(regular_atlas_settings))
-        t3_settings = copy.copy(REGULAR_ATLAS_SETTINGS)
-        t3_settings.base_map_quantity = map_quantity
-        t3_settings.guaranteed_harvest_spawn = True
-        t3_settings.purple_sextant = True
-        t3_settings.fragment_pack_size = 28
-        t3_settings.increased_t3_crop_chance = 0
-        t3_values.append(harvest.get_overall_map_value(t3_settings))
+    presets, axes = EXAMPLE_SWEEPS["t3_comparison"]
+    map_quantities = axes["base_map_quantity"]
+    results = harvest_sweep.sweep(presets, axes)
+    regular_values = results.where(preset="Regular Tree").values.tolist()
+    t3_values = results.where(preset="No T3 small passives").values.tolist()
     print(regular_values)
     print(t3_values)
     plt.plot(map_quantities, regular_values, marker='x', label="Regular Tree")
@@ -163,22 +57,11 @@ def t3_comparison():
 
 
 def sextant_comparison():
-    map_quantities = list(range(0, 130, 10))
-    regular_values = []
-    t3_values = []
-    for map_quantity in map_quantities:
-        regular_atlas_settings = copy.copy(WANDERING_PATH_ATLAS_SETTINGS)
-        regular_atlas_settings.base_map_quantity = map_quantity
-        regular_atlas_settings.guaranteed_harvest_spawn = True
-        regular_atlas_settings.purple_sextant = True
-        regular_atlas_settings.fragment_pack_size = 28
-        regular_values.append(harvest.get_overall_map_value(regular_atlas_settings))
-        t3_settings = copy.copy(WANDERING_PATH_ATLAS_SETTINGS)
-        t3_settings.base_map_quantity = map_quantity
-        t3_settings.guaranteed_harvest_spawn = True
-        t3_settings.yellow_sextant = True
-        t3_settings.fragment_pack_size = 28
-        t3_values.append(harvest.get_overall_map_value(t3_settings))
+    presets, axes = EXAMPLE_SWEEPS["sextant_comparison"]
+    map_quantities = axes["base_map_quantity"]
+    results = harvest_sweep.sweep(presets, axes)
+    regular_values = results.where(sextant="purple").values.tolist()
+    t3_values = results.where(sextant="yellow").values.tolist()
     print(regular_values)
     print(t3_values)
     plt.plot(map_quantities, regular_values, marker='x', label="Purple Sextant")
@@ -198,43 +81,14 @@ def sextant_comparison():
     plt.show()
 
 def scarab_comparison():
-    map_quantities = list(range(80, 130, 10))
-    regular_values = []
-    rusted_values = []
-    polished_values = []
-    gilded_values = []
-    sacrifice_values = []
-    base_settings = WANDERING_PATH_ATLAS_SETTINGS
-    for map_quantity in map_quantities:
-        regular_atlas_settings = copy.copy(base_settings)
-        regular_atlas_settings.base_map_quantity = map_quantity
-        regular_atlas_settings.guaranteed_harvest_spawn = True
-        regular_atlas_settings.yellow_sextant = True
-        regular_values.append(harvest.get_overall_map_value(regular_atlas_settings))
-        rusted_atlas_settings = copy.copy(base_settings)
-        rusted_atlas_settings.base_map_quantity = map_quantity
-        rusted_atlas_settings.guaranteed_harvest_spawn = True
-        rusted_atlas_settings.yellow_sextant = True
-        rusted_atlas_settings.fragment_pack_size = 20
-        rusted_values.append(harvest.get_overall_map_value(rusted_atlas_settings))
-        polished_atlas_settings = copy.copy(base_settings)
-        polished_atlas_settings.base_map_quantity = map_quantity
-        polished_atlas_settings.guaranteed_harvest_spawn = True
-        polished_atlas_settings.yellow_sextant = True
-        polished_atlas_settings.fragment_pack_size = 28
-        polished_values.append(harvest.get_overall_map_value(polished_atlas_settings))
-        gilded_atlas_settings = copy.copy(base_settings)
-        gilded_atlas_settings.base_map_quantity = map_quantity
-        gilded_atlas_settings.guaranteed_harvest_spawn = True
-        gilded_atlas_settings.yellow_sextant = True
-        gilded_atlas_settings.fragment_pack_size = 40
-        gilded_values.append(harvest.get_overall_map_value(gilded_atlas_settings))
-        sacrifice_atlas_settings = copy.copy(base_settings)
-        sacrifice_atlas_settings.base_map_quantity = map_quantity
-        sacrifice_atlas_settings.guaranteed_harvest_spawn = True
-        sacrifice_atlas_settings.yellow_sextant = True
-        sacrifice_atlas_settings.fragment_quantity = 20
-        sacrifice_values.append(harvest.get_overall_map_value(sacrifice_atlas_settings))
+    presets, axes = EXAMPLE_SWEEPS["scarab_comparison"]
+    map_quantities = axes["base_map_quantity"]
+    results = harvest_sweep.sweep(presets, axes)
+    regular_values = results.where(preset="No Fragments").values
+    rusted_values = results.where(preset="Rusted Scarabs").values
+    polished_values = results.where(preset="Polished Scarabs").values
+    gilded_values = results.where(preset="Gilded Scarabs").values
+    sacrifice_values = results.where(preset="Sacrifice Fragments").values
     plt.plot(map_quantities, regular_values, marker='x', label="No Fragments")
     plt.plot(map_quantities, rusted_values, marker='o', label="Rusted Scarabs")
     plt.plot(map_quantities, polished_values, marker='+', label="Polished Scarabs")
@@ -247,35 +101,17 @@ def scarab_comparison():
     plt.show()
 
 def yellow_sextant_profit():
-    map_quantities = list(range(0, 130, 10))
-    regular_values = []
-    grand_design_values = []
-    wandering_path_values = []
-    for map_quantity in map_quantities:
-        regular_atlas_settings = copy.copy(REGULAR_ATLAS_SETTINGS)
-        regular_atlas_settings.base_map_quantity = map_quantity
-        regular_atlas_settings.guaranteed_harvest_spawn = True
-        regular_atlas_settings.fragment_pack_size = 28
-        without_sextant = harvest.get_overall_map_value(regular_atlas_settings)
-        regular_atlas_settings.yellow_sextant = True
-        with_sextant = harvest.get_overall_map_value(regular_atlas_settings)
-        regular_values.append(with_sextant - without_sextant)
-        wandering_path_settings = copy.copy(WANDERING_PATH_ATLAS_SETTINGS)
-        wandering_path_settings.base_map_quantity = map_quantity
-        wandering_path_settings.guaranteed_harvest_spawn = True
-        wandering_path_settings.fragment_pack_size = 28
-        without_sextant = harvest.get_overall_map_value(wandering_path_settings)
-        wandering_path_settings.yellow_sextant = True
-        with_sextant = harvest.get_overall_map_value(wandering_path_settings)
-        wandering_path_values.append(with_sextant - without_sextant)
-        grand_design_settings = copy.copy(GRAND_DESIGN_ATLAS_SETTINGS)
-        grand_design_settings.base_map_quantity = map_quantity
-        grand_design_settings.guaranteed_harvest_spawn = True
-        grand_design_settings.fragment_pack_size = 28
-        without_sextant = harvest.get_overall_map_value(grand_design_settings)
-        grand_design_settings.yellow_sextant = True
-        with_sextant = harvest.get_overall_map_value(grand_design_settings)
-        grand_design_values.append(with_sextant - without_sextant)
+    presets, axes = EXAMPLE_SWEEPS["yellow_sextant_profit"]
+    map_quantities = axes["base_map_quantity"]
+    results = harvest_sweep.sweep(presets, axes)
+    profits = {}
+    for preset in presets:
+        with_sextant = results.where(preset=preset, sextant="yellow").values
+        without_sextant = results.where(preset=preset, sextant=None).values
+        profits[preset] = with_sextant - without_sextant
+    regular_values = profits["Regular Tree"]
+    wandering_path_values = profits["Wandering Path"]
+    grand_design_values = profits["Grand Design"]
     plt.plot(map_quantities, regular_values, marker='x', label="Regular Tree")
     plt.plot(map_quantities, wandering_path_values, marker='o', label="Wandering Path")
     plt.plot(map_quantities, grand_design_values, marker='+', label="Grand Design")
@@ -1,11 +1,14 @@
-from collections import defaultdict
-from typing import Tuple
+from typing import Optional, Sequence, Tuple
 from dataclasses import dataclass
-import scipy
-import itertools
+import dataclasses
+import functools
+import sys
 import numpy as np
 
+from harvest_cache import LRUCache
+
 PACK_SIZE_MULTIPLIER = 1/2.6
+SEEDS_PER_PLOT = 23
 
 @dataclass
 class Settings:
@@ -87,14 +90,144 @@ class Settings:
     t2_crop_rotation_upgrade_chance: float = 0.20
     t3_crop_rotation_upgrade_chance: float = 0.03
 
+    def frozen(self, fields: Optional[Sequence[str]] = None) -> tuple:
+        """
+        Get a hashable snapshot of these settings, for use as a cache key
+        :param fields: The names of the fields to include (every field by default)
+        :return: A tuple of (field name, value) pairs
+        """
+        if fields is None:
+            fields = SETTINGS_FIELDS
+        return tuple((name, getattr(self, name)) for name in fields)
+
+
+SETTINGS_FIELDS = tuple(field.name for field in dataclasses.fields(Settings))
+COLOR_VALUE_FIELDS = ("yellow_value", "purple_value", "blue_value")
+PRICE_FIELDS = COLOR_VALUE_FIELDS + ("sacred_blossom_value",)
+
+# The settings that the seed tiers and the value distribution of a single crop depend on
+SEED_TIER_FIELDS = ("t4_lifeforce", "t3_lifeforce", "t2_lifeforce", "t1_lifeforce",
+                    "t4_dropchance", "t3_dropchance", "t2_dropchance", "t1_dropchance",
+                    "t4_seed_chance", "heart_of_the_grove", "increased_t3_crop_chance",
+                    "t2_binom_n", "t2_binom_p", "t3_binom_n", "t3_binom_p")
+CROP_VALUE_FIELDS = SEED_TIER_FIELDS + ("duplicated_monsters_chance", "increased_quantity_of_lifeforce",
+                                        "doubling_season", "sacred_blossom_value", "sacred_blossom_dropchance")
+# The settings that only affect the chance of a sacred grove, or the number of crop pairs in it
+SPAWN_FIELDS = ("guaranteed_harvest_spawn", "base_sacred_grove_chance", "stream_of_consciousness",
+                "additional_sacred_grove_chance", "additional_extra_content_chance")
+HARVEST_COUNT_FIELDS = ("base_three_harvest_chance", "base_four_harvest_chance", "bumper_crop")
+
+seed_tier_cache = LRUCache("seed_tiers", maxsize=256)
+crop_value_cache = LRUCache("crop_value_distributions", maxsize=4096)
+
 
 @dataclass
 class SeedTier:
     base_drop: float
     drop_chance: float
     is_boss: bool
-    distribution: scipy.stats.rv_discrete
     support: list
+    probabilities: Optional[np.ndarray] = None   # None for T1 seeds, which fill the rest of the plot
+
+    @property
+    def distribution(self):
+        """The number of seeds as a scipy distribution (imports scipy, which the model itself does not need)"""
+        if self.probabilities is None:
+            return None
+        import scipy.stats
+        return scipy.stats.rv_discrete(values=(self.support, self.probabilities))
+
+
+class DiscreteDistribution:
+    """
+    A discrete probability distribution of values (in chaos), stored as a sorted support with probabilities
+
+    If a grid is given, every value is snapped to the nearest multiple of the grid (for example 0.01 chaos), which
+    bounds the size of the support by the range of values rather than by the number of combined outcomes.
+    For compatibility with the older (support, probabilities) tuples, a distribution can be unpacked into its
+    support and probabilities.
+    """
+    __slots__ = ("support", "probabilities", "grid")
+
+    def __init__(self, support, probabilities, grid: Optional[float] = None):
+        support = np.asarray(support, dtype=float)
+        probabilities = np.asarray(probabilities, dtype=float)
+        if grid is not None:
+            support = np.round(support / grid)
+        support, inverse = np.unique(support, return_inverse=True)
+        self.probabilities = np.bincount(inverse.ravel(), weights=probabilities, minlength=len(support))
+        self.support = support * grid if grid is not None else support
+        self.grid = grid
+
+    def __iter__(self):
+        return iter((self.support, self.probabilities))
+
+    def __len__(self):
+        return len(self.support)
+
+    def __repr__(self):
+        return "DiscreteDistribution(size={}, mean={:.4f}, grid={})".format(len(self), self.mean(), self.grid)
+
+    def mean(self) -> float:
+        return float(np.dot(self.support, self.probabilities))
+
+    def variance(self) -> float:
+        return float(np.dot((self.support - self.mean()) ** 2, self.probabilities))
+
+    def std(self) -> float:
+        return float(np.sqrt(self.variance()))
+
+    def cdf(self) -> np.ndarray:
+        return np.cumsum(self.probabilities)
+
+    def quantile(self, q: float) -> float:
+        """Get the smallest value whose cumulative probability is at least q"""
+        cdf = self.cdf()
+        index = np.searchsorted(cdf, q * cdf[-1], side="left")
+        return float(self.support[min(index, len(self) - 1)])
+
+    def read_only(self) -> "DiscreteDistribution":
+        """Prevent the arrays of this distribution from being modified (for example, when it is shared by a cache)"""
+        self.support.flags.writeable = False
+        self.probabilities.flags.writeable = False
+        return self
+
+    def binned(self, grid: float) -> "DiscreteDistribution":
+        """Get this distribution on a fixed grid of values"""
+        return DiscreteDistribution(self.support, self.probabilities, grid)
+
+    def max_of(self, other: "DiscreteDistribution") -> "DiscreteDistribution":
+        """Get the distribution of the maximum of this and an independent other random variable"""
+        max_support, max_pmf = get_max_pmf(self.support, other.support, self.probabilities, other.probabilities)
+        return DiscreteDistribution(max_support, max_pmf, self.grid)
+
+    @staticmethod
+    def maximum(distributions: Sequence["DiscreteDistribution"]) -> "DiscreteDistribution":
+        """Get the distribution of the maximum of any number of independent random variables"""
+        max_support, max_pmf = get_max_pmf_n([distribution.support for distribution in distributions],
+                                              [distribution.probabilities for distribution in distributions])
+        return DiscreteDistribution(max_support, max_pmf, distributions[0].grid)
+
+    def convolve(self, other: "DiscreteDistribution") -> "DiscreteDistribution":
+        """Get the distribution of the sum of this and an independent other random variable"""
+        sum_support, sum_pmf = add_independent_distributions([tuple(self), tuple(other)])
+        return DiscreteDistribution(sum_support, sum_pmf, self.grid)
+
+    @staticmethod
+    def mixture(distributions: Sequence["DiscreteDistribution"], weights) -> "DiscreteDistribution":
+        """
+        Get the distribution of a value drawn from one of the given distributions, chosen at random
+        :param distributions: The distributions to choose from
+        :param weights: The (unnormalized) chance of choosing each distribution
+        :return: The mixture distribution
+        """
+        weights = np.asarray(weights, dtype=float)
+        total_weight = sum(weight * np.sum(distribution.probabilities)
+                           for weight, distribution in zip(weights, distributions))
+        support = np.concatenate([distribution.support for distribution in distributions])
+        probabilities = np.concatenate([weight * distribution.probabilities
+                                        for weight, distribution in zip(weights, distributions)])
+        return DiscreteDistribution(support, probabilities / total_weight, distributions[0].grid)
 
 
 def has_sextant(settings: Settings):
@@ -106,7 +239,7 @@ def get_expected_lifeforce(num_seeds: int, seed_tier: SeedTier, area_iiq: int, p
         expected_monsters = num_seeds * (1 + pack_size / 100)
     else:
         expected_monsters = num_seeds
-    expected_monsters *= (1 + settings.duplicated_monsters_chance / 100)
+    expected_monsters = expected_monsters * (1 + settings.duplicated_monsters_chance / 100)
     lifeforce_mod = 1 + area_iiq / 200 + settings.increased_quantity_of_lifeforce / 100
     lifeforce_per_monster = seed_tier.base_drop * seed_tier.drop_chance * lifeforce_mod
     lifeforce_final_mult = 1.1 if settings.doubling_season else 1.0
@@ -115,35 +248,94 @@ def get_expected_lifeforce(num_seeds: int, seed_tier: SeedTier, area_iiq: int, p
     return lifeforce_per_monster * expected_monsters * lifeforce_final_mult
 
 
-def get_crop_value_distribution_directly(area_iiq: int, pack_size: int, color_value: float, settings: Settings) -> Tuple[np.ndarray, np.ndarray]:
-    # Define the distribution of every seed type
+def get_seed_tiers(settings: Settings) -> Tuple[SeedTier, SeedTier, SeedTier, SeedTier]:
+    """
+    Define the distribution of the number of seeds of every tier in a plot
+    :param settings: The settings
+    :return: The T4, T3, T2 and T1 seed tiers (the number of T1 seeds fills the rest of the plot)
+    """
+    return seed_tier_cache.get_or_compute(settings.frozen(SEED_TIER_FIELDS), lambda: create_seed_tiers(settings))
+
+
+def create_seed_tiers(settings: Settings) -> Tuple[SeedTier, SeedTier, SeedTier, SeedTier]:
     t4_chance = settings.t4_seed_chance
     if settings.heart_of_the_grove:
         t4_chance *= 1.6
-    t4 = SeedTier(settings.t4_lifeforce, settings.t4_dropchance, True, scipy.stats.bernoulli(t4_chance), list(range(2)))
     t3_p = settings.t3_binom_p * (1 + settings.increased_t3_crop_chance / 100)
-    t3 = SeedTier(settings.t3_lifeforce, settings.t3_dropchance, False,
-                  scipy.stats.binom(settings.t3_binom_n, t3_p), list(range(settings.t3_binom_n + 1)))
-    t2 = SeedTier(settings.t2_lifeforce, settings.t2_dropchance, False,
-                  scipy.stats.binom(settings.t2_binom_n, settings.t2_binom_p), list(range(settings.t2_binom_n + 1)))
-    t1 = SeedTier(settings.t1_lifeforce, settings.t1_dropchance, False, None, list(range(24)))
-
-    # Calculate the expected value for every possible number of seeds of each type
-    all_seed_supports = (t4.support, t3.support, t2.support)
-    lifeforce_value_dict = defaultdict(float)
-    for t4_seeds, t3_seeds, t2_seeds in itertools.product(*all_seed_supports):
-        t1_seeds = 23 - (t4_seeds + t3_seeds + t2_seeds)
-        probability = t4.distribution.pmf(t4_seeds) * t3.distribution.pmf(t3_seeds) * t2.distribution.pmf(t2_seeds)
-        expected_lifeforce = 0
-        for num_seeds, tier in [(t4_seeds, t4), (t3_seeds, t3), (t2_seeds, t2), (t1_seeds, t1)]:
-            expected_lifeforce += get_expected_lifeforce(num_seeds, tier, area_iiq, pack_size, settings)
-        expected_lifeforce_value = expected_lifeforce * color_value
-        expected_sacred_value = t4_seeds * settings.sacred_blossom_value * settings.sacred_blossom_dropchance
-        lifeforce_value_dict[expected_lifeforce_value + expected_sacred_value] += probability
-
-    support_probability_pairs = sorted(lifeforce_value_dict.items())
-    value_support, value_probabilities = zip(*support_probability_pairs)
-    return np.array(value_support), np.array(value_probabilities)
+    t4 = SeedTier(settings.t4_lifeforce, settings.t4_dropchance, True, list(range(2)),
+                  get_binomial_pmf(np.arange(2), 1, t4_chance))
+    t3 = SeedTier(settings.t3_lifeforce, settings.t3_dropchance, False, list(range(settings.t3_binom_n + 1)),
+                  get_binomial_pmf(np.arange(settings.t3_binom_n + 1), settings.t3_binom_n, t3_p))
+    t2 = SeedTier(settings.t2_lifeforce, settings.t2_dropchance, False, list(range(settings.t2_binom_n + 1)),
+                  get_binomial_pmf(np.arange(settings.t2_binom_n + 1), settings.t2_binom_n, settings.t2_binom_p))
+    t1 = SeedTier(settings.t1_lifeforce, settings.t1_dropchance, False, list(range(SEEDS_PER_PLOT + 1)))
+    for tier in (t4, t3, t2):
+        tier.probabilities.flags.writeable = False
+    return t4, t3, t2, t1
+
+
+def get_binomial_pmf(k, n, p) -> np.ndarray:
+    """
+    Get the binomial probability mass function (the same as scipy.stats.binom.pmf, without importing scipy)
+    :param k: The numbers of successes
+    :param n: The numbers of trials (whole numbers, even if given as floats)
+    :param p: The success probabilities
+    :return: The probability of every k, broadcasting k, n and p against each other
+    """
+    n = np.asarray(n)
+    if np.any(n < 0) or np.any(n != np.floor(n)):
+        raise ValueError("The number of binomial trials must be a non-negative whole number")
+    k, n, p = np.broadcast_arrays(np.asarray(k, dtype=np.int64), n.astype(np.int64), np.asarray(p, dtype=float))
+    valid = (k >= 0) & (k <= n)
+    k = np.where(valid, k, 0)
+    log_factorials = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, np.max(n, initial=0) + 1)))])
+    # The 0 * log(0) terms of p = 0 and p = 1 are left out
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_pmf = np.where(k > 0, k * np.log(p), 0.0) + np.where(n > k, (n - k) * np.log1p(-p), 0.0)
+    log_pmf += log_factorials[n] - log_factorials[k] - log_factorials[n - k]
+    return np.where(valid, np.exp(log_pmf), 0.0)
+
+
+def add_independent_distributions(distributions) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the distribution of the sum of independent discrete random variables
+
+    The supports are combined with a vectorized outer sum (a convolution over arbitrary supports), merging equal
+    values after every step so that the work scales with the size of the supports.
+    :param distributions: An iterable of (support, probabilities) pairs
+    :return: The sorted support and probabilities of the sum
+    """
+    total_support, total_probabilities = np.zeros(1), np.ones(1)
+    for support, probabilities in distributions:
+        summed_support = np.add.outer(total_support, support).ravel()
+        summed_probabilities = np.multiply.outer(total_probabilities, probabilities).ravel()
+        total_support, inverse = np.unique(summed_support, return_inverse=True)
+        total_probabilities = np.bincount(inverse.ravel(), weights=summed_probabilities, minlength=len(total_support))
+    return total_support, total_probabilities
+
+
+def get_crop_value_distribution_directly(area_iiq: int, pack_size: int, color_value: float, settings: Settings) -> DiscreteDistribution:
+    key = (area_iiq, pack_size, color_value, bool(has_sextant(settings)), settings.frozen(CROP_VALUE_FIELDS))
+    return crop_value_cache.get_or_compute(
+        key, lambda: compute_crop_value_distribution(area_iiq, pack_size, color_value, settings).read_only())
+
+
+def compute_crop_value_distribution(area_iiq: int, pack_size: int, color_value: float, settings: Settings) -> DiscreteDistribution:
+    t4, t3, t2, t1 = get_seed_tiers(settings)
+
+    # Every seed that is not T4, T3 or T2 is T1, so each tier contributes its value in excess of a T1 seed
+    t1_seed_value = get_expected_lifeforce(1, t1, area_iiq, pack_size, settings) * color_value
+    tier_distributions = []
+    for tier in (t4, t3, t2):
+        num_seeds = np.array(tier.support, dtype=float)
+        seed_value = get_expected_lifeforce(num_seeds, tier, area_iiq, pack_size, settings) * color_value
+        if tier is t4:
+            seed_value = seed_value + num_seeds * settings.sacred_blossom_value * settings.sacred_blossom_dropchance
+        tier_distributions.append((seed_value - num_seeds * t1_seed_value, tier.probabilities))
+
+    value_support, value_probabilities = add_independent_distributions(tier_distributions)
+    all_t1_value = get_expected_lifeforce(SEEDS_PER_PLOT, t1, area_iiq, pack_size, settings) * color_value
+    return DiscreteDistribution(value_support + all_t1_value, value_probabilities)
 
 
 def reweight_probabilities_for_sextant_reroll(weights: np.ndarray, settings: Settings) -> np.ndarray:
@@ -176,11 +368,12 @@ def reweight_probabilities_for_sextant_reroll(weights: np.ndarray, settings: Set
     return new_prob
 
 
-def get_random_crop_value_distribution(area_iiq: int, pack_size: int, settings: Settings) -> Tuple[np.ndarray, np.ndarray]:
-    vivid_support, vivid_probabilities = get_crop_value_distribution_directly(area_iiq, pack_size, settings.yellow_value, settings)
-    wild_support, wild_probabilities = get_crop_value_distribution_directly(area_iiq, pack_size, settings.purple_value, settings)
-    primal_support, primal_probabilities = get_crop_value_distribution_directly(area_iiq, pack_size, settings.blue_value, settings)
-    total_support = np.concatenate([vivid_support, wild_support, primal_support])
+def get_random_crop_color_weights(settings: Settings) -> np.ndarray:
+    """
+    Get the (unnormalized) chance of the random crop being each color
+    :param settings: The settings
+    :return: The weight of each color, in the order [yellow, purple, blue]
+    """
     vivid_weight = (1 - settings.reduced_yellow_chance / 100)
     wild_weight = (1 - settings.reduced_purple_chance / 100)
     primal_weight = (1 - settings.reduced_blue_chance / 100)
@@ -188,44 +381,83 @@ def get_random_crop_value_distribution(area_iiq: int, pack_size: int, settings:
     if settings.sextant_reroll_implementation and has_sextant(settings):
         # In this case, the probabilities of the non-guaranteed (random) crop are changed
         all_weights = reweight_probabilities_for_sextant_reroll(all_weights, settings)
-    vivid_probabilities = vivid_probabilities * all_weights[0]
-    wild_probabilities = wild_probabilities * all_weights[1]
-    primal_probabilities = primal_probabilities * all_weights[2]
-    total_probabilities = np.concatenate([vivid_probabilities, wild_probabilities, primal_probabilities])
-    total_probabilities /= np.sum(total_probabilities)
-    new_order = np.argsort(total_support)
-    return total_support[new_order], total_probabilities[new_order]
+    return all_weights
+
+
+def get_random_crop_value_distribution(area_iiq: int, pack_size: int, settings: Settings) -> DiscreteDistribution:
+    vivid = get_crop_value_distribution_directly(area_iiq, pack_size, settings.yellow_value, settings)
+    wild = get_crop_value_distribution_directly(area_iiq, pack_size, settings.purple_value, settings)
+    primal = get_crop_value_distribution_directly(area_iiq, pack_size, settings.blue_value, settings)
+    return DiscreteDistribution.mixture([vivid, wild, primal], get_random_crop_color_weights(settings))
 
 
 def distribute_cdf_to_new_support(old_support, new_support, old_cdf):
-    old_index = 0
-    old_value = old_support[0]
-    old_prob = 0
-    new_cdf = np.zeros_like(new_support, dtype=old_cdf.dtype)
-    for new_index, new_value in enumerate(new_support):
-        while new_value >= old_value:
-            old_index += 1
-            if old_index >= len(old_support):
-                old_value = np.inf
-                old_prob = 1
-            else:
-                old_value = old_support[old_index]
-                old_prob = old_cdf[old_index - 1]
-        new_cdf[new_index] = old_prob
-    return new_cdf
+    """
+    Evaluate a CDF defined on a sorted support at every point of a new sorted support
+    :param old_support: The sorted support that the CDF is defined on
+    :param new_support: The sorted support to evaluate the CDF on
+    :param old_cdf: The CDF at every point of the old support
+    :return: The CDF at every point of the new support
+    """
+    # Index of the first old value larger than each new value; the CDF below the old support is 0 and above it is 1
+    old_index = np.searchsorted(old_support, new_support, side="right")
+    padded_cdf = np.concatenate([[0], old_cdf[:-1], [1]]).astype(old_cdf.dtype)
+    return padded_cdf[old_index]
 
 
-def get_max_pmf(support_1, support_2, pmf_1, pmf_2):
-    combined_support = np.array(sorted(set(support_1).union(set(support_2))))
-    cdf_1 = np.cumsum(pmf_1)
-    cdf_2 = np.cumsum(pmf_2)
-    cdf_1 = distribute_cdf_to_new_support(support_1, combined_support, cdf_1)
-    cdf_2 = distribute_cdf_to_new_support(support_2, combined_support, cdf_2)
-    max_cdf = cdf_1 * cdf_2
+def get_max_pmf_n(supports, pmfs):
+    """
+    Get the distribution of the maximum of any number of independent discrete random variables
+    :param supports: The sorted support of every random variable
+    :param pmfs: The probabilities of every random variable
+    :return: The combined support and the probabilities of the maximum
+    """
+    combined_support = functools.reduce(np.union1d, supports)
+    max_cdf = np.ones(len(combined_support))
+    for support, pmf in zip(supports, pmfs):
+        max_cdf = max_cdf * distribute_cdf_to_new_support(support, combined_support, np.cumsum(pmf))
     max_pmf = np.diff(max_cdf, prepend=0)
     return combined_support, max_pmf
 
 
+def get_max_pmf(support_1, support_2, pmf_1, pmf_2):
+    return get_max_pmf_n([support_1, support_2], [pmf_1, pmf_2])
+
+
+def get_sextant_color_index(settings: Settings) -> int:
+    """Get the color guaranteed by the sextant, as an index into [yellow, purple, blue]"""
+    if settings.blue_sextant:
+        return 2
+    elif settings.yellow_sextant:
+        return 0
+    else:
+        return 1
+
+
+def get_sextant_color_value(settings: Settings) -> float:
+    """Get the lifeforce value of the color guaranteed by the sextant"""
+    return getattr(settings, COLOR_VALUE_FIELDS[get_sextant_color_index(settings)])
+
+
+def get_crop_pair_distributions(area_iiq: int, pack_size: int, settings: Settings) -> Tuple[DiscreteDistribution, DiscreteDistribution]:
+    """
+    Get the value distributions of the two crops of a pair
+    :return: The distribution of the guaranteed (sextant) or random crop, and the distribution of the random crop
+    """
+    random_crop = get_random_crop_value_distribution(area_iiq, pack_size, settings)
+    if has_sextant(settings):
+        other_crop = get_crop_value_distribution_directly(area_iiq, pack_size, get_sextant_color_value(settings),
+                                                          settings)
+    else:
+        other_crop = random_crop
+    return other_crop, random_crop
+
+
+def get_no_wilt_chance(settings: Settings) -> float:
+    """Get the chance (in percent) that the unchosen crop of a pair does not wilt"""
+    return 10 if settings.heart_of_the_grove else 0
+
+
 def get_crop_pair_value(area_iiq: int, pack_size: int, settings: Settings) -> float:
     """
     Get the expected value of a random pair of crops, assuming we harvest the most valuable one
@@ -234,39 +466,52 @@ def get_crop_pair_value(area_iiq: int, pack_size: int, settings: Settings) -> fl
     :param settings: The settings
     :return: The expected value of the crop pair
     """
-    random_crop_support, random_crop_probabilities = get_random_crop_value_distribution(area_iiq, pack_size, settings)
-    no_wilt_chance = 10 if settings.heart_of_the_grove else 0
-    if has_sextant(settings):
-        if settings.blue_sextant:
-            sextant_lifeforce_value = settings.blue_value
-        elif settings.yellow_sextant:
-            sextant_lifeforce_value = settings.yellow_value
-        else:
-            sextant_lifeforce_value = settings.purple_value
-        guaranteed_support, guaranteed_pmf = get_crop_value_distribution_directly(area_iiq, pack_size,
-                                                                                  sextant_lifeforce_value, settings)
-        random_support, random_pmf = random_crop_support, random_crop_probabilities
-        max_support, max_pmf = get_max_pmf(guaranteed_support, random_support, guaranteed_pmf, random_pmf)
-        expected_max_value = np.dot(max_support, max_pmf)
-        expected_guaranteed_value = np.dot(guaranteed_support, guaranteed_pmf)
-        expected_random_value = np.dot(random_support, random_pmf)
-        expected_combined_value = expected_guaranteed_value + expected_random_value
-        total_value = (no_wilt_chance / 100) * expected_combined_value + (1 - no_wilt_chance / 100) * expected_max_value
-    else:
-        value_cdf = np.cumsum(random_crop_probabilities)
-        max_value_cdf = value_cdf * value_cdf
-        max_value_pmf = np.diff(max_value_cdf, prepend=0)
-        expected_crop_value = np.dot(random_crop_support, random_crop_probabilities)
-        expected_max_value = np.dot(random_crop_support, max_value_pmf)
-        total_value = (no_wilt_chance / 100) * expected_crop_value * 2 + (1 - no_wilt_chance / 100) * expected_max_value
+    other_crop, random_crop = get_crop_pair_distributions(area_iiq, pack_size, settings)
+    no_wilt_chance = get_no_wilt_chance(settings)
+    expected_max_value = other_crop.max_of(random_crop).mean()
+    expected_combined_value = other_crop.mean() + random_crop.mean()
+    return (no_wilt_chance / 100) * expected_combined_value + (1 - no_wilt_chance / 100) * expected_max_value
 
-    return total_value
+
+def get_crop_pair_value_distribution(area_iiq: int, pack_size: int, settings: Settings,
+                                     grid: Optional[float] = None) -> DiscreteDistribution:
+    """
+    Get the distribution of the value of a random pair of crops, assuming we harvest the most valuable one
+    :param area_iiq: The increased item quantity of the area
+    :param pack_size: The increased pack size of the area
+    :param settings: The settings
+    :param grid: If given, the values are binned to multiples of the grid (see DiscreteDistribution)
+    :return: The distribution of the value of the crop pair
+    """
+    other_crop, random_crop = get_crop_pair_distributions(area_iiq, pack_size, settings)
+    if grid is not None:
+        other_crop, random_crop = other_crop.binned(grid), random_crop.binned(grid)
+    no_wilt_chance = get_no_wilt_chance(settings)
+    if no_wilt_chance == 0:
+        return other_crop.max_of(random_crop)
+    return DiscreteDistribution.mixture([other_crop.convolve(random_crop), other_crop.max_of(random_crop)],
+                                        [no_wilt_chance / 100, 1 - no_wilt_chance / 100])
+
+
+def get_harvest_count_distribution(settings: Settings) -> DiscreteDistribution:
+    """
+    Get the distribution of the number of crop pairs harvested in a sacred grove
+    :param settings: The settings
+    :return: The distribution of the number of crop pairs (including bumper crop)
+    """
+    harvests = DiscreteDistribution([3, 4], [settings.base_three_harvest_chance, settings.base_four_harvest_chance])
+    if settings.bumper_crop:
+        harvests = harvests.convolve(DiscreteDistribution([0, 1], [0.5, 0.5]))
+    return harvests
 
 
 def get_sacred_grove_value(crop_pair_value, settings: Settings):
-    mean_crop_pairs = settings.base_three_harvest_chance * 3 + settings.base_four_harvest_chance * 4
-    mean_crop_pairs += settings.bumper_crop * 0.5
-    return mean_crop_pairs * crop_pair_value
+    if settings.crop_rotation:
+        # Harvesting a crop changes the value of the remaining crops, so crop pairs are not independent
+        import harvest_rotation
+        area_iiq, pack_size = get_area_stats(settings)
+        return harvest_rotation.get_crop_rotation_grove_value(area_iiq, pack_size, settings)
+    return get_harvest_count_distribution(settings).mean() * crop_pair_value
 
 
 def get_area_stats(settings: Settings):
@@ -291,7 +536,8 @@ def get_harvest_spawn_chance(settings: Settings):
 
 def get_overall_map_value(settings: Settings):
     area_iiq, pack_size = get_area_stats(settings)
-    crop_pair_value = get_crop_pair_value(area_iiq, pack_size, settings)
+    # Crop rotation groves are not made of independent crop pairs, so their value does not use the crop pair value
+    crop_pair_value = None if settings.crop_rotation else get_crop_pair_value(area_iiq, pack_size, settings)
     sacred_grove_value = get_sacred_grove_value(crop_pair_value, settings)
     average_harvest_value = get_harvest_spawn_chance(settings) * sacred_grove_value
     return average_harvest_value
@@ -318,3 +564,18 @@ def set_settings_to_no_atlas(settings: Settings):
     settings.blue_sextant = False
     settings.yellow_sextant = False
     settings.purple_sextant = False
+
+
+def get_cache_info():
+    """Get the hit/miss statistics of every cache used by the model"""
+    return [seed_tier_cache.info(), crop_value_cache.info()]
+
+
+def clear_caches():
+    seed_tier_cache.clear()
+    crop_value_cache.clear()
+
+
+if __name__ == "__main__":
+    import harvest_cli
+    sys.exit(harvest_cli.main())
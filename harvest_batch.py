@@ -0,0 +1,229 @@
+"""
+Vectorized evaluation of harvest.get_overall_map_value for many settings at once
+
+Settings are given either as a list of Settings objects or as a column-oriented mapping from Settings field names to
+arrays (any field that is left out takes its default value). Every scenario is evaluated with broadcast array math
+instead of the per-scenario Python loops in harvest.py, so large sweeps take seconds rather than minutes.
+"""
+from typing import Dict, Mapping, Sequence, Union
+
+import numpy as np
+
+import harvest
+from harvest import Settings, PACK_SIZE_MULTIPLIER, SEEDS_PER_PLOT, SETTINGS_FIELDS
+
+DEFAULT_CHUNK_SIZE = 4096
+
+SettingsTable = Union[Sequence[Settings], Mapping[str, np.ndarray]]
+
+
+def settings_to_columns(settings_list: Sequence[Settings]) -> Dict[str, np.ndarray]:
+    """
+    Convert a list of Settings into a column-oriented table (one array per Settings field)
+    :param settings_list: The settings to convert
+    :return: A dictionary from field name to an array with one entry per settings object
+    """
+    return {name: np.array([getattr(settings, name) for settings in settings_list]) for name in SETTINGS_FIELDS}
+
+
+def complete_columns(columns: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Fill in every missing Settings field with its default value and broadcast all columns to the same length
+    :param columns: A (possibly partial) mapping from Settings field name to a scalar or an array
+    :return: A dictionary with an array of the same length for every Settings field
+    """
+    unknown_fields = set(columns) - set(SETTINGS_FIELDS)
+    if unknown_fields:
+        raise ValueError("Unknown Settings fields: {}".format(", ".join(sorted(unknown_fields))))
+    lengths = {np.size(value) for value in columns.values() if np.ndim(value) > 0}
+    if len(lengths) > 1:
+        raise ValueError("All settings columns must have the same length")
+    num_rows = lengths.pop() if lengths else 1
+    defaults = Settings()
+    completed = {}
+    for name in SETTINGS_FIELDS:
+        default = getattr(defaults, name)
+        value = np.asarray(columns.get(name, default))
+        if isinstance(default, bool):
+            value = value.astype(bool)
+        completed[name] = np.broadcast_to(value, (num_rows,))
+    return completed
+
+
+def get_area_stats_batch(columns: Mapping[str, np.ndarray]):
+    """Vectorized version of harvest.get_area_stats"""
+    scaled_quantity = columns["base_map_quantity"] * (1 + columns["increased_map_modifier_effect"] / 100)
+    area_iiq = np.trunc(scaled_quantity).astype(np.int64)
+    area_iiq = area_iiq + columns["fragment_quantity"] + columns["kirac_craft_quantity"] + \
+        columns["increased_quantity"] + columns["map_quality"]
+    pack_size = np.trunc(scaled_quantity * PACK_SIZE_MULTIPLIER).astype(np.int64)
+    pack_size = pack_size + columns["increased_pack_size"] + columns["fragment_pack_size"]
+    return area_iiq, pack_size
+
+
+def get_harvest_spawn_chance_batch(columns: Mapping[str, np.ndarray]) -> np.ndarray:
+    """Vectorized version of harvest.get_harvest_spawn_chance"""
+    spawn_chance = columns["base_sacred_grove_chance"] * np.where(columns["stream_of_consciousness"], 1.5, 1.0)
+    spawn_chance = spawn_chance + columns["additional_sacred_grove_chance"] / 100
+    spawn_chance = spawn_chance + columns["additional_extra_content_chance"] / 100
+    return np.where(columns["guaranteed_harvest_spawn"], 1.0, spawn_chance)
+
+
+def has_sextant_batch(columns: Mapping[str, np.ndarray]) -> np.ndarray:
+    return columns["yellow_sextant"] | columns["blue_sextant"] | columns["purple_sextant"]
+
+
+def get_seed_grid(columns: Mapping[str, np.ndarray]):
+    """
+    Get the seed counts and probabilities of every (T4, T3, T2) combination for every scenario
+
+    The grid is padded to the largest binomial supports in the table; padded cells have zero probability.
+    :param columns: The complete settings table
+    :return: Arrays of T4, T3 and T2 seed counts of shape (cells,) and the probabilities of shape (rows, cells)
+    """
+    max_t3_n = int(np.max(columns["t3_binom_n"]))
+    max_t2_n = int(np.max(columns["t2_binom_n"]))
+    t4_seeds, t3_seeds, t2_seeds = (grid.ravel() for grid in np.meshgrid(
+        np.arange(2), np.arange(max_t3_n + 1), np.arange(max_t2_n + 1), indexing="ij"))
+
+    t4_chance = columns["t4_seed_chance"] * np.where(columns["heart_of_the_grove"], 1.6, 1.0)
+    t3_p = columns["t3_binom_p"] * (1 + columns["increased_t3_crop_chance"] / 100)
+    t4_pmf = np.where(t4_seeds[None, :] == 1, t4_chance[:, None], 1 - t4_chance[:, None])
+    t3_pmf = harvest.get_binomial_pmf(t3_seeds[None, :], columns["t3_binom_n"][:, None], t3_p[:, None])
+    t2_pmf = harvest.get_binomial_pmf(t2_seeds[None, :], columns["t2_binom_n"][:, None], columns["t2_binom_p"][:, None])
+    return t4_seeds, t3_seeds, t2_seeds, t4_pmf * t3_pmf * t2_pmf
+
+
+def get_seed_lifeforce_batch(columns: Mapping[str, np.ndarray], area_iiq: np.ndarray, pack_size: np.ndarray):
+    """
+    Get the expected lifeforce dropped per seed of every tier (vectorized harvest.get_expected_lifeforce)
+    :return: Arrays of expected lifeforce per T4, T3, T2 and T1 seed, each of shape (rows,)
+    """
+    monster_mult = 1 + columns["duplicated_monsters_chance"] / 100
+    pack_mult = (1 + pack_size / 100) * monster_mult
+    lifeforce_mod = 1 + area_iiq / 200 + columns["increased_quantity_of_lifeforce"] / 100
+    final_mult = np.where(columns["doubling_season"], 1.1, 1.0) * np.where(has_sextant_batch(columns), 2.0, 1.0)
+    common = lifeforce_mod * final_mult
+    t4 = columns["t4_lifeforce"] * columns["t4_dropchance"] * common * monster_mult
+    t3 = columns["t3_lifeforce"] * columns["t3_dropchance"] * common * pack_mult
+    t2 = columns["t2_lifeforce"] * columns["t2_dropchance"] * common * pack_mult
+    t1 = columns["t1_lifeforce"] * columns["t1_dropchance"] * common * pack_mult
+    return t4, t3, t2, t1
+
+
+def get_color_weights_batch(columns: Mapping[str, np.ndarray]) -> np.ndarray:
+    """
+    Get the probability of the random crop being each color, in the order [yellow, purple, blue]
+
+    Vectorized version of the weighting in harvest.get_random_crop_value_distribution, including
+    harvest.reweight_probabilities_for_sextant_reroll.
+    """
+    weights = np.stack([1 - columns["reduced_yellow_chance"] / 100,
+                        1 - columns["reduced_purple_chance"] / 100,
+                        1 - columns["reduced_blue_chance"] / 100], axis=1)
+    probabilities = weights / np.sum(weights, axis=1, keepdims=True)
+    sextant_index = np.select([columns["yellow_sextant"], columns["purple_sextant"], columns["blue_sextant"]],
+                              [0, 1, 2], default=-1)
+    rerolled = columns["sextant_reroll_implementation"] & (sextant_index >= 0)
+    sextant_prob = np.take_along_axis(probabilities, np.maximum(sextant_index, 0)[:, None], axis=1)
+    is_sextant_color = np.arange(3)[None, :] == sextant_index[:, None]
+    rerolled_probabilities = np.where(is_sextant_color, sextant_prob * sextant_prob, 2 * sextant_prob * probabilities)
+    rerolled_probabilities /= np.sum(rerolled_probabilities, axis=1, keepdims=True)
+    return np.where(rerolled[:, None], rerolled_probabilities, probabilities)
+
+
+def get_expected_max(values_1, probabilities_1, values_2, probabilities_2) -> np.ndarray:
+    """
+    Get the expected maximum of two independent discrete random variables, row by row
+    :param values_1: Support of the first variable, shape (rows, n)
+    :param probabilities_1: Probabilities of the first variable, shape (rows, n)
+    :param values_2: Support of the second variable, shape (rows, m)
+    :param probabilities_2: Probabilities of the second variable, shape (rows, m)
+    :return: The expected maximum for every row
+    """
+    values = np.concatenate([values_1, values_2], axis=1)
+    order = np.argsort(values, axis=1, kind="stable")
+    values = np.take_along_axis(values, order, axis=1)
+    zeros_1, zeros_2 = np.zeros_like(probabilities_1), np.zeros_like(probabilities_2)
+    cdf_1 = np.cumsum(np.take_along_axis(np.concatenate([probabilities_1, zeros_2], axis=1), order, axis=1), axis=1)
+    cdf_2 = np.cumsum(np.take_along_axis(np.concatenate([zeros_1, probabilities_2], axis=1), order, axis=1), axis=1)
+    max_pmf = np.diff(cdf_1 * cdf_2, axis=1, prepend=0)
+    return np.sum(values * max_pmf, axis=1)
+
+
+def get_crop_pair_values_batch(columns: Mapping[str, np.ndarray], area_iiq: np.ndarray,
+                               pack_size: np.ndarray) -> np.ndarray:
+    """Vectorized version of harvest.get_crop_pair_value"""
+    t4_seeds, t3_seeds, t2_seeds, cell_probabilities = get_seed_grid(columns)
+    t1_seeds = SEEDS_PER_PLOT - (t4_seeds + t3_seeds + t2_seeds)
+    t4, t3, t2, t1 = get_seed_lifeforce_batch(columns, area_iiq, pack_size)
+    cell_lifeforce = t4[:, None] * t4_seeds + t3[:, None] * t3_seeds + t2[:, None] * t2_seeds + t1[:, None] * t1_seeds
+    cell_sacred = t4_seeds[None, :] * (columns["sacred_blossom_value"] * columns["sacred_blossom_dropchance"])[:, None]
+
+    # Crop values of every color, in the order [yellow, purple, blue]
+    color_values = np.stack([columns["yellow_value"], columns["purple_value"], columns["blue_value"]], axis=1)
+    crop_values = cell_lifeforce[:, None, :] * color_values[:, :, None] + cell_sacred[:, None, :]
+    color_weights = get_color_weights_batch(columns)
+    random_values = crop_values.reshape(len(area_iiq), -1)
+    random_probabilities = (cell_probabilities[:, None, :] * color_weights[:, :, None]).reshape(len(area_iiq), -1)
+    expected_random_value = np.sum(random_values * random_probabilities, axis=1)
+
+    no_wilt_chance = np.where(columns["heart_of_the_grove"], 0.1, 0.0)
+    sextant = has_sextant_batch(columns)
+    total_value = np.empty(len(area_iiq))
+
+    plain = ~sextant
+    if np.any(plain):
+        expected_max_value = get_expected_max(random_values[plain], random_probabilities[plain],
+                                              random_values[plain], random_probabilities[plain])
+        total_value[plain] = no_wilt_chance[plain] * expected_random_value[plain] * 2 + \
+            (1 - no_wilt_chance[plain]) * expected_max_value
+
+    if np.any(sextant):
+        # The guaranteed color follows the same precedence as harvest.get_crop_pair_value
+        guaranteed_index = np.select([columns["blue_sextant"], columns["yellow_sextant"]], [2, 0], default=1)[sextant]
+        guaranteed_values = crop_values[sextant, guaranteed_index]
+        guaranteed_probabilities = cell_probabilities[sextant]
+        expected_max_value = get_expected_max(guaranteed_values, guaranteed_probabilities,
+                                              random_values[sextant], random_probabilities[sextant])
+        expected_combined_value = np.sum(guaranteed_values * guaranteed_probabilities, axis=1) + \
+            expected_random_value[sextant]
+        total_value[sextant] = no_wilt_chance[sextant] * expected_combined_value + \
+            (1 - no_wilt_chance[sextant]) * expected_max_value
+
+    return total_value
+
+
+def get_overall_map_values_for_columns(columns: Mapping[str, np.ndarray]) -> np.ndarray:
+    """Evaluate one chunk of a complete settings table"""
+    area_iiq, pack_size = get_area_stats_batch(columns)
+    crop_pair_value = get_crop_pair_values_batch(columns, area_iiq, pack_size)
+    mean_crop_pairs = columns["base_three_harvest_chance"] * 3 + columns["base_four_harvest_chance"] * 4
+    mean_crop_pairs = mean_crop_pairs + columns["bumper_crop"] * 0.5
+    values = get_harvest_spawn_chance_batch(columns) * mean_crop_pairs * crop_pair_value
+    # Crop rotation groves are not made of independent crop pairs, so they are evaluated one at a time
+    for row in np.flatnonzero(columns["crop_rotation"]):
+        values[row] = harvest.get_overall_map_value(Settings(**{name: column[row].item()
+                                                                for name, column in columns.items()}))
+    return values
+
+
+def get_overall_map_values(settings: SettingsTable, chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Get the value of harvest.get_overall_map_value for every scenario in a table of settings
+    :param settings: Either a list of Settings or a mapping from Settings field names to arrays (struct-of-arrays)
+    :param chunk_size: The number of scenarios evaluated together, which bounds the memory used
+    :return: An array with the expected map value of every scenario
+    """
+    if isinstance(settings, Mapping):
+        columns = complete_columns(settings)
+    else:
+        columns = complete_columns(settings_to_columns(settings)) if len(settings) > 0 else {}
+    if not columns:
+        return np.zeros(0)
+    num_rows = len(columns["base_map_quantity"])
+    values = np.empty(num_rows)
+    for start in range(0, num_rows, chunk_size):
+        chunk = {name: column[start:start + chunk_size] for name, column in columns.items()}
+        values[start:start + chunk_size] = get_overall_map_values_for_columns(chunk)
+    return values
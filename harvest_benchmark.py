@@ -0,0 +1,426 @@
+"""
+Benchmarks of the hot paths of harvest.py, with a local history of results and regression thresholds
+
+Every run times the crop value, random crop, maximum, crop pair (with and without a sextant) and map value functions at
+several seed support sizes (t2_binom_n and t3_binom_n), and replays the comparison sweeps of example.py
+(harvest_presets.EXAMPLE_SWEEPS). Functions that use the caches of harvest.py are timed with empty caches, as the
+sweeps mostly evaluate settings that were not seen before. Every run also checks that the optimized functions (and
+harvest_batch) still give the results of a plain loop implementation of the model, written like the original code
+from the formulas of the model alone.
+
+The cold start of a new interpreter (importing harvest and evaluating one map value) is also timed, and has to stay
+within COLD_START_BUDGET without loading scipy.
+
+A benchmark regresses when it takes longer than the median of its last few passing runs on the same machine by more
+than the threshold. The run is appended to the history file (marked as failed if a benchmark regressed or a check
+failed, so that it is not part of later baselines), and the exit status is 1 if it failed.
+
+Example: python harvest_benchmark.py --threshold 0.2
+"""
+import argparse
+import dataclasses
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+import harvest_batch
+import harvest_sweep
+from harvest import Settings, SEEDS_PER_PLOT
+from harvest_presets import EXAMPLE_SWEEPS, GRAND_DESIGN_ATLAS_SETTINGS, WANDERING_PATH_ATLAS_SETTINGS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY_PATH = os.path.join(BASE_DIR, "benchmark_history.json")
+DEFAULT_THRESHOLD = 0.25   # Relative slowdown that counts as a regression
+DEFAULT_WINDOW = 5   # Number of recent runs whose median is the baseline
+DEFAULT_REPEATS = 5
+MIN_REPEAT_TIME = 0.05   # Seconds; fast functions are called repeatedly until a repeat takes this long
+CHECK_TOLERANCE = 1e-9   # Relative
+COLD_START_BUDGET = 0.5   # Seconds for "import harvest" and one get_overall_map_value in a new interpreter
+COLD_START_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import harvest
+harvest.get_overall_map_value(harvest.Settings())
+print(time.perf_counter() - start, "scipy" in sys.modules)
+"""
+SUPPORT_SIZES = ((8, 3), (12, 5), (16, 7))   # (t2_binom_n, t3_binom_n)
+CHECK_SCENARIOS = {
+    "default": Settings(),
+    "yellow_sextant": Settings(yellow_sextant=True),
+    "blue_sextant_reroll": Settings(blue_sextant=True, sextant_reroll_implementation=True),
+    "wandering_path": dataclasses.replace(WANDERING_PATH_ATLAS_SETTINGS, purple_sextant=True, base_map_quantity=100),
+    "grand_design": GRAND_DESIGN_ATLAS_SETTINGS,
+}
+
+
+# Plain loop implementation of the model, used to check the optimized code. It only uses the formulas of the model
+# (not the functions of harvest.py), so that a change to a shared function cannot hide a difference.
+
+def reference_binomial_pmf(k: int, n: int, p: float) -> float:
+    return math.comb(n, k) * p ** k * (1 - p) ** (n - k)
+
+
+def reference_has_sextant(settings: Settings) -> bool:
+    return settings.yellow_sextant or settings.blue_sextant or settings.purple_sextant
+
+
+def reference_expected_lifeforce(num_seeds: int, base_drop: float, drop_chance: float, is_boss: bool, area_iiq: int,
+                                 pack_size: int, settings: Settings) -> float:
+    expected_monsters = num_seeds if is_boss else num_seeds * (1 + pack_size / 100)
+    expected_monsters *= 1 + settings.duplicated_monsters_chance / 100
+    lifeforce_per_monster = base_drop * drop_chance * \
+        (1 + area_iiq / 200 + settings.increased_quantity_of_lifeforce / 100)
+    final_multiplier = (1.1 if settings.doubling_season else 1.0) * (2.0 if reference_has_sextant(settings) else 1.0)
+    return lifeforce_per_monster * expected_monsters * final_multiplier
+
+
+def reference_crop_value_distribution(area_iiq: int, pack_size: int, color_value: float,
+                                      settings: Settings) -> Dict[float, float]:
+    """The value distribution of a crop, from every combination of T4, T3 and T2 seeds"""
+    t4_chance = settings.t4_seed_chance * (1.6 if settings.heart_of_the_grove else 1.0)
+    t3_p = settings.t3_binom_p * (1 + settings.increased_t3_crop_chance / 100)
+    t3_n, t2_n = int(settings.t3_binom_n), int(settings.t2_binom_n)
+    distribution = defaultdict(float)
+    for t4_seeds, t3_seeds, t2_seeds in itertools.product(range(2), range(t3_n + 1), range(t2_n + 1)):
+        t1_seeds = SEEDS_PER_PLOT - (t4_seeds + t3_seeds + t2_seeds)
+        probability = reference_binomial_pmf(t4_seeds, 1, t4_chance) * \
+            reference_binomial_pmf(t3_seeds, t3_n, t3_p) * \
+            reference_binomial_pmf(t2_seeds, t2_n, settings.t2_binom_p)
+        lifeforce = reference_expected_lifeforce(t4_seeds, settings.t4_lifeforce, settings.t4_dropchance, True,
+                                                 area_iiq, pack_size, settings) + \
+            reference_expected_lifeforce(t3_seeds, settings.t3_lifeforce, settings.t3_dropchance, False,
+                                         area_iiq, pack_size, settings) + \
+            reference_expected_lifeforce(t2_seeds, settings.t2_lifeforce, settings.t2_dropchance, False,
+                                         area_iiq, pack_size, settings) + \
+            reference_expected_lifeforce(t1_seeds, settings.t1_lifeforce, settings.t1_dropchance, False,
+                                         area_iiq, pack_size, settings)
+        sacred_value = t4_seeds * settings.sacred_blossom_value * settings.sacred_blossom_dropchance
+        distribution[lifeforce * color_value + sacred_value] += probability
+    return dict(distribution)
+
+
+def reference_sextant_index(settings: Settings) -> int:
+    """The index of the color guaranteed by the sextant, in the order [yellow, purple, blue]"""
+    if settings.blue_sextant:
+        return 2
+    return 0 if settings.yellow_sextant else 1
+
+
+def reference_color_weights(settings: Settings) -> List[float]:
+    """The chance of the random crop being each color, in the order [yellow, purple, blue]"""
+    weights = [1 - settings.reduced_yellow_chance / 100, 1 - settings.reduced_purple_chance / 100,
+               1 - settings.reduced_blue_chance / 100]
+    weights = [weight / sum(weights) for weight in weights]
+    if settings.sextant_reroll_implementation and reference_has_sextant(settings):
+        # A random crop of the sextant color is rerolled once
+        sextant_index = reference_sextant_index(settings)
+        sextant_weight = weights[sextant_index]
+        weights = [sextant_weight * weight if index == sextant_index else 2 * sextant_weight * weight
+                   for index, weight in enumerate(weights)]
+        weights = [weight / sum(weights) for weight in weights]
+    return weights
+
+
+def reference_random_crop_distribution(area_iiq: int, pack_size: int, settings: Settings) -> Dict[float, float]:
+    distribution = defaultdict(float)
+    for weight, name in zip(reference_color_weights(settings), harvest.COLOR_VALUE_FIELDS):
+        color_value = getattr(settings, name)
+        for value, probability in reference_crop_value_distribution(area_iiq, pack_size, color_value,
+                                                                    settings).items():
+            distribution[value] += weight * probability
+    return dict(distribution)
+
+
+def reference_max_distribution(distribution_1: Dict[float, float],
+                               distribution_2: Dict[float, float]) -> Dict[float, float]:
+    distribution = defaultdict(float)
+    for value_1, probability_1 in distribution_1.items():
+        for value_2, probability_2 in distribution_2.items():
+            distribution[max(value_1, value_2)] += probability_1 * probability_2
+    return dict(distribution)
+
+
+def reference_mean(distribution: Dict[float, float]) -> float:
+    return sum(value * probability for value, probability in distribution.items())
+
+
+def reference_crop_pair_value(area_iiq: int, pack_size: int, settings: Settings) -> float:
+    random_crop = reference_random_crop_distribution(area_iiq, pack_size, settings)
+    if reference_has_sextant(settings):
+        color_value = getattr(settings, harvest.COLOR_VALUE_FIELDS[reference_sextant_index(settings)])
+        other_crop = reference_crop_value_distribution(area_iiq, pack_size, color_value, settings)
+    else:
+        other_crop = random_crop
+    no_wilt_chance = 0.1 if settings.heart_of_the_grove else 0.0
+    expected_max_value = reference_mean(reference_max_distribution(other_crop, random_crop))
+    expected_combined_value = reference_mean(other_crop) + reference_mean(random_crop)
+    return no_wilt_chance * expected_combined_value + (1 - no_wilt_chance) * expected_max_value
+
+
+def reference_overall_map_value(settings: Settings) -> float:
+    map_modifier = settings.base_map_quantity * (1 + settings.increased_map_modifier_effect / 100)
+    area_iiq = int(map_modifier) + settings.fragment_quantity + settings.kirac_craft_quantity + \
+        settings.increased_quantity + settings.map_quality
+    pack_size = int(map_modifier * harvest.PACK_SIZE_MULTIPLIER) + settings.increased_pack_size + \
+        settings.fragment_pack_size
+    mean_crop_pairs = 3 * settings.base_three_harvest_chance + 4 * settings.base_four_harvest_chance + \
+        (0.5 if settings.bumper_crop else 0.0)
+    if settings.guaranteed_harvest_spawn:
+        spawn_chance = 1.0
+    else:
+        spawn_chance = settings.base_sacred_grove_chance * (1.5 if settings.stream_of_consciousness else 1.0) + \
+            settings.additional_sacred_grove_chance / 100 + settings.additional_extra_content_chance / 100
+    return spawn_chance * mean_crop_pairs * reference_crop_pair_value(area_iiq, pack_size, settings)
+
+
+# Checks
+
+def get_relative_error(value: float, reference: float) -> float:
+    return abs(value - reference) / max(abs(reference), 1.0)
+
+
+def get_cdf_distance(support: np.ndarray, probabilities: np.ndarray, reference: Dict[float, float]) -> float:
+    """
+    Get the largest difference between the CDF of a distribution and that of a reference distribution
+    Values closer than CHECK_TOLERANCE (relative) are treated as equal, as they may be rounded differently
+    """
+    reference_support = np.array(sorted(reference))
+    reference_cdf = np.cumsum([reference[value] for value in reference_support])
+    order = np.argsort(support)
+    support, cdf = np.asarray(support)[order], np.cumsum(np.asarray(probabilities)[order])
+    points = np.union1d(support, reference_support)
+    points = points + CHECK_TOLERANCE * np.maximum(np.abs(points), 1.0)
+
+    def evaluate(values, cdf_values):
+        index = np.searchsorted(values, points, side="right") - 1
+        return np.where(index >= 0, cdf_values[np.maximum(index, 0)], 0.0)
+
+    return float(np.max(np.abs(evaluate(support, cdf) - evaluate(reference_support, reference_cdf))))
+
+
+def check_settings(name: str, settings: Settings) -> Dict[str, float]:
+    """Compare every optimized path with the reference implementation for one scenario"""
+    harvest.clear_caches()
+    area_iiq, pack_size = harvest.get_area_stats(settings)
+    errors = {}
+    crop = harvest.get_crop_value_distribution_directly(area_iiq, pack_size, settings.yellow_value, settings)
+    reference_crop = reference_crop_value_distribution(area_iiq, pack_size, settings.yellow_value, settings)
+    errors[name + "/crop_value_distribution"] = get_cdf_distance(crop.support, crop.probabilities, reference_crop)
+    random_crop = harvest.get_random_crop_value_distribution(area_iiq, pack_size, settings)
+    reference_random_crop = reference_random_crop_distribution(area_iiq, pack_size, settings)
+    errors[name + "/random_crop_value_distribution"] = get_cdf_distance(
+        random_crop.support, random_crop.probabilities, reference_random_crop)
+    max_support, max_probabilities = harvest.get_max_pmf(crop.support, random_crop.support, crop.probabilities,
+                                                         random_crop.probabilities)
+    errors[name + "/max_pmf"] = get_cdf_distance(max_support, max_probabilities,
+                                                 reference_max_distribution(reference_crop, reference_random_crop))
+    errors[name + "/crop_pair_value"] = get_relative_error(harvest.get_crop_pair_value(area_iiq, pack_size, settings),
+                                                           reference_crop_pair_value(area_iiq, pack_size, settings))
+    reference_value = reference_overall_map_value(settings)
+    errors[name + "/overall_map_value"] = get_relative_error(harvest.get_overall_map_value(settings), reference_value)
+    errors[name + "/batch_overall_map_value"] = get_relative_error(
+        float(harvest_batch.get_overall_map_values([settings])[0]), reference_value)
+    return errors
+
+
+def run_checks(support_sizes: Sequence[Tuple[int, int]] = SUPPORT_SIZES) -> Dict[str, float]:
+    """Get the error of every optimized path against the reference, for every check scenario and support size"""
+    errors = {}
+    for (t2_n, t3_n), (name, settings) in itertools.product(support_sizes, CHECK_SCENARIOS.items()):
+        settings = dataclasses.replace(settings, t2_binom_n=t2_n, t3_binom_n=t3_n)
+        errors.update(check_settings("{}[t2={},t3={}]".format(name, t2_n, t3_n), settings))
+    return errors
+
+
+# Timing
+
+def time_function(function: Callable[[], object], repeats: int = DEFAULT_REPEATS) -> float:
+    """Get the shortest time of a call (in seconds) over several repeats, each with enough calls to be measurable"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_REPEAT_TIME or number >= 1 << 20:
+            break
+        number *= max(2, min(10, int(MIN_REPEAT_TIME / max(elapsed, 1e-9)) + 1))
+    times = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def measure_cold_start(repeats: int = DEFAULT_REPEATS) -> Tuple[float, bool]:
+    """
+    Time importing harvest and evaluating one map value in new interpreters
+    :return: The shortest time (in seconds), and whether scipy was imported in any run
+    """
+    times, scipy_loaded = [], False
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=BASE_DIR, check=True,
+                                capture_output=True, text=True).stdout.split()
+        times.append(float(output[0]))
+        scipy_loaded |= output[1] == "True"
+    return min(times), scipy_loaded
+
+
+def cold(function: Callable[[], object]) -> Callable[[], object]:
+    """Call a function with empty caches"""
+    def call():
+        harvest.clear_caches()
+        return function()
+    return call
+
+
+def get_benchmarks(support_sizes: Sequence[Tuple[int, int]] = SUPPORT_SIZES,
+                   sweeps: bool = True) -> Dict[str, Callable[[], object]]:
+    """Get the benchmarked functions by name"""
+    benchmarks = {}
+    for t2_n, t3_n in support_sizes:
+        suffix = "[t2={},t3={}]".format(t2_n, t3_n)
+        settings = Settings(t2_binom_n=t2_n, t3_binom_n=t3_n)
+        sextant_settings = dataclasses.replace(settings, yellow_sextant=True)
+        area_iiq, pack_size = harvest.get_area_stats(settings)
+        harvest.clear_caches()
+        crop = harvest.get_crop_value_distribution_directly(area_iiq, pack_size, settings.yellow_value, settings)
+        random_crop = harvest.get_random_crop_value_distribution(area_iiq, pack_size, settings)
+        benchmarks.update({
+            "crop_value_distribution" + suffix: cold(lambda settings=settings: harvest.get_crop_value_distribution_directly(
+                area_iiq, pack_size, settings.yellow_value, settings)),
+            "random_crop_value_distribution" + suffix: cold(
+                lambda settings=settings: harvest.get_random_crop_value_distribution(area_iiq, pack_size, settings)),
+            "max_pmf" + suffix: lambda crop=crop, random_crop=random_crop: harvest.get_max_pmf(
+                crop.support, random_crop.support, crop.probabilities, random_crop.probabilities),
+            "crop_pair_value" + suffix: cold(
+                lambda settings=settings: harvest.get_crop_pair_value(area_iiq, pack_size, settings)),
+            "crop_pair_value_sextant" + suffix: cold(
+                lambda settings=sextant_settings: harvest.get_crop_pair_value(area_iiq, pack_size, settings)),
+            "overall_map_value" + suffix: cold(lambda settings=settings: harvest.get_overall_map_value(settings)),
+        })
+    if sweeps:
+        for name, (presets, axes) in EXAMPLE_SWEEPS.items():
+            benchmarks["sweep/" + name] = cold(
+                lambda presets=presets, axes=axes: harvest_sweep.sweep(presets, axes, processes=1))
+    return benchmarks
+
+
+# History
+
+def get_machine() -> str:
+    return "{} ({}, Python {}, NumPy {})".format(platform.node(), platform.machine(), platform.python_version(),
+                                                 np.__version__)
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)["runs"]
+
+
+def save_history(path: str, runs: List[Dict]):
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as file:
+        json.dump({"runs": runs}, file, indent=1)
+    os.replace(temporary_path, path)
+
+
+def get_baselines(runs: List[Dict], machine: str, window: int = DEFAULT_WINDOW) -> Dict[str, float]:
+    """Get the median time of every benchmark over its last recorded runs on the machine that passed"""
+    times = defaultdict(list)
+    for run in runs:
+        # Failed runs are kept in the history, but a regression must not move the baseline it is compared with
+        if run["machine"] == machine and run.get("passed", True):
+            for name, seconds in run["times"].items():
+                times[name].append(seconds)
+    return {name: float(np.median(values[-window:])) for name, values in times.items()}
+
+
+def run(history_path: str = DEFAULT_HISTORY_PATH, threshold: float = DEFAULT_THRESHOLD, window: int = DEFAULT_WINDOW,
+        repeats: int = DEFAULT_REPEATS, support_sizes: Sequence[Tuple[int, int]] = SUPPORT_SIZES, sweeps: bool = True,
+        record: bool = True, output=sys.stdout) -> bool:
+    """
+    Run the checks and benchmarks, compare the times with the history and record them
+    :return: Whether every check passed and no benchmark regressed
+    """
+    errors = run_checks(support_sizes)
+    failed_checks = [name for name, error in errors.items() if not error <= CHECK_TOLERANCE]
+    print("Checks: {} of {} within {:g} of the reference".format(len(errors) - len(failed_checks), len(errors),
+                                                                 CHECK_TOLERANCE), file=output)
+    for name in failed_checks:
+        print("  FAILED {}: error {:.3g}".format(name, errors[name]), file=output)
+    cold_start, scipy_loaded = measure_cold_start(repeats)
+    print("Cold start: {:.1f} ms (budget {:.0f} ms){}".format(
+        cold_start * 1000, COLD_START_BUDGET * 1000, ", scipy was imported" if scipy_loaded else ""), file=output)
+    if cold_start > COLD_START_BUDGET or scipy_loaded:
+        failed_checks.append("cold_start")
+
+    runs = load_history(history_path)
+    machine = get_machine()
+    baselines = get_baselines(runs, machine, window)
+    times, regressions = {}, []
+    for name, function in get_benchmarks(support_sizes, sweeps).items():
+        times[name] = time_function(function, repeats)
+    times["cold_start"] = cold_start
+    for name in times:
+        baseline = baselines.get(name)
+        status = "new"
+        if baseline is not None:
+            ratio = times[name] / baseline
+            status = "{:.2f}x baseline".format(ratio)
+            if ratio > 1 + threshold:
+                status += " REGRESSED"
+                regressions.append(name)
+        print("{:<55} {:>12.3f} ms  {}".format(name, times[name] * 1000, status), file=output)
+
+    if record:
+        runs.append({
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "machine": machine,
+            "times": times,
+            "max_check_error": max(errors.values()),
+            "passed": not failed_checks and not regressions,
+        })
+        save_history(history_path, runs)
+    if regressions:
+        print("{} benchmarks regressed by more than {:.0%}".format(len(regressions), threshold), file=output)
+    return not failed_checks and not regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of harvest.py")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="JSON file with the recorded runs")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown over the baseline that fails the run")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Number of recent runs in the baseline")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--quick", action="store_true", help="Only the default support size, without the sweeps")
+    parser.add_argument("--no-record", action="store_true", help="Do not add this run to the history")
+    args = parser.parse_args(argv)
+    if args.threshold < 0 or args.window <= 0 or args.repeats <= 0:
+        parser.error("--threshold must not be negative, and --window and --repeats must be positive")
+    support_sizes = SUPPORT_SIZES[:1] if args.quick else SUPPORT_SIZES
+    passed = run(args.history, args.threshold, args.window, args.repeats, support_sizes, not args.quick,
+                 not args.no_record)
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
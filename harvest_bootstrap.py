@@ -0,0 +1,178 @@
+"""
+Bootstrap confidence intervals on map values and on the ranking of strategies
+
+Several constants of Settings are fitted to a limited amount of data (some with very few observations, such as
+t4_lifeforce, t4_seed_chance and sacred_blossom_dropchance), so the map value of a scenario is uncertain even when
+every other setting is known. Every bootstrap replicate resamples the stacks, crops and plots of the experimental data
+(harvest_calibration.CalibrationData.resample), refits the constants with harvest_calibration, and evaluates every
+scenario with the refitted constants in a single harvest_batch call.
+
+Replicates are run in batches on a pool of worker processes. Every batch has its own random generator, spawned from
+the seed and the index of the batch, so a batch gives the same replicates whichever worker runs it, and batches are
+submitted until the time budget or the number of replicates is reached.
+
+Example:
+    result = bootstrap({"Wandering Path": WANDERING_PATH_ATLAS_SETTINGS, "Grand Design": GRAND_DESIGN_ATLAS_SETTINGS},
+                       time_budget=30)
+    print(result.interval("Wandering Path"), result.win_probability("Wandering Path", "Grand Design"))
+"""
+import dataclasses
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+import harvest_batch
+import harvest_calibration
+from harvest import Settings
+from harvest_calibration import CalibrationData, CALIBRATED_FIELDS
+
+LOW_CONFIDENCE_FIELDS = ("t4_lifeforce", "t4_seed_chance", "sacred_blossom_dropchance")
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CONFIDENCE = 0.95
+
+
+@dataclass
+class BootstrapResult:
+    names: List[str]   # The names of the scenarios
+    estimates: np.ndarray   # The value of every scenario with the constants fitted to all of the data
+    values: np.ndarray   # The value of every scenario in every replicate, (replicates, scenarios)
+    constants: Dict[str, np.ndarray]   # The refitted value of every constant in every replicate
+    elapsed: float   # Seconds
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_values(self, name: str) -> np.ndarray:
+        return self.values[:, self.names.index(name)]
+
+    def interval(self, name: str, confidence: float = DEFAULT_CONFIDENCE) -> Tuple[float, float]:
+        """Get the percentile confidence interval of the value of a scenario"""
+        return get_percentile_interval(self.get_values(name), confidence)
+
+    def difference_interval(self, name_1: str, name_2: str,
+                            confidence: float = DEFAULT_CONFIDENCE) -> Tuple[float, float]:
+        """Get the percentile confidence interval of the value of the first scenario minus that of the second"""
+        return get_percentile_interval(self.get_values(name_1) - self.get_values(name_2), confidence)
+
+    def win_probability(self, name_1: str, name_2: str) -> float:
+        """Get the fraction of replicates in which the first scenario has a higher value than the second"""
+        return float(np.mean(self.get_values(name_1) > self.get_values(name_2)))
+
+    def rank_probabilities(self) -> np.ndarray:
+        """Get the fraction of replicates in which every scenario has every rank (0 for the highest value)"""
+        ranks = np.argsort(np.argsort(-self.values, axis=1), axis=1)
+        num_scenarios = len(self.names)
+        counts = np.apply_along_axis(np.bincount, 0, ranks, minlength=num_scenarios)
+        return counts.T / len(self)
+
+    def summary(self, confidence: float = DEFAULT_CONFIDENCE) -> str:
+        lines = ["{} replicates in {:.1f} s".format(len(self), self.elapsed)]
+        rank_probabilities = self.rank_probabilities()
+        for index, name in enumerate(self.names):
+            low, high = self.interval(name, confidence)
+            lines.append("{}: {:.2f} ({:.0%} interval {:.2f} to {:.2f}, best in {:.1%} of replicates)".format(
+                name, self.estimates[index], confidence, low, high, rank_probabilities[index, 0]))
+        return "\n".join(lines)
+
+
+def get_percentile_interval(values: np.ndarray, confidence: float) -> Tuple[float, float]:
+    if not 0 < confidence < 1:
+        raise ValueError("The confidence must be between 0 and 1")
+    low, high = np.quantile(values, [(1 - confidence) / 2, (1 + confidence) / 2])
+    return float(low), float(high)
+
+
+def evaluate_constants(scenarios: Sequence[Settings], constants: Sequence[Dict[str, float]]) -> np.ndarray:
+    """
+    Evaluate every scenario with every set of constants
+    :return: The map values, (sets of constants, scenarios)
+    """
+    settings_list = [dataclasses.replace(scenario, **values) for values in constants for scenario in scenarios]
+    return harvest_batch.get_overall_map_values(settings_list).reshape(len(constants), len(scenarios))
+
+
+def run_batch(data: CalibrationData, scenarios: Sequence[Settings], fields: Sequence[str],
+              seed_sequence: np.random.SeedSequence, num_replicates: int, fixed_binomial_n: bool):
+    """
+    Run a batch of bootstrap replicates
+    :return: The refitted constants of every replicate and the map values, (replicates, scenarios)
+    """
+    rng = np.random.default_rng(seed_sequence)
+    constants = []
+    for _ in range(num_replicates):
+        calibration = harvest_calibration.fit_calibration(data.resample(rng), fixed_binomial_n=fixed_binomial_n)
+        constants.append({name: calibration.estimates[name].value for name in fields})
+    return constants, evaluate_constants(scenarios, constants)
+
+
+def bootstrap(scenarios: Mapping[str, Settings], time_budget: float = 60.0, max_replicates: int = 1000,
+              fields: Sequence[str] = CALIBRATED_FIELDS, data: Optional[CalibrationData] = None, seed: int = 0,
+              processes: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+              fixed_binomial_n: bool = True) -> BootstrapResult:
+    """
+    Estimate the uncertainty of the map value of every scenario that comes from fitting the constants to the data
+    :param scenarios: A mapping from scenario names to settings (the fitted fields of the settings are replaced)
+    :param time_budget: The number of seconds after which no more batches are started
+    :param max_replicates: The largest number of replicates
+    :param fields: The constants that are refitted in every replicate (for example LOW_CONFIDENCE_FIELDS); the other
+        fields keep the values of the scenarios
+    :param data: The observations to resample (harvest_calibration.load_calibration_data() by default)
+    :param seed: The seed from which the random generator of every batch is spawned
+    :param processes: The number of worker processes (all cores by default, 1 to run in this process)
+    :param batch_size: The number of replicates in a batch
+    :param fixed_binomial_n: Whether to keep the binomial n of the scenarios instead of refitting it
+    :return: The values of every scenario in every replicate
+    """
+    unknown_fields = set(fields) - set(CALIBRATED_FIELDS)
+    if unknown_fields:
+        raise ValueError("Fields that are not calibrated: {}".format(", ".join(sorted(unknown_fields))))
+    if fixed_binomial_n:
+        fields = [name for name in fields if name not in ("t2_binom_n", "t3_binom_n")]
+    start = time.monotonic()
+    deadline = start + time_budget
+    data = data if data is not None else harvest_calibration.load_calibration_data()
+    names, scenario_list = list(scenarios), list(scenarios.values())
+    full_fit = harvest_calibration.fit_calibration(data, fixed_binomial_n=fixed_binomial_n)
+    estimates = evaluate_constants(scenario_list, [{name: full_fit.estimates[name].value for name in fields}])[0]
+
+    num_batches = -(-max_replicates // batch_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_batches)
+    batch_sizes = [min(batch_size, max_replicates - index * batch_size) for index in range(num_batches)]
+    arguments = [(data, scenario_list, fields, seed_sequences[index], batch_sizes[index], fixed_binomial_n)
+                 for index in range(num_batches)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    results = []
+    if processes <= 1:
+        for batch_arguments in arguments:
+            if time.monotonic() >= deadline:
+                break
+            results.append(run_batch(*batch_arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # Batches are submitted a few at a time, so that no new batch starts after the deadline
+            pending = deque()
+            for batch_arguments in arguments:
+                if time.monotonic() >= deadline:
+                    break
+                pending.append(executor.submit(run_batch, *batch_arguments))
+                if len(pending) >= 2 * processes:
+                    results.append(pending.popleft().result())
+            while pending:
+                results.append(pending.popleft().result())
+    if not results:
+        raise ValueError("The time budget does not allow a single batch of replicates")
+
+    constants = [values for batch_constants, _ in results for values in batch_constants]
+    return BootstrapResult(
+        names=names,
+        estimates=estimates,
+        values=np.concatenate([values for _, values in results]),
+        constants={name: np.array([values[name] for values in constants]) for name in fields},
+        elapsed=time.monotonic() - start,
+    )
@@ -0,0 +1,106 @@
+"""
+A small bounded memoization cache used for the intermediate results of harvest.py, and the fingerprint of the model
+code that names the results kept between runs
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Callable, Hashable, List, Sequence
+
+CacheInfo = namedtuple("CacheInfo", ["name", "hits", "misses", "evictions", "maxsize", "currsize"])
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The modules whose code the results kept between runs depend on (harvest.py uses harvest_rotation.py for crop rotation
+# groves, whose choices come from harvest_policy.py, and harvest_batch.py falls back to harvest.py for them)
+MODEL_FILES = ("harvest.py", "harvest_batch.py", "harvest_rotation.py", "harvest_policy.py", "harvest_cache.py")
+
+
+@functools.lru_cache(maxsize=None)
+def get_model_fingerprint(files: Sequence[str] = MODEL_FILES) -> str:
+    """Get a hash of the source code of the model, which changes whenever the model code changes"""
+    digest = hashlib.sha256()
+    for name in files:
+        digest.update(name.encode())
+        with open(os.path.join(BASE_DIR, name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+class LRUCache:
+    """
+    A mapping from hashable keys to computed values, evicting the least recently used entry when full
+
+    Unlike functools.lru_cache, the cache is keyed explicitly by the caller, so only the inputs that actually
+    affect a result need to be part of its key, and the statistics and contents can be inspected at any time.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024):
+        if maxsize <= 0:
+            raise ValueError("The cache size must be positive")
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """
+        Get the cached value for a key, computing and storing it if it is missing
+        :param key: The cache key
+        :param compute: A function without arguments that computes the value
+        :return: The cached or newly computed value
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def get(self, key: Hashable, default=None):
+        """Get the cached value for a key, or the default if it is missing"""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        """Store a value, evicting the least recently used entries if the cache is full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def keys(self) -> List[Hashable]:
+        """Get the cached keys, from least to most recently used"""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.name, self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+    def clear(self):
+        """Remove every entry and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
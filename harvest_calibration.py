@@ -0,0 +1,343 @@
+"""
+Calibration of the seed and lifeforce constants of Settings from the experimental data in data/*.csv
+
+The notebook derived these constants with loops over every plot (get_plot_ratios) and every seed count
+(get_seed_counts). Here, the same quantities are computed for all plots at once with np.unique and np.bincount over the
+columns of harvest_data, and every constant is fitted by maximum likelihood:
+* tN_lifeforce: the mean normalized size of the lifeforce stacks of the tier (stacks are assigned to tiers by their
+  normalized size, as in the notebook)
+* tN_dropchance: the number of stacks of the tier divided by the expected number of monsters of the tier (the MLE of a
+  Poisson rate), counting monsters from pack size and Bountiful Harvest as in harvest_simulation
+* t2_binom_n/p, t3_binom_n/p: a binomial distribution of the number of seeds per plot, with n chosen by profile
+  likelihood and p solved for every n (with the increased T3 chance of every plot applied to p, as in harvest.py)
+* t4_seed_chance: a Bernoulli distribution of the T4 seed of a plot, with the Heart of the Grove bonus applied
+* sacred_blossom_dropchance: the number of sacred lifeforce stacks divided by the number of T4 seeds
+
+As in the notebook, only level 83 maps are used, without sacred lifeforce, empty drops, or drops from maps where
+lifeforce could be duplicated. Since harvest_data only parses the rows appended to the CSV files since the last load,
+calibrating again after adding map logs takes a fraction of a second.
+
+Example:
+    calibration = calibrate()
+    print(format_preset(calibration))
+    value = harvest.get_overall_map_value(calibration.settings)
+"""
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+import harvest
+import harvest_data
+from harvest import Settings, SEEDS_PER_PLOT
+
+TIERS = ("t4", "t3", "t2", "t1")   # The order of the seed tiers in harvest.py
+DROP_TIER_THRESHOLDS = np.array([0, 11, 30, 100])   # A normalized stack larger than the Nth threshold is of tier N+1
+CALIBRATION_LEVEL = 83
+HEART_OF_THE_GROVE_T4_MULTIPLIER = 1.6
+BISECTION_STEPS = 60
+CALIBRATED_FIELDS = tuple("{}_lifeforce".format(tier) for tier in TIERS) + \
+    tuple("{}_dropchance".format(tier) for tier in TIERS) + \
+    ("t4_seed_chance", "t2_binom_n", "t2_binom_p", "t3_binom_n", "t3_binom_p", "sacred_blossom_dropchance")
+
+
+@dataclass
+class CalibrationData:
+    """The observations used by the calibration, with one entry per stack, per crop of a plot, and per plot"""
+    drop_values: np.ndarray   # The normalized size of every stack
+    drop_tiers: np.ndarray   # The tier index (in the order of TIERS) of every stack
+    crop_seeds: np.ndarray   # The number of seeds of every tier of every crop that dropped lifeforce, (crops, tiers)
+    crop_drops: np.ndarray   # The number of stacks of every tier dropped by every crop, (crops, tiers)
+    crop_pack_size: np.ndarray
+    crop_bountiful_harvest: np.ndarray   # The chance (in percent) of an additional monster per seed
+    plot_seeds: np.ndarray   # The number of seeds of every tier of every plot, (plots, tiers)
+    plot_t3_multiplier: np.ndarray   # The multiplier of the T3 seed chance of every plot
+    plot_t4_multiplier: np.ndarray   # The multiplier of the T4 seed chance of every plot
+    sacred_t4_seeds: np.ndarray   # The number of T4 seeds of every crop, including crops without other lifeforce
+    sacred_drops: np.ndarray   # The number of sacred lifeforce stacks dropped by every crop
+
+    def resample(self, rng: np.random.Generator) -> "CalibrationData":
+        """Draw a bootstrap sample, with the stacks, crops and plots resampled independently"""
+        drops = rng.integers(0, len(self.drop_values), len(self.drop_values))
+        crops = rng.integers(0, len(self.crop_seeds), len(self.crop_seeds))
+        plots = rng.integers(0, len(self.plot_seeds), len(self.plot_seeds))
+        sacred_crops = rng.integers(0, len(self.sacred_t4_seeds), len(self.sacred_t4_seeds))
+        return CalibrationData(
+            self.drop_values[drops], self.drop_tiers[drops],
+            self.crop_seeds[crops], self.crop_drops[crops], self.crop_pack_size[crops],
+            self.crop_bountiful_harvest[crops],
+            self.plot_seeds[plots], self.plot_t3_multiplier[plots], self.plot_t4_multiplier[plots],
+            self.sacred_t4_seeds[sacred_crops], self.sacred_drops[sacred_crops],
+        )
+
+
+@dataclass
+class Estimate:
+    value: float
+    standard_error: float   # NaN for the discrete binomial n
+    samples: int   # The number of stacks, crops or plots used
+
+
+@dataclass
+class Calibration:
+    settings: Settings   # The base settings with every calibrated field replaced
+    estimates: Dict[str, Estimate]
+
+
+def get_column(dataset: harvest_data.ColumnarDataset, name: str, default) -> np.ndarray:
+    """Get a column of a dataset, or a column of the default value if the dataset does not have it"""
+    if name in dataset.columns:
+        return np.asarray(dataset[name])
+    return np.full(len(dataset), default)
+
+
+def get_drop_tiers(normalized: np.ndarray) -> np.ndarray:
+    """
+    Assign lifeforce stacks to seed tiers by their normalized size
+    :return: The tier index of every stack in the order of TIERS, or len(TIERS) for empty stacks
+    """
+    return len(DROP_TIER_THRESHOLDS) - np.searchsorted(DROP_TIER_THRESHOLDS, normalized, side="left")
+
+
+def select_drops(dataset: harvest_data.ColumnarDataset) -> harvest_data.ColumnarDataset:
+    """Get the non-empty, non-sacred stacks of level 83 maps (Einhar memories count as level 83)"""
+    if "level" in dataset.columns:
+        dataset = dataset.view(level=CALIBRATION_LEVEL)
+    mask = get_column(dataset, "amount", 0) != 0
+    if "type_y" in dataset.categories and "sacred" in dataset.categories["type_y"]:
+        mask &= dataset["type_y"] != dataset.code("type_y", "sacred")
+    mask &= get_column(dataset, "sacred drops", 0) == 0
+    return harvest_data.ColumnarDataset({name: column[mask] for name, column in dataset.columns.items()},
+                                        dataset.categories)
+
+
+def get_crops(dataset: harvest_data.ColumnarDataset):
+    """
+    Group the rows of a dataset of stacks by crop (every lifeforce type of every plot)
+    :return: The row of the first stack of every crop, and the crop of every row
+    """
+    types = dataset["type"].astype(np.int64)
+    keys = np.asarray(dataset["plot"]).astype(np.int64) * (types.max(initial=0) + 1) + types
+    _, first_rows, crops = np.unique(keys, return_index=True, return_inverse=True)
+    return first_rows, crops.reshape(-1)
+
+
+def get_crop_seeds(dataset: harvest_data.ColumnarDataset, first_rows: np.ndarray) -> np.ndarray:
+    seeds = np.stack([get_column(dataset, tier, 0)[first_rows] for tier in TIERS], axis=1)
+    return np.rint(seeds).astype(np.int64)
+
+
+def get_crop_drops(dataset: harvest_data.ColumnarDataset):
+    """
+    Count the stacks of every tier dropped by every crop of a dataset of stacks
+    :return: The seeds and stacks of every crop by tier, and the row of the first stack of every crop
+    """
+    first_rows, crops = get_crops(dataset)
+    tiers = get_drop_tiers(dataset["normalized"])
+    valid = tiers < len(TIERS)
+    drops = np.bincount(crops[valid] * len(TIERS) + tiers[valid], minlength=len(first_rows) * len(TIERS))
+    return get_crop_seeds(dataset, first_rows), drops.reshape(-1, len(TIERS)), first_rows
+
+
+def get_sacred_drops(dataset: harvest_data.ColumnarDataset) -> np.ndarray:
+    """Get the number of sacred lifeforce stacks of every row (a row of its own in maps, a column in memories)"""
+    sacred_drops = get_column(dataset, "sacred drops", 0).astype(float)
+    if "type_y" in dataset.categories and "sacred" in dataset.categories["type_y"]:
+        sacred_drops += dataset["type_y"] == dataset.code("type_y", "sacred")
+    return sacred_drops
+
+
+def load_calibration_data(data_dir: str = harvest_data.DATA_DIR) -> CalibrationData:
+    """
+    Gather the observations of every league from the map, memory and plot data
+    :param data_dir: The directory with the CSV files
+    :return: The observations
+    """
+    drop_values, drop_tiers = [], []
+    crop_seeds, crop_drops, crop_pack_size, crop_bountiful_harvest = [], [], [], []
+    drop_datasets = list(harvest_data.load_datasets("map_data", data_dir).values()) + \
+        list(harvest_data.load_datasets("memory_data", data_dir).values())
+    sacred_t4_seeds, sacred_drops = [], []
+    for dataset in drop_datasets:
+        if "level" in dataset.columns:
+            dataset = dataset.view(level=CALIBRATION_LEVEL)
+        first_rows, crops = get_crops(dataset)
+        sacred_t4_seeds.append(get_crop_seeds(dataset, first_rows)[:, 0])
+        sacred_drops.append(np.bincount(crops, weights=get_sacred_drops(dataset), minlength=len(first_rows)))
+
+        dataset = select_drops(dataset)
+        if len(dataset) == 0:
+            continue
+        tiers = get_drop_tiers(dataset["normalized"])
+        valid = tiers < len(TIERS)
+        drop_values.append(np.asarray(dataset["normalized"])[valid])
+        drop_tiers.append(tiers[valid])
+
+        seeds, drops, first_rows = get_crop_drops(dataset)
+        # Stacks that may have been duplicated cannot be counted as separate drops
+        single = get_column(dataset, "harvest_duplicate_lifeforce", 0)[first_rows] == 0
+        crop_seeds.append(seeds[single])
+        crop_drops.append(drops[single])
+        crop_pack_size.append(get_column(dataset, "pack_size", 0)[first_rows][single])
+        crop_bountiful_harvest.append(get_column(dataset, "harvest_additional_monster", 0)[first_rows][single])
+
+    plot_seeds, plot_t3_multiplier, plot_t4_multiplier = [], [], []
+    for dataset in harvest_data.load_datasets("plot_data", data_dir).values():
+        dataset = dataset.view(level=CALIBRATION_LEVEL)
+        plot_seeds.append(np.stack([get_column(dataset, tier, 0) for tier in TIERS], axis=1).astype(np.int64))
+        plot_t3_multiplier.append(1 + get_column(dataset, "harvest_increased_t3", 0) / 100)
+        plot_t4_multiplier.append(np.where(get_column(dataset, "harvest_t4_wilt", False),
+                                           HEART_OF_THE_GROVE_T4_MULTIPLIER, 1.0))
+
+    if not drop_values or not plot_seeds:
+        raise ValueError("No level {} map, memory or plot data in {}".format(CALIBRATION_LEVEL, data_dir))
+    return CalibrationData(
+        np.concatenate(drop_values), np.concatenate(drop_tiers),
+        np.concatenate(crop_seeds), np.concatenate(crop_drops), np.concatenate(crop_pack_size).astype(float),
+        np.concatenate(crop_bountiful_harvest).astype(float),
+        np.concatenate(plot_seeds), np.concatenate(plot_t3_multiplier), np.concatenate(plot_t4_multiplier),
+        np.concatenate(sacred_t4_seeds), np.concatenate(sacred_drops),
+    )
+
+
+def get_seed_counts(seeds: np.ndarray, max_count: Optional[int] = None) -> np.ndarray:
+    """Count the plots with every number of seeds, from 0 to max_count (the largest number of seeds by default)"""
+    seeds = np.asarray(seeds, dtype=np.int64)
+    return np.bincount(seeds, minlength=0 if max_count is None else max_count + 1)
+
+
+def fit_binomial_p(successes: np.ndarray, trials: np.ndarray, multipliers: np.ndarray) -> np.ndarray:
+    """
+    Find the p that maximizes the likelihood of groups of binomial observations with success chances p * multiplier
+    :param successes: The total number of successes of every group, shape (..., groups)
+    :param trials: The total number of trials of every group, broadcastable to successes
+    :param multipliers: The multiplier of p of every group, broadcastable to successes
+    :return: The maximum likelihood p (one per leading index of successes)
+    """
+    successes, trials, multipliers = np.broadcast_arrays(successes, trials, multipliers)
+    failures = trials - successes
+    high = np.broadcast_to(1 / multipliers.max(axis=-1), successes.shape[:-1]).copy()
+    low = np.zeros_like(high)
+    # The log likelihood is concave in p, so the root of its derivative is found by bisection
+    for _ in range(BISECTION_STEPS):
+        p = (low + high) / 2
+        score = np.sum(successes / p[..., None] - failures * multipliers / (1 - p[..., None] * multipliers), axis=-1)
+        low, high = np.where(score > 0, p, low), np.where(score > 0, high, p)
+    p = np.where(np.sum(successes, axis=-1) == 0, 0.0, (low + high) / 2)
+    return np.where(np.sum(failures, axis=-1) == 0, high, p)
+
+
+def fit_binomial(counts: np.ndarray, multipliers: np.ndarray, n: Optional[int] = None):
+    """
+    Fit a binomial distribution Binom(n, p * multiplier) to the number of seeds of every plot
+    :param counts: The number of seeds of every plot
+    :param multipliers: The multiplier of p of every plot
+    :param n: The number of trials, or None to choose the n with the highest profile likelihood
+    :return: The n, p and standard error of p
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    groups, group_index = np.unique(multipliers, return_inverse=True)
+    group_index = group_index.reshape(-1)
+    rows = np.bincount(group_index, minlength=len(groups))
+    successes = np.bincount(group_index, weights=counts, minlength=len(groups))
+    candidates = np.arange(max(int(counts.max(initial=0)), 1), SEEDS_PER_PLOT + 1) if n is None else np.array([n])
+    p = fit_binomial_p(np.broadcast_to(successes, (len(candidates), len(groups))),
+                       candidates[:, None] * rows, groups)
+    if len(candidates) > 1:
+        # The profile likelihood of every n, from the number of plots with every (multiplier, count) pair
+        pairs, pair_counts = np.unique(np.stack([group_index, counts]), axis=1, return_counts=True)
+        chances = np.minimum(p[:, None] * groups[pairs[0]], 1.0)
+        with np.errstate(divide="ignore"):
+            log_pmf = np.log(harvest.get_binomial_pmf(pairs[1], candidates[:, None], chances))
+        best = int(np.argmax(log_pmf @ pair_counts))
+    else:
+        best = 0
+    n, p = int(candidates[best]), float(p[best])
+    failures = n * rows - successes
+    information = np.sum(successes / p ** 2 + failures * groups ** 2 / (1 - p * groups) ** 2) if 0 < p else np.inf
+    return n, p, float(1 / np.sqrt(information)) if information > 0 else np.nan
+
+
+def fit_calibration(data: CalibrationData, base: Optional[Settings] = None,
+                    fixed_binomial_n: bool = False) -> Calibration:
+    """
+    Fit every calibrated constant to a set of observations
+    :param data: The observations
+    :param base: The settings whose other fields are kept (the default settings by default)
+    :param fixed_binomial_n: Whether to keep t2_binom_n and t3_binom_n of the base settings instead of fitting them
+    :return: The calibrated settings and the estimate of every constant
+    """
+    base = base if base is not None else Settings()
+    estimates = {}
+
+    num_tiers = len(TIERS)
+    stacks = np.bincount(data.drop_tiers, minlength=num_tiers)
+    totals = np.bincount(data.drop_tiers, weights=data.drop_values, minlength=num_tiers)
+    squares = np.bincount(data.drop_tiers, weights=data.drop_values ** 2, minlength=num_tiers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = totals / stacks
+        variances = (squares - stacks * means ** 2) / (stacks - 1)
+        errors = np.sqrt(variances / stacks)
+    for index, tier in enumerate(TIERS):
+        estimates[tier + "_lifeforce"] = Estimate(float(means[index]), float(errors[index]), int(stacks[index]))
+
+    # Only T1 to T3 seeds spawn additional monsters from pack size and Bountiful Harvest
+    pack_multiplier = 1 + data.crop_pack_size / 100 + data.crop_bountiful_harvest / 100
+    monster_multipliers = np.stack([np.ones_like(pack_multiplier)] + [pack_multiplier] * (num_tiers - 1), axis=1)
+    monsters = np.sum(data.crop_seeds * monster_multipliers, axis=0)
+    stacks = np.sum(data.crop_drops, axis=0)
+    seeded_crops = np.sum(data.crop_seeds > 0, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chances, errors = stacks / monsters, np.sqrt(stacks) / monsters
+    for index, tier in enumerate(TIERS):
+        estimates[tier + "_dropchance"] = Estimate(float(chances[index]), float(errors[index]),
+                                                   int(seeded_crops[index]))
+
+    t4_seeds, sacred_drops = np.sum(data.sacred_t4_seeds), np.sum(data.sacred_drops)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        estimates["sacred_blossom_dropchance"] = Estimate(float(sacred_drops / t4_seeds),
+                                                          float(np.sqrt(sacred_drops) / t4_seeds),
+                                                          int(np.sum(data.sacred_t4_seeds > 0)))
+
+    num_plots = len(data.plot_seeds)
+    _, t4_chance, t4_error = fit_binomial(data.plot_seeds[:, 0], data.plot_t4_multiplier, 1)
+    estimates["t4_seed_chance"] = Estimate(t4_chance, t4_error, num_plots)
+    for index, tier in ((2, "t2"), (1, "t3")):
+        multipliers = data.plot_t3_multiplier if tier == "t3" else np.ones(num_plots)
+        n = int(getattr(base, tier + "_binom_n")) if fixed_binomial_n else None
+        n, p, p_error = fit_binomial(data.plot_seeds[:, index], multipliers, n)
+        estimates[tier + "_binom_n"] = Estimate(n, np.nan, num_plots)
+        estimates[tier + "_binom_p"] = Estimate(p, p_error, num_plots)
+
+    values = {name: estimate.value for name, estimate in estimates.items()}
+    return Calibration(dataclasses.replace(base, **values), estimates)
+
+
+def calibrate(base: Optional[Settings] = None, data_dir: str = harvest_data.DATA_DIR,
+              fixed_binomial_n: bool = False) -> Calibration:
+    """
+    Fit the seed and lifeforce constants of Settings to the data in the data directory
+    :param base: The settings whose other fields are kept (the default settings by default)
+    :param data_dir: The directory with the CSV files
+    :param fixed_binomial_n: Whether to keep t2_binom_n and t3_binom_n of the base settings instead of fitting them
+    :return: The calibrated settings and the estimate of every constant
+    """
+    return fit_calibration(load_calibration_data(data_dir), base, fixed_binomial_n)
+
+
+def format_preset(calibration: Calibration, fields: Sequence[str] = CALIBRATED_FIELDS) -> str:
+    """Format the calibrated constants as Settings field definitions, with their standard errors and sample sizes"""
+    lines = []
+    for name in fields:
+        estimate = calibration.estimates[name]
+        field_type = "int" if isinstance(estimate.value, int) else "float"
+        comment = "{} samples".format(estimate.samples)
+        if not np.isnan(estimate.standard_error):
+            comment = "+/- {:.4g}, {}".format(estimate.standard_error, comment)
+        lines.append("{}: {} = {:.4g}  # {}".format(name, field_type, estimate.value, comment))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(format_preset(calibrate()))
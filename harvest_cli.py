@@ -0,0 +1,208 @@
+"""
+Command line evaluation of scenario files, also available as `python -m harvest`
+
+Every input line is a JSON object of Settings overrides, for example {"yellow_sextant": true, "map_quality": 0}.
+Every output line is a JSON object with the map value, area IIQ, pack size and sacred grove spawn chance of the
+corresponding input line, or with the line number and an error message if the line is not valid. Values are checked
+against the range of their field: chances in fractions (such as the binomial p) must be in [0, 1], every other number
+(percentages, prices, lifeforce, ...) must not be negative, the reduced color chances must be at most 100%, and the
+binomial numbers of trials must be whole numbers. The chances combined from several fields (the crop colors, the
+number of harvests, the increased seed chances and the sacred grove spawn chance) must stay valid as well.
+Blank lines are skipped. Lines are read, evaluated (with harvest_batch) and written a chunk at a time, so the memory used does not
+depend on the size of the input.
+
+Example: python -m harvest scenarios.jsonl --workers 4 > values.jsonl
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+import harvest_batch
+from harvest import Settings
+
+DEFAULT_CHUNK_SIZE = 4096
+FIELD_TYPES = {field.name: field.type for field in dataclasses.fields(Settings)}
+DEFAULT_VALUES = dataclasses.asdict(Settings())
+# The float fields that are probabilities (the int chance fields are percentages)
+PROBABILITY_FIELDS = frozenset(name for name, field_type in FIELD_TYPES.items()
+                               if field_type is float and (name.endswith("chance") or name.endswith("_binom_p")))
+WHOLE_NUMBER_FIELDS = frozenset(("t2_binom_n", "t3_binom_n"))   # Declared as floats
+# The percentages subtracted from 100%
+REDUCED_FIELDS = frozenset(name for name in FIELD_TYPES if name.startswith("reduced_") and name.endswith("_chance"))
+
+
+def parse_overrides(text: str) -> Dict:
+    """
+    Parse and validate one line of Settings overrides
+    :param text: A JSON object from Settings field names to values
+    :return: The overrides
+    """
+    return validate_overrides(json.loads(text))
+
+
+def validate_overrides(overrides) -> Dict:
+    """
+    Check that every override is a Settings field with a value of the right type and range
+    :param overrides: A mapping from Settings field names to values
+    :return: The overrides, with the binomial numbers of trials as ints
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError("Expected a JSON object of Settings fields")
+    validated = {}
+    for name, value in overrides.items():
+        if name not in FIELD_TYPES:
+            raise ValueError("Unknown Settings field: {}".format(name))
+        field_type = FIELD_TYPES[name]
+        if field_type is bool:
+            valid = isinstance(value, bool)
+        elif field_type is int:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if not valid:
+            raise ValueError("Invalid value for {}: {!r}".format(name, value))
+        if field_type is not bool:
+            if not math.isfinite(value) or value < 0:
+                raise ValueError("{} must be a non-negative number: {!r}".format(name, value))
+            if name in PROBABILITY_FIELDS and value > 1:
+                raise ValueError("{} is a probability and must be between 0 and 1: {!r}".format(name, value))
+            if name in REDUCED_FIELDS and value > 100:
+                raise ValueError("{} is a percentage and must be between 0 and 100: {!r}".format(name, value))
+            if name in WHOLE_NUMBER_FIELDS:
+                if value != int(value):
+                    raise ValueError("{} must be a whole number: {!r}".format(name, value))
+                value = int(value)
+        validated[name] = value
+    check_combined_values(Settings(**{**DEFAULT_VALUES, **validated}))
+    return validated
+
+
+def check_combined_values(settings: Settings) -> None:
+    """
+    Check the ranges that depend on several fields, which overrides can break even with valid values
+    :param settings: The settings with the overrides applied
+    """
+    if all(getattr(settings, name) == 100 for name in REDUCED_FIELDS):
+        raise ValueError("The reduced color chances cannot all be 100, no crop color would be left")
+    if settings.base_three_harvest_chance + settings.base_four_harvest_chance > 1:
+        raise ValueError("base_three_harvest_chance and base_four_harvest_chance must add up to at most 1")
+    if settings.t3_binom_p * (1 + settings.increased_t3_crop_chance / 100) > 1:
+        raise ValueError("t3_binom_p increased by increased_t3_crop_chance must be at most 1")
+    if settings.t4_seed_chance * (1.6 if settings.heart_of_the_grove else 1) > 1:
+        raise ValueError("t4_seed_chance increased by heart_of_the_grove must be at most 1")
+    if harvest.get_harvest_spawn_chance(settings) > 1:
+        raise ValueError("The sacred grove spawn chance must be at most 1")
+
+
+def evaluate_overrides(overrides_list: Sequence[Dict]) -> List[Dict]:
+    """
+    Evaluate a list of validated Settings overrides together
+    :param overrides_list: The overrides of every scenario
+    :return: The value, area IIQ, pack size and spawn chance of every scenario
+    """
+    if not overrides_list:
+        return []
+    # Only the overridden fields get a column of their own, the others keep their default value
+    names = set(itertools.chain.from_iterable(overrides_list))
+    columns = harvest_batch.complete_columns(
+        {name: [overrides.get(name, DEFAULT_VALUES[name]) for overrides in overrides_list] for name in names})
+    columns = {name: np.broadcast_to(column, (len(overrides_list),)) for name, column in columns.items()}
+    values = harvest_batch.get_overall_map_values(columns)
+    area_iiq, pack_size = harvest_batch.get_area_stats_batch(columns)
+    spawn_chance = harvest_batch.get_harvest_spawn_chance_batch(columns)
+    return [{"value": float(values[row]), "area_iiq": int(area_iiq[row]), "pack_size": int(pack_size[row]),
+             "spawn_chance": float(spawn_chance[row])} for row in range(len(overrides_list))]
+
+
+def evaluate_lines(lines: Sequence[Tuple[int, str]]) -> List[Tuple[str, bool]]:
+    """
+    Evaluate a chunk of input lines
+    :param lines: The line numbers and texts of the lines
+    :return: One output line (without the newline) per input line, and whether it is an error
+    """
+    overrides_list, outputs, valid_indices = [], [], []
+    for line_number, text in lines:
+        try:
+            overrides_list.append(parse_overrides(text))
+            valid_indices.append(len(outputs))
+            outputs.append(None)
+        except ValueError as error:
+            outputs.append((json.dumps({"line": line_number, "error": str(error)}), True))
+    for index, result in zip(valid_indices, evaluate_overrides(overrides_list)):
+        outputs[index] = (json.dumps(result), False)
+    return outputs
+
+
+def read_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    numbered = ((line_number, text) for line_number, text in enumerate(lines, start=1) if text.strip())
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def evaluate_stream(lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    workers: int = 1) -> Iterator[Tuple[str, bool]]:
+    """
+    Evaluate a stream of input lines, yielding the output lines (and whether they are errors) in the same order
+    :param lines: The input lines
+    :param chunk_size: The number of lines evaluated together
+    :param workers: The number of worker processes (1 to evaluate in this process)
+    """
+    chunks = read_chunks(lines, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from evaluate_lines(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a few chunks per worker are in flight, so the input is never read far ahead of the output
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(evaluate_lines, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m harvest", description="Evaluate JSONL files of Settings overrides")
+    parser.add_argument("input", nargs="?", default="-", help="Input JSONL file (standard input by default)")
+    parser.add_argument("-o", "--output", default="-", help="Output JSONL file (standard output by default)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Lines evaluated together")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0 or args.workers <= 0:
+        parser.error("--chunk-size and --workers must be positive")
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    errors = 0
+    try:
+        for output_line, is_error in evaluate_stream(input_file, args.chunk_size, args.workers):
+            errors += is_error
+            output_file.write(output_line + "\n")
+        output_file.flush()
+    except BrokenPipeError:
+        # The reader stopped early (e.g. `| head`), the flush at exit must not fail again on the closed pipe
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output_file.fileno())
+        return 0
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    if errors:
+        print("{} invalid lines".format(errors), file=sys.stderr)
+    return 1 if errors else 0
@@ -0,0 +1,264 @@
+"""
+Columnar, memory-mapped cache of the experimental data in data/*.csv
+
+Every CSV file (named <league>_<kind>.csv, for example 319_map_data.csv) is parsed once and stored as one .npy file
+per column in data/.columnar/<league>_<kind>/, together with a meta.json file describing the columns and the part of
+the CSV that was parsed. Columns of True/False values are stored as booleans, whole numbers as int64, other numbers as
+float64 (empty values become NaN) and everything else (such as type, type_y, t3_name and mods) as int32 codes into a
+list of categories. The first, unnamed column of the CSV files (the pandas index) is called "index".
+
+When a CSV file only gained rows since it was parsed, only the new rows are parsed. The rows are stored sorted by
+level and plot (when the file has these columns, keeping the CSV order otherwise), so filtering by level, or by level
+and plot, gives slices of the memory-mapped columns without copying them.
+
+Example:
+    maps = load_dataset("320", "map_data")
+    level_83 = maps.view(level=83)
+    print(level_83.labels("type")[:5], level_83["t3"].mean())
+"""
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_DIR_NAME = ".columnar"
+FORMAT_VERSION = 1
+INDEX_COLUMN = "index"
+ROW_COLUMN = "_row"   # The row number of every row in the CSV file
+SORT_COLUMNS = ("level", "plot")
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class ColumnarDataset:
+    """
+    The columns of one CSV file (or a view of some of its rows), as read-only memory-mapped arrays
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, List[str]]):
+        self.columns = columns
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.columns[ROW_COLUMN])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name in self.columns if name != ROW_COLUMN]
+
+    def labels(self, name: str) -> np.ndarray:
+        """Get the values of a categorical column as strings (this copies the column)"""
+        return np.array(self.categories[name], dtype=object)[self.columns[name]]
+
+    def code(self, name: str, label: str) -> int:
+        """Get the code of a value of a categorical column, for filtering without converting the column to strings"""
+        return self.categories[name].index(label)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({name: self.labels(name) if name in self.categories else self.columns[name]
+                             for name in self.names})
+
+    def view(self, level: Optional[int] = None, plot: Optional[int] = None) -> "ColumnarDataset":
+        """
+        Get the rows with the given level and/or plot
+        The columns of the result are slices of the memory-mapped columns (without copies) when filtering by level,
+        by level and plot, or by plot in a file without levels. Otherwise, the selected rows are copied.
+        """
+        sort_columns = [name for name in SORT_COLUMNS if name in self.columns and name not in self.categories]
+        conditions = {"level": level, "plot": plot}
+        start, stop = 0, len(self)
+        for name in sort_columns:
+            if conditions[name] is None:
+                break
+            column = self.columns[name][start:stop]
+            start, stop = start + np.searchsorted(column, conditions[name], side="left"), \
+                start + np.searchsorted(column, conditions[name], side="right")
+        else:
+            return ColumnarDataset({name: column[start:stop] for name, column in self.columns.items()},
+                                   self.categories)
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            if value is not None:
+                if name not in self.columns:
+                    raise ValueError("The dataset has no {} column".format(name))
+                mask &= self.columns[name] == value
+        return ColumnarDataset({name: column[mask] for name, column in self.columns.items()}, self.categories)
+
+
+def get_csv_path(league: str, kind: str, data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, "{}_{}.csv".format(league, kind))
+
+
+def get_cache_path(league: str, kind: str, data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, CACHE_DIR_NAME, "{}_{}".format(league, kind))
+
+
+def hash_prefix(path: str, size: int) -> str:
+    """Get the SHA-1 hash of the first size bytes of a file"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        remaining = size
+        while remaining > 0:
+            block = file.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def parse_values(values: Sequence[str], kind: Optional[str] = None):
+    """
+    Convert the text values of a column to the narrowest of bool, int, float and category (no narrower than kind)
+    :return: The kind and the converted values (strings for categories)
+    """
+    kinds = ("bool", "int", "float", "category")
+    for candidate in kinds[kinds.index(kind) if kind else 0:]:
+        if candidate == "bool" and all(value in ("True", "False") for value in values):
+            return candidate, np.array([value == "True" for value in values], dtype=bool)
+        try:
+            if candidate == "int":
+                return candidate, np.array([int(value) for value in values], dtype=np.int64)
+            if candidate == "float":
+                return candidate, np.array([float(value) if value else np.nan for value in values], dtype=float)
+        except ValueError:
+            continue
+    return "category", list(values)
+
+
+def read_rows(path: str, start: int, stop: int) -> List[List[str]]:
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(stop - start).decode("utf-8")
+    return list(csv.reader(io.StringIO(text, newline="")))
+
+
+def save_array(directory: str, name: str, array: np.ndarray):
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "wb") as file:
+        np.save(file, array)
+    os.replace(temporary_path, os.path.join(directory, name + ".npy"))
+
+
+def build_columns(path: str, cache_path: str, meta: Optional[Dict]) -> Dict:
+    """
+    Parse the rows of the CSV file that are not in the cache yet and store the updated columns
+    :param meta: The description of the cached columns, or None to parse the whole file
+    :return: The new description of the cached columns
+    """
+    size = os.path.getsize(path)
+    if meta is None:
+        with open(path, "rb") as file:
+            header_line = file.readline()
+        header = [name or INDEX_COLUMN for name in next(csv.reader([header_line.decode("utf-8")]))]
+        rows = read_rows(path, len(header_line), size)
+        old_rows = 0
+    else:
+        header = meta["header"]
+        rows = read_rows(path, meta["parsed_bytes"], size)
+        old_rows = meta["num_rows"]
+    if any(len(row) != len(header) for row in rows):
+        raise ValueError("Every row of {} must have {} values".format(path, len(header)))
+
+    kinds = {} if meta is None else dict(meta["kinds"])
+    categories = {} if meta is None else {name: list(labels) for name, labels in meta["categories"].items()}
+    columns = {}
+    for index, name in enumerate(header):
+        kind, values = parse_values([row[index] for row in rows], kinds.get(name))
+        if meta is not None and kind != kinds[name] and (kinds[name], kind) != ("int", "float"):
+            # The cached values cannot be turned back into their text, so the whole file is parsed again
+            return build_columns(path, cache_path, None)
+        if kind == "category":
+            labels = categories.setdefault(name, [])
+            codes = {label: code for code, label in enumerate(labels)}
+            values = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int32)
+            labels.extend(list(codes)[len(labels):])
+        if meta is not None:
+            old = np.load(os.path.join(cache_path, name + ".npy"), mmap_mode="r")
+            values = np.concatenate([old.astype(values.dtype), values])
+        kinds[name] = kind
+        columns[name] = values
+    columns[ROW_COLUMN] = np.arange(old_rows + len(rows), dtype=np.int64)
+    if meta is not None:
+        old_order = np.load(os.path.join(cache_path, ROW_COLUMN + ".npy"))
+        # The cached columns are sorted, so they are put back in CSV order before adding the new rows
+        for name in header:
+            columns[name][old_order] = columns[name][:old_rows].copy()
+
+    sort_keys = [columns[name] for name in SORT_COLUMNS if kinds.get(name) in ("int", "float", "bool")]
+    order = np.lexsort([columns[ROW_COLUMN]] + sort_keys[::-1])
+    os.makedirs(cache_path, exist_ok=True)
+    for name, column in columns.items():
+        save_array(cache_path, name, column[order])
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "header": header,
+        "kinds": kinds,
+        "categories": categories,
+        "num_rows": len(order),
+        "parsed_bytes": size,
+        "source_size": size,
+        "source_mtime_ns": os.stat(path).st_mtime_ns,
+        "prefix_hash": hash_prefix(path, size),
+    }
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=cache_path, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as file:
+        json.dump(meta, file)
+    os.replace(temporary_path, os.path.join(cache_path, "meta.json"))
+    return meta
+
+
+def refresh(league: str, kind: str, data_dir: str = DATA_DIR) -> Dict:
+    """
+    Bring the cached columns of a CSV file up to date
+    :return: The description of the cached columns
+    """
+    path = get_csv_path(league, kind, data_dir)
+    cache_path = get_cache_path(league, kind, data_dir)
+    meta_path = os.path.join(cache_path, "meta.json")
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get("format_version") != FORMAT_VERSION:
+            meta = None
+    stat = os.stat(path)
+    if meta is not None and (stat.st_size, stat.st_mtime_ns) == (meta["source_size"], meta["source_mtime_ns"]):
+        return meta
+    # Only parse the new rows if the part of the file that was parsed before did not change
+    if meta is not None and (stat.st_size < meta["parsed_bytes"] or
+                             hash_prefix(path, meta["parsed_bytes"]) != meta["prefix_hash"]):
+        meta = None
+    return build_columns(path, cache_path, meta)
+
+
+def load_dataset(league: str, kind: str, data_dir: str = DATA_DIR) -> ColumnarDataset:
+    """
+    Load the columns of a CSV file, parsing it first if it changed since it was last loaded
+    :param league: The league prefix of the file, for example "319"
+    :param kind: The kind of data: "map_data", "plot_data" or "memory_data"
+    :param data_dir: The directory with the CSV files
+    :return: The dataset
+    """
+    meta = refresh(league, kind, data_dir)
+    cache_path = get_cache_path(league, kind, data_dir)
+    columns = {name: np.load(os.path.join(cache_path, name + ".npy"), mmap_mode="r")
+               for name in meta["header"] + [ROW_COLUMN]}
+    return ColumnarDataset(columns, meta["categories"])
+
+
+def load_datasets(kind: str, data_dir: str = DATA_DIR) -> Dict[str, ColumnarDataset]:
+    """Load the data of every league that has a CSV file of the given kind, by league"""
+    paths = sorted(glob.glob(os.path.join(data_dir, "*_{}.csv".format(kind))))
+    leagues = [os.path.basename(path).split("_", 1)[0] for path in paths]
+    return {league: load_dataset(league, kind, data_dir) for league in leagues}
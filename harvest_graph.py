@@ -0,0 +1,223 @@
+"""
+Incremental recomputation of the map value when settings are edited one field at a time
+
+The map value is split into a graph of derived quantities (area stats, seed tiers, the value distribution of every
+color, the random crop mixture, the crop pair value, the grove value and the spawn chance). While a node is computed,
+the Settings fields it reads and the nodes it uses are recorded. After an edit, a node is only recomputed if one of
+the fields it read changed, or if one of the nodes it used changed value; a node that is recomputed to the same value
+does not cause the nodes that use it to be recomputed (for example, moving the sextant from yellow to blue keeps the
+color distributions, which only depend on whether there is a sextant).
+
+Example:
+    graph = SettingsGraph(Settings())
+    graph.get("map_value")
+    graph.update(yellow_sextant=True)
+    graph.get("map_value")
+    print(graph.describe())   # Shows which nodes were recomputed and why
+"""
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import harvest
+from harvest import DiscreteDistribution, Settings, SETTINGS_FIELDS
+
+
+class RecordingSettings:
+    """
+    Read-only view of Settings that records every field read through it
+
+    Fields given in values read as those values instead, without being recorded: they come from other nodes.
+    """
+
+    def __init__(self, settings: Settings, reads: Dict[str, object], values: Optional[Dict[str, object]] = None):
+        self._settings = settings
+        self._reads = reads
+        self._values = values or {}
+
+    def __getattr__(self, name):
+        if name in self._values:
+            return self._values[name]
+        value = getattr(self._settings, name)
+        if name in SETTINGS_FIELDS:
+            self._reads[name] = value
+        return value
+
+    def frozen(self, fields=None) -> tuple:
+        result = self._settings.frozen(fields)
+        self._reads.update((name, value) for name, value in result if name not in self._values)
+        return tuple((name, self._values.get(name, value)) for name, value in result)
+
+    def with_values(self, **values) -> "RecordingSettings":
+        """Get a view that reads the given fields as the given values, and records every other field here"""
+        return RecordingSettings(self._settings, self._reads, {**self._values, **values})
+
+
+class NodeContext:
+    """What a node function can use: the recorded settings and the values of other nodes"""
+
+    def __init__(self, graph: "SettingsGraph", node: "Node"):
+        self.graph = graph
+        self.node = node
+        self.settings = RecordingSettings(graph.settings, node.fields)
+
+    def get(self, name: str):
+        self.node.dependencies.append(name)
+        return self.graph.get(name)
+
+
+def get_color_distribution(color_index: int) -> Callable[[NodeContext], DiscreteDistribution]:
+    def compute(context):
+        area_iiq, pack_size = context.get("area_stats")
+        context.get("seed_tiers")
+        # The distribution only depends on whether there is a sextant, not on its color, so the sextant fields read as
+        # a yellow sextant (or none) from the has_sextant node, and every other field harvest reads is recorded
+        settings = context.settings.with_values(yellow_sextant=context.get("has_sextant"), purple_sextant=False,
+                                                blue_sextant=False)
+        color_value = getattr(settings, harvest.COLOR_VALUE_FIELDS[color_index])
+        return harvest.get_crop_value_distribution_directly(area_iiq, pack_size, color_value, settings)
+    return compute
+
+
+def get_random_crop(context: NodeContext) -> DiscreteDistribution:
+    distributions = [context.get(name) for name in COLOR_DISTRIBUTION_NODES]
+    return DiscreteDistribution.mixture(distributions, context.get("color_weights"))
+
+
+def get_sextant_crop(context: NodeContext) -> DiscreteDistribution:
+    """The distribution of the crop guaranteed by the sextant (or of the other random crop without a sextant)"""
+    if harvest.has_sextant(context.settings):
+        return context.get(COLOR_DISTRIBUTION_NODES[harvest.get_sextant_color_index(context.settings)])
+    return context.get("random_crop")
+
+
+def get_crop_pair_value(context: NodeContext) -> float:
+    # The same formula as harvest.get_crop_pair_value, from the distributions of the graph
+    other_crop, random_crop = context.get("sextant_crop"), context.get("random_crop")
+    no_wilt_chance = harvest.get_no_wilt_chance(context.settings) / 100
+    expected_max_value = other_crop.max_of(random_crop).mean()
+    expected_combined_value = other_crop.mean() + random_crop.mean()
+    return no_wilt_chance * expected_combined_value + (1 - no_wilt_chance) * expected_max_value
+
+
+def get_grove_value(context: NodeContext) -> float:
+    if context.settings.crop_rotation:
+        # The crop rotation model does not use the crop pair value
+        return harvest.get_sacred_grove_value(None, context.settings)
+    return harvest.get_sacred_grove_value(context.get("crop_pair_value"), context.settings)
+
+
+COLOR_DISTRIBUTION_NODES = ("yellow_distribution", "purple_distribution", "blue_distribution")
+NODE_FUNCTIONS = {
+    "area_stats": lambda context: harvest.get_area_stats(context.settings),
+    "spawn_chance": lambda context: harvest.get_harvest_spawn_chance(context.settings),
+    "seed_tiers": lambda context: harvest.get_seed_tiers(context.settings),
+    "has_sextant": lambda context: bool(harvest.has_sextant(context.settings)),
+    "yellow_distribution": get_color_distribution(0),
+    "purple_distribution": get_color_distribution(1),
+    "blue_distribution": get_color_distribution(2),
+    "color_weights": lambda context: harvest.get_random_crop_color_weights(context.settings),
+    "random_crop": get_random_crop,
+    "sextant_crop": get_sextant_crop,
+    "crop_pair_value": get_crop_pair_value,
+    "grove_value": get_grove_value,
+    "map_value": lambda context: context.get("spawn_chance") * context.get("grove_value"),
+}
+
+
+@dataclass
+class Node:
+    name: str
+    value: object = None
+    computed: bool = False
+    fields: Dict[str, object] = field(default_factory=dict)   # The value of every field read by the last computation
+    dependencies: List[str] = field(default_factory=list)   # The nodes used by the last computation
+    changed_at: int = -1   # The revision at which the value last changed
+    verified_at: int = -1   # The revision at which the value was last known to be up to date
+    computations: int = 0
+    reason: Optional[str] = None   # Why the node was last recomputed
+
+
+def is_same_value(value_1, value_2) -> bool:
+    if value_1 is value_2:
+        return True
+    if isinstance(value_1, np.ndarray) or isinstance(value_2, np.ndarray):
+        return np.array_equal(value_1, value_2)
+    if isinstance(value_1, (int, float, tuple)) and type(value_1) == type(value_2):
+        try:
+            return bool(value_1 == value_2)
+        except ValueError:
+            return False
+    return False
+
+
+class SettingsGraph:
+    """
+    Derived quantities of one Settings object, recomputed incrementally when fields are updated
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.revision = 0
+        self.nodes = {name: Node(name) for name in NODE_FUNCTIONS}
+        self.recomputed = []   # The nodes recomputed since the last update, in order
+
+    def update(self, **changes):
+        """Change some fields of the settings (the nodes are only recomputed when they are next needed)"""
+        unknown_fields = set(changes) - set(SETTINGS_FIELDS)
+        if unknown_fields:
+            raise ValueError("Unknown Settings fields: {}".format(", ".join(sorted(unknown_fields))))
+        self.settings = dataclasses.replace(self.settings, **changes)
+        self.revision += 1
+        self.recomputed = []
+
+    def get(self, name: str):
+        """Get the up to date value of a node"""
+        if name not in self.nodes:
+            raise ValueError("Unknown node: {}".format(name))
+        node = self.nodes[name]
+        if node.verified_at < self.revision:
+            reason = self.get_stale_reason(node)
+            if reason is None:
+                node.verified_at = self.revision
+            else:
+                self.compute(node, reason)
+        return node.value
+
+    def get_stale_reason(self, node: Node) -> Optional[str]:
+        """Get why a node has to be recomputed, or None if its value is still up to date"""
+        if not node.computed:
+            return "first computation"
+        changed_fields = [name for name, value in node.fields.items() if getattr(self.settings, name) != value]
+        if changed_fields:
+            return "fields changed: " + ", ".join(changed_fields)
+        for dependency in node.dependencies:
+            self.get(dependency)
+            if self.nodes[dependency].changed_at > node.verified_at:
+                return "node changed: " + dependency
+        return None
+
+    def compute(self, node: Node, reason: str):
+        node.fields, node.dependencies = {}, []
+        value = NODE_FUNCTIONS[node.name](NodeContext(self, node))
+        if not node.computed or not is_same_value(value, node.value):
+            node.changed_at = self.revision
+        node.value, node.computed, node.verified_at = value, True, self.revision
+        node.computations += 1
+        node.reason = reason
+        self.recomputed.append(node.name)
+
+    def describe(self) -> str:
+        """Get a table of every node with the fields and nodes it reads, and what was recomputed after the last update"""
+        lines = []
+        for node in self.nodes.values():
+            status = "recomputed ({})".format(node.reason) if node.name in self.recomputed else \
+                "up to date" if node.verified_at == self.revision else "not needed"
+            lines.append("{}: {} [{} computations]".format(node.name, status, node.computations))
+            if node.dependencies:
+                lines.append("    nodes: " + ", ".join(dict.fromkeys(node.dependencies)))
+            if node.fields:
+                lines.append("    fields: " + ", ".join(sorted(node.fields)))
+        return "\n".join(lines)
@@ -0,0 +1,192 @@
+"""
+Search for the atlas passive allocation with the highest map value
+
+The catalogue lists the harvest-related atlas nodes as groups of nodes that modify the same Settings field, taken in
+order (for example, the three small nodes with 10% increased T3 crop chance). An allocation is the number of nodes
+taken from every group. The search either enumerates every allocation within the point budget (evaluated with
+harvest_batch), or runs a greedy search followed by local search, evaluating each candidate incrementally from its
+parent: the crop pair value is reused whenever a move only changes the spawn chance or the number of crop pairs, and
+the per-color crop distributions are reused through the caches in harvest.py otherwise.
+"""
+import dataclasses
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+import harvest_batch
+from harvest import Settings
+
+
+@dataclass
+class AtlasNode:
+    name: str
+    field: str   # The Settings field modified by the node
+    amount: int   # The amount added to the field (1 for notables that enable a boolean field)
+    cost: int = 1   # Atlas points needed for the node (including any travel points)
+
+
+# The harvest nodes described in the Settings comments
+HARVEST_ATLAS_NODES = (
+    [AtlasNode("Increased T3 crop chance", "increased_t3_crop_chance", 10) for _ in range(3)] +
+    [AtlasNode("Increased quantity of lifeforce", "increased_quantity_of_lifeforce", 3) for _ in range(6)] +
+    [AtlasNode("Duplicated monsters", "duplicated_monsters_chance", 3) for _ in range(2)] +
+    [AtlasNode("Reduced {} chance".format(color), "reduced_{}_chance".format(color), amount)
+     for color in ("blue", "purple", "yellow") for amount in (10, 10, 25)] +
+    [AtlasNode("Bumper Crop", "bumper_crop", 1),
+     AtlasNode("Heart of the Grove", "heart_of_the_grove", 1),
+     AtlasNode("Doubling Season", "doubling_season", 1)]
+)
+
+CROP_PAIR_FIELDS = tuple(name for name in harvest.SETTINGS_FIELDS
+                         if name not in harvest.SPAWN_FIELDS + harvest.HARVEST_COUNT_FIELDS)
+
+
+@dataclass
+class Allocation:
+    counts: Dict[str, int]   # Number of nodes taken from the group of every field
+    points: int
+    value: float
+    settings: Settings
+
+
+def group_nodes(nodes: Sequence[AtlasNode]) -> "OrderedDict[str, List[AtlasNode]]":
+    groups = OrderedDict()
+    for node in nodes:
+        groups.setdefault(node.field, []).append(node)
+    return groups
+
+
+def get_group_totals(group: List[AtlasNode]) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the field value and the points spent after taking 0, 1, ... nodes of a group"""
+    amounts = np.concatenate([[0], np.cumsum([node.amount for node in group])])
+    costs = np.concatenate([[0], np.cumsum([node.cost for node in group])])
+    return amounts, costs
+
+
+def apply_allocation(base: Settings, groups: "OrderedDict[str, List[AtlasNode]]", counts: Sequence[int]) -> Settings:
+    overrides = {}
+    for (field, group), count in zip(groups.items(), counts):
+        amount = sum(node.amount for node in group[:count])
+        overrides[field] = amount > 0 if isinstance(getattr(base, field), bool) else amount
+    return dataclasses.replace(base, **overrides)
+
+
+def get_allocation_cost(groups: "OrderedDict[str, List[AtlasNode]]", counts: Sequence[int]) -> int:
+    return sum(node.cost for group, count in zip(groups.values(), counts) for node in group[:count])
+
+
+class IncrementalEvaluator:
+    """
+    Evaluates map values, reusing the crop pair value of every earlier candidate with the same crop settings
+    """
+
+    def __init__(self):
+        self.crop_pair_values = {}
+        self.evaluations = 0
+        self.reused = 0
+
+    def evaluate(self, settings: Settings) -> float:
+        self.evaluations += 1
+        key = settings.frozen(CROP_PAIR_FIELDS)
+        if key in self.crop_pair_values:
+            self.reused += 1
+            crop_pair_value = self.crop_pair_values[key]
+        else:
+            area_iiq, pack_size = harvest.get_area_stats(settings)
+            crop_pair_value = harvest.get_crop_pair_value(area_iiq, pack_size, settings)
+            self.crop_pair_values[key] = crop_pair_value
+        sacred_grove_value = harvest.get_sacred_grove_value(crop_pair_value, settings)
+        return harvest.get_harvest_spawn_chance(settings) * sacred_grove_value
+
+
+def search_allocation(base: Settings, groups: "OrderedDict[str, List[AtlasNode]]", budget: int,
+                      evaluator: IncrementalEvaluator) -> Tuple[Tuple[int, ...], float]:
+    """Greedily add the node with the best value per point, then improve the allocation by moving nodes"""
+    sizes = [len(group) for group in groups.values()]
+
+    def evaluate(counts):
+        return evaluator.evaluate(apply_allocation(base, groups, counts))
+
+    def is_valid(counts):
+        return all(0 <= count <= size for count, size in zip(counts, sizes)) and \
+            get_allocation_cost(groups, counts) <= budget
+
+    counts = tuple(0 for _ in groups)
+    value = evaluate(counts)
+    while True:
+        best = None
+        for index in range(len(sizes)):
+            child = counts[:index] + (counts[index] + 1,) + counts[index + 1:]
+            if not is_valid(child):
+                continue
+            child_value = evaluate(child)
+            gain = (child_value - value) / max(list(groups.values())[index][counts[index]].cost, 1)
+            if best is None or gain > best[0]:
+                best = (gain, child, child_value)
+        if best is None or best[0] <= 0:
+            break
+        _, counts, value = best
+
+    # Local search: move one node between groups, or add a node if points are left, until nothing improves
+    improved = True
+    while improved:
+        improved = False
+        for removed, added in itertools.product(range(-1, len(sizes)), range(len(sizes))):
+            if removed == added:
+                continue
+            neighbor = list(counts)
+            if removed >= 0:
+                neighbor[removed] -= 1
+            neighbor[added] += 1
+            neighbor = tuple(neighbor)
+            if not is_valid(neighbor):
+                continue
+            neighbor_value = evaluate(neighbor)
+            if neighbor_value > value + 1e-12:
+                counts, value, improved = neighbor, neighbor_value, True
+    return counts, value
+
+
+def enumerate_allocations(base: Settings, groups: "OrderedDict[str, List[AtlasNode]]",
+                          budget: int) -> Tuple[Tuple[int, ...], float]:
+    """Evaluate every allocation within the budget at once with harvest_batch"""
+    totals = [get_group_totals(group) for group in groups.values()]
+    grids = np.meshgrid(*(np.arange(len(amounts)) for amounts, _ in totals), indexing="ij")
+    counts = np.stack([grid.ravel() for grid in grids], axis=1)
+    costs = sum(group_costs[counts[:, index]] for index, (_, group_costs) in enumerate(totals))
+    counts = counts[costs <= budget]
+
+    columns = {name: getattr(base, name) for name in harvest.SETTINGS_FIELDS}
+    for index, (field, (amounts, _)) in enumerate(zip(groups, totals)):
+        field_values = amounts[counts[:, index]]
+        columns[field] = field_values > 0 if isinstance(getattr(base, field), bool) else field_values
+    values = harvest_batch.get_overall_map_values(columns)
+    best = int(np.argmax(values))
+    return tuple(int(count) for count in counts[best]), float(values[best])
+
+
+def optimize_allocation(base: Settings, budget: int, nodes: Sequence[AtlasNode] = HARVEST_ATLAS_NODES,
+                        exhaustive: bool = False) -> Allocation:
+    """
+    Find the allocation of atlas nodes with the highest expected map value
+    :param base: The settings; every field in the node catalogue is replaced by the allocation
+    :param budget: The number of atlas points available for the nodes in the catalogue
+    :param nodes: The node catalogue
+    :param exhaustive: Whether to evaluate every allocation instead of the greedy and local search
+    :return: The best allocation found
+    """
+    groups = group_nodes(nodes)
+    if exhaustive:
+        counts, value = enumerate_allocations(base, groups, budget)
+    else:
+        counts, value = search_allocation(base, groups, budget, IncrementalEvaluator())
+    return Allocation(
+        counts=dict(zip(groups, counts)),
+        points=get_allocation_cost(groups, counts),
+        value=value,
+        settings=apply_allocation(base, groups, counts),
+    )
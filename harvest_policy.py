@@ -0,0 +1,141 @@
+"""
+Precomputed tables of which crop to harvest from every pair of a sacred grove
+
+Without crop rotation, harvesting a crop does not change the other crops, so the crop with the higher value is always
+the best choice. With crop rotation, harvesting a crop upgrades the remaining crops of other colors, so the choice
+depends on the rest of the grove. The tables are solved by backward induction over the grove states of
+harvest_rotation (value iteration over a grove that always ends after its last pair needs a single backward sweep):
+for every remaining set of pairs, number of harvests of each color and pair colors, the table stores the threshold
+that the score difference of the two crops has to reach for the first one to be harvested. A decision then only takes
+two dot products with the seeds of the crops and one dictionary lookup.
+
+Tables are kept in memory, and optionally saved in a directory (as .npz arrays, without pickle) so that they survive
+restarts. Saved tables are named by the settings and by the fingerprint of the model code (see harvest_cache), so
+tables solved by an older version of the model are never loaded.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+import harvest_rotation
+from harvest import Settings
+from harvest_cache import LRUCache, get_model_fingerprint
+from harvest_rotation import COLORS, PAIR_TYPES
+
+policy_table_cache = LRUCache("policy_tables", maxsize=64)
+
+
+@dataclass
+class PolicyTable:
+    crop_rotation: bool
+    score_vectors: np.ndarray   # Score of a seed of every tier [T4, T3, T2, T1], indexed by crop color and other color
+    thresholds: Dict[Tuple[Tuple[int, ...], Tuple[int, int, int], int], float]   # By remaining pairs, harvests, pair
+
+    def choose(self, first_color: str, first_seeds: Sequence[int], second_color: str, second_seeds: Sequence[int],
+               remaining_pairs: Sequence[Tuple[str, str]] = (), harvested_colors: Sequence[str] = ()) -> int:
+        """
+        Choose which crop of a pair to harvest
+        :param first_color: The color of the first crop
+        :param first_seeds: The number of [T4, T3, T2, T1] seeds of the first crop
+        :param second_color: The color of the second crop
+        :param second_seeds: The number of [T4, T3, T2, T1] seeds of the second crop
+        :param remaining_pairs: The colors of the other pairs that have not been harvested yet
+        :param harvested_colors: The color of every crop harvested so far (including crops that did not wilt)
+        :return: 0 to harvest the first crop, 1 to harvest the second one
+        """
+        first, second = COLORS.index(first_color), COLORS.index(second_color)
+        swapped = first > second
+        if swapped:
+            first, second, first_seeds, second_seeds = second, first, second_seeds, first_seeds
+        score_difference = np.dot(self.score_vectors[first, second], first_seeds) - \
+            np.dot(self.score_vectors[second, first], second_seeds)
+        threshold = 0.0
+        if self.crop_rotation and first != second:
+            remaining = tuple(sorted(PAIR_TYPES.index(tuple(sorted(COLORS.index(color) for color in pair)))
+                                     for pair in remaining_pairs))
+            harvest_counts = tuple(sum(color == name for color in harvested_colors) for name in COLORS)
+            key = (remaining, harvest_counts, PAIR_TYPES.index((first, second)))
+            if key not in self.thresholds and remaining:
+                raise ValueError("The grove state cannot be reached with these settings")
+            # Nothing is left to upgrade after the last pair
+            threshold = self.thresholds.get(key, 0.0)
+        return int((score_difference >= threshold) == swapped)
+
+
+def solve_policy(area_iiq: int, pack_size: int, settings: Settings) -> PolicyTable:
+    """
+    Compute the policy table of every grove that can appear with the given settings
+    :param area_iiq: The increased item quantity of the area
+    :param pack_size: The increased pack size of the area
+    :param settings: The settings
+    :return: The policy table
+    """
+    engine = harvest_rotation.CropRotationEngine(area_iiq, pack_size, settings)
+    if not settings.crop_rotation:
+        # Every crop is worth its value, so the choice only compares the values of the two crops
+        score_vectors = np.array([[engine.seed_values[color]] * len(COLORS) for color in range(len(COLORS))])
+        return PolicyTable(False, score_vectors, {})
+    engine.get_expected_grove_value()
+    score_vectors = np.array([[engine.get_score_vector(color, other_color) for other_color in range(len(COLORS))]
+                              for color in range(len(COLORS))])
+    return PolicyTable(True, score_vectors, dict(engine.thresholds))
+
+
+def get_policy_path(cache_dir: str, key) -> str:
+    key = (get_model_fingerprint(),) + key
+    return os.path.join(cache_dir, "policy_{}.npz".format(hashlib.sha1(repr(key).encode()).hexdigest()))
+
+
+def save_policy_table(table: PolicyTable, file):
+    """Save a policy table as arrays (the remaining pairs of every threshold are padded with -1)"""
+    keys = list(table.thresholds)
+    max_remaining = max((len(remaining) for remaining, _, _ in keys), default=0)
+    remaining = np.full((len(keys), max_remaining), -1, dtype=np.int64)
+    for row, (pairs, _, _) in enumerate(keys):
+        remaining[row, :len(pairs)] = pairs
+    np.savez(file, crop_rotation=table.crop_rotation, score_vectors=table.score_vectors, remaining=remaining,
+             harvest_counts=np.array([counts for _, counts, _ in keys], dtype=np.int64).reshape(len(keys), 3),
+             pair_types=np.array([pair_type for _, _, pair_type in keys], dtype=np.int64),
+             thresholds=np.array(list(table.thresholds.values()), dtype=float))
+
+
+def load_policy_table(path: str) -> PolicyTable:
+    with np.load(path, allow_pickle=False) as arrays:
+        thresholds = {(tuple(int(pair) for pair in remaining if pair >= 0), tuple(int(count) for count in counts),
+                       int(pair_type)): float(threshold)
+                      for remaining, counts, pair_type, threshold in zip(arrays["remaining"], arrays["harvest_counts"],
+                                                                         arrays["pair_types"], arrays["thresholds"])}
+        return PolicyTable(bool(arrays["crop_rotation"]), arrays["score_vectors"], thresholds)
+
+
+def get_policy_table(settings: Settings, cache_dir: Optional[str] = None) -> PolicyTable:
+    """
+    Get the policy table for the given settings, solving it only if it is not in the cache
+    :param settings: The settings
+    :param cache_dir: A directory where tables are saved between runs (only kept in memory if not given)
+    :return: The policy table
+    """
+    area_iiq, pack_size = harvest.get_area_stats(settings)
+    key = (area_iiq, pack_size, settings.frozen(harvest_rotation.CROP_ROTATION_FIELDS + ("crop_rotation",)))
+
+    def load_or_solve():
+        if cache_dir is None:
+            return solve_policy(area_iiq, pack_size, settings)
+        path = get_policy_path(cache_dir, key)
+        if os.path.exists(path):
+            return load_policy_table(path)
+        table = solve_policy(area_iiq, pack_size, settings)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never see a partial table
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            save_policy_table(table, file)
+        os.replace(temporary_path, path)
+        return table
+
+    return policy_table_cache.get_or_compute((cache_dir,) + key, load_or_solve)
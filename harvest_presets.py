@@ -0,0 +1,151 @@
+"""
+Atlas presets and the parameter sweeps of the comparisons in example.py
+
+The sweeps are kept here (rather than in example.py, which needs matplotlib) so that other tools, such as the
+benchmarks in harvest_benchmark.py, can replay them.
+"""
+import dataclasses
+
+from harvest import Settings
+
+BASE_NO_ATLAS_SETTINGS = Settings(
+    bumper_crop=False,
+    bountiful_harvest=False,
+    heart_of_the_grove=False,
+    doubling_season=False,
+    crop_rotation=False,
+    increased_t3_crop_chance=0,
+    increased_quantity_of_lifeforce=0,
+    duplicated_monsters_chance=0,
+    additional_sacred_grove_chance=0,
+    additional_extra_content_chance=0,
+    reduced_blue_chance=0,
+    reduced_purple_chance=0,
+    reduced_yellow_chance=0,
+    increased_quantity=0,
+    increased_map_modifier_effect=0,
+    stream_of_consciousness=False
+)
+
+REGULAR_ATLAS_SETTINGS = Settings(
+    reduced_blue_chance=45,
+    reduced_purple_chance=45,
+    reduced_yellow_chance=0,
+    bumper_crop=True,
+    bountiful_harvest=True,
+    heart_of_the_grove=True,
+    doubling_season=True,
+    increased_t3_crop_chance=30,
+    increased_quantity_of_lifeforce=18,
+    duplicated_monsters_chance=6,
+    additional_sacred_grove_chance=45,
+    additional_extra_content_chance=14,
+    increased_quantity=15,
+    increased_map_modifier_effect=30,
+    increased_pack_size=0,
+    stream_of_consciousness=True
+)
+
+GRAND_DESIGN_ATLAS_SETTINGS = Settings(
+    bumper_crop=True,
+    bountiful_harvest=True,
+    heart_of_the_grove=True,
+    doubling_season=True,
+    increased_t3_crop_chance=0,
+    increased_quantity_of_lifeforce=0,
+    duplicated_monsters_chance=0,
+    additional_sacred_grove_chance=15,
+    additional_extra_content_chance=8,
+    reduced_blue_chance=25,
+    reduced_purple_chance=25,
+    reduced_yellow_chance=0,
+    increased_quantity=0,
+    increased_map_modifier_effect=0,
+    increased_pack_size=40,
+    stream_of_consciousness=True
+)
+
+WANDERING_PATH_ATLAS_SETTINGS = Settings(
+    bumper_crop=False,
+    bountiful_harvest=False,
+    heart_of_the_grove=False,
+    doubling_season=False,
+    increased_t3_crop_chance=60,
+    increased_quantity_of_lifeforce=36,
+    duplicated_monsters_chance=12,
+    additional_sacred_grove_chance=60,
+    additional_extra_content_chance=0,
+    reduced_blue_chance=40,
+    reduced_purple_chance=40,
+    reduced_yellow_chance=0,
+    increased_quantity=30,
+    increased_map_modifier_effect=60,
+    stream_of_consciousness=True
+)
+
+
+MAP_QUANTITIES = list(range(0, 130, 10))
+# The sweeps of the comparisons in example.py, as arguments of harvest_sweep.sweep
+EXAMPLE_SWEEPS = {
+    "base_comparison": (
+        {
+            "Regular Tree": REGULAR_ATLAS_SETTINGS,
+            "Wandering Path": WANDERING_PATH_ATLAS_SETTINGS,
+            "Grand Design": GRAND_DESIGN_ATLAS_SETTINGS,
+        },
+        {
+            "base_map_quantity": MAP_QUANTITIES,
+            "guaranteed_harvest_spawn": [True],
+            "sextant": ["yellow"],
+            "fragment_pack_size": [40],
+        },
+    ),
+    "t3_comparison": (
+        {
+            "Regular Tree": GRAND_DESIGN_ATLAS_SETTINGS,
+            "No T3 small passives": dataclasses.replace(REGULAR_ATLAS_SETTINGS, increased_t3_crop_chance=0),
+        },
+        {
+            "base_map_quantity": MAP_QUANTITIES,
+            "guaranteed_harvest_spawn": [True],
+            "sextant": ["purple"],
+            "fragment_pack_size": [28],
+        },
+    ),
+    "sextant_comparison": (
+        WANDERING_PATH_ATLAS_SETTINGS,
+        {
+            "base_map_quantity": MAP_QUANTITIES,
+            "guaranteed_harvest_spawn": [True],
+            "sextant": ["purple", "yellow"],
+            "fragment_pack_size": [28],
+        },
+    ),
+    "scarab_comparison": (
+        {
+            "No Fragments": WANDERING_PATH_ATLAS_SETTINGS,
+            "Rusted Scarabs": dataclasses.replace(WANDERING_PATH_ATLAS_SETTINGS, fragment_pack_size=20),
+            "Polished Scarabs": dataclasses.replace(WANDERING_PATH_ATLAS_SETTINGS, fragment_pack_size=28),
+            "Gilded Scarabs": dataclasses.replace(WANDERING_PATH_ATLAS_SETTINGS, fragment_pack_size=40),
+            "Sacrifice Fragments": dataclasses.replace(WANDERING_PATH_ATLAS_SETTINGS, fragment_quantity=20),
+        },
+        {
+            "base_map_quantity": list(range(80, 130, 10)),
+            "guaranteed_harvest_spawn": [True],
+            "sextant": ["yellow"],
+        },
+    ),
+    "yellow_sextant_profit": (
+        {
+            "Regular Tree": REGULAR_ATLAS_SETTINGS,
+            "Wandering Path": WANDERING_PATH_ATLAS_SETTINGS,
+            "Grand Design": GRAND_DESIGN_ATLAS_SETTINGS,
+        },
+        {
+            "base_map_quantity": MAP_QUANTITIES,
+            "guaranteed_harvest_spawn": [True],
+            "fragment_pack_size": [28],
+            "sextant": [None, "yellow"],
+        },
+    ),
+}
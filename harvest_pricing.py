@@ -0,0 +1,128 @@
+"""
+Price-independent compiled scenarios for fast repricing
+
+Lifeforce and sacred blossom prices change constantly, while the atlas setup of a strategy does not. A compiled
+scenario stores the amount of lifeforce and the number of sacred blossoms of every possible plot, together with the
+chance of every plot and color, which is everything harvest.get_overall_map_value needs apart from the prices.
+Repricing then only needs a few array operations, and remains exact (including the choice of the more valuable crop
+of each pair, which depends on the prices).
+"""
+from dataclasses import dataclass
+from typing import Dict, Mapping, Sequence, Union
+
+import numpy as np
+
+import harvest
+from harvest import Settings, PRICE_FIELDS
+from harvest_batch import get_expected_max
+
+
+@dataclass
+class CompiledScenario:
+    lifeforce: np.ndarray   # Lifeforce amount of every plot, shape (cells,) or (scenarios, cells)
+    sacred_blossoms: np.ndarray   # Expected number of sacred blossoms of every plot
+    probabilities: np.ndarray   # Chance of every plot
+    color_weights: np.ndarray   # Chance of the random crop being [yellow, purple, blue]
+    guaranteed_color: Union[int, np.ndarray]   # Index of the sextant color, or -1 without a sextant
+    no_wilt_chance: Union[float, np.ndarray]
+    value_multiplier: Union[float, np.ndarray]   # Spawn chance times the expected number of crop pairs
+
+
+def get_prices(settings: Settings) -> Dict[str, float]:
+    return {name: getattr(settings, name) for name in PRICE_FIELDS}
+
+
+def compile_scenario(settings: Settings) -> CompiledScenario:
+    """
+    Compile everything about a scenario except for the prices
+    :param settings: The settings (the price fields are ignored)
+    :return: The compiled scenario
+    """
+    if settings.crop_rotation:
+        raise ValueError("Scenarios with crop rotation cannot be compiled")
+    area_iiq, pack_size = harvest.get_area_stats(settings)
+    t4, t3, t2, t1 = harvest.get_seed_tiers(settings)
+    t1_seed_lifeforce = harvest.get_expected_lifeforce(1, t1, area_iiq, pack_size, settings)
+    tier_lifeforce = []
+    for tier in (t4, t3, t2):
+        num_seeds = np.array(tier.support, dtype=float)
+        seed_lifeforce = harvest.get_expected_lifeforce(num_seeds, tier, area_iiq, pack_size, settings)
+        tier_lifeforce.append(seed_lifeforce - num_seeds * t1_seed_lifeforce)
+    all_t1_lifeforce = harvest.get_expected_lifeforce(harvest.SEEDS_PER_PLOT, t1, area_iiq, pack_size, settings)
+    lifeforce = np.add.outer(np.add.outer(tier_lifeforce[0], tier_lifeforce[1]), tier_lifeforce[2]) + all_t1_lifeforce
+    probabilities = np.multiply.outer(np.multiply.outer(t4.probabilities, t3.probabilities), t2.probabilities)
+    sacred_blossoms = np.broadcast_to(
+        (np.array(t4.support) * settings.sacred_blossom_dropchance)[:, None, None], lifeforce.shape)
+
+    color_weights = harvest.get_random_crop_color_weights(settings)
+    has_sextant = harvest.has_sextant(settings)
+    mean_crop_pairs = harvest.get_harvest_count_distribution(settings).mean()
+    return CompiledScenario(
+        lifeforce=lifeforce.ravel(),
+        sacred_blossoms=sacred_blossoms.ravel(),
+        probabilities=probabilities.ravel(),
+        color_weights=color_weights / np.sum(color_weights),
+        guaranteed_color=harvest.get_sextant_color_index(settings) if has_sextant else -1,
+        no_wilt_chance=0.1 if settings.heart_of_the_grove else 0.0,
+        value_multiplier=harvest.get_harvest_spawn_chance(settings) * mean_crop_pairs,
+    )
+
+
+def stack_scenarios(scenarios: Sequence[CompiledScenario]) -> CompiledScenario:
+    """
+    Combine compiled scenarios into one, so that all of them can be repriced at once
+
+    Scenarios with fewer possible plots are padded with plots that have no chance of occurring.
+    """
+    num_cells = max(len(scenario.probabilities) for scenario in scenarios)
+
+    def stack(name):
+        rows = [getattr(scenario, name) for scenario in scenarios]
+        return np.stack([np.pad(row, (0, num_cells - len(row))) for row in rows])
+
+    return CompiledScenario(
+        lifeforce=stack("lifeforce"),
+        sacred_blossoms=stack("sacred_blossoms"),
+        probabilities=stack("probabilities"),
+        color_weights=np.stack([scenario.color_weights for scenario in scenarios]),
+        guaranteed_color=np.array([scenario.guaranteed_color for scenario in scenarios]),
+        no_wilt_chance=np.array([scenario.no_wilt_chance for scenario in scenarios]),
+        value_multiplier=np.array([scenario.value_multiplier for scenario in scenarios]),
+    )
+
+
+def reprice(compiled: CompiledScenario, prices: Mapping[str, float]):
+    """
+    Get the map value of a compiled scenario at the given prices
+    :param compiled: A compiled scenario, or several scenarios combined by stack_scenarios
+    :param prices: The value of each color of lifeforce and of a sacred blossom (see harvest.PRICE_FIELDS)
+    :return: The expected map value (an array with one value per scenario for stacked scenarios)
+    """
+    lifeforce = np.atleast_2d(compiled.lifeforce)
+    sacred_blossoms = np.atleast_2d(compiled.sacred_blossoms)
+    probabilities = np.atleast_2d(compiled.probabilities)
+    color_weights = np.atleast_2d(compiled.color_weights)
+    guaranteed_color = np.atleast_1d(compiled.guaranteed_color)
+    num_rows, num_cells = lifeforce.shape
+
+    color_prices = np.array([prices[name] for name in harvest.COLOR_VALUE_FIELDS])
+    crop_values = lifeforce[:, None, :] * color_prices[None, :, None] + \
+        sacred_blossoms[:, None, :] * prices["sacred_blossom_value"]
+    random_values = crop_values.reshape(num_rows, -1)
+    random_probabilities = (probabilities[:, None, :] * color_weights[:, :, None]).reshape(num_rows, -1)
+
+    # The other crop of each pair is either of the guaranteed color or another random crop
+    sextant = guaranteed_color >= 0
+    padding = np.zeros((num_rows, 2 * num_cells))
+    guaranteed_values = crop_values[np.arange(num_rows), np.maximum(guaranteed_color, 0)]
+    other_values = np.where(sextant[:, None], np.concatenate([guaranteed_values, padding], axis=1), random_values)
+    other_probabilities = np.where(sextant[:, None], np.concatenate([probabilities, padding], axis=1),
+                                   random_probabilities)
+
+    expected_max_value = get_expected_max(other_values, other_probabilities, random_values, random_probabilities)
+    expected_combined_value = np.sum(other_values * other_probabilities, axis=1) + \
+        np.sum(random_values * random_probabilities, axis=1)
+    crop_pair_value = compiled.no_wilt_chance * expected_combined_value + \
+        (1 - compiled.no_wilt_chance) * expected_max_value
+    map_values = compiled.value_multiplier * crop_pair_value
+    return map_values if np.ndim(compiled.lifeforce) > 1 else float(map_values[0])
@@ -0,0 +1,244 @@
+"""
+Opt-in instrumentation of the stages of the harvest.py pipeline
+
+While profiling is enabled, the functions of every stage (area stats, seed tiers, color distributions, mixtures,
+max PMFs, grove value and spawn chance) are replaced in the harvest module by wrappers that count calls, measure the
+total and own time (excluding the instrumented functions they call), and record the size of the support of the
+distributions they return. The hits and misses of the caches of harvest.py are counted from the moment profiling is
+enabled. The original functions are put back when profiling is disabled, so there is no overhead at all otherwise.
+
+Only calls through the harvest module are seen: harvest_batch (which has its own vectorized implementation) and
+worker processes of parallel sweeps are not instrumented.
+
+Example:
+    with profile(trace=True) as profiler:
+        harvest.get_overall_map_value(Settings())
+    print(profiler.summary())
+    profiler.export_chrome_trace("harvest_trace.json")   # Open in chrome://tracing or https://ui.perfetto.dev
+"""
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import harvest
+from harvest import DiscreteDistribution
+
+# The instrumented functions of the harvest module, by stage
+STAGES = {
+    "area_stats": ("get_area_stats",),
+    "tiers": ("get_seed_tiers", "create_seed_tiers", "get_binomial_pmf"),
+    "color_distribution": ("get_crop_value_distribution_directly", "compute_crop_value_distribution",
+                           "add_independent_distributions"),
+    "mixture": ("get_random_crop_value_distribution", "get_random_crop_color_weights", "DiscreteDistribution.mixture"),
+    "max_pmf": ("get_max_pmf", "get_max_pmf_n", "distribute_cdf_to_new_support"),
+    "grove": ("get_crop_pair_value", "get_crop_pair_distributions", "get_harvest_count_distribution",
+              "get_sacred_grove_value"),
+    "spawn": ("get_harvest_spawn_chance",),
+    "map_value": ("get_overall_map_value",),
+}
+DEFAULT_MAX_EVENTS = 1000000
+
+active_profiler = None
+enable_lock = threading.Lock()
+
+
+@dataclass
+class FunctionStats:
+    stage: str
+    calls: int = 0
+    total_time: float = 0.0   # Seconds, including the instrumented functions called
+    own_time: float = 0.0   # Seconds, excluding the instrumented functions called
+    sized_calls: int = 0   # The number of calls that returned a distribution
+    total_size: int = 0   # The total support size of the returned distributions
+    max_size: int = 0
+
+
+def get_support_size(result) -> Optional[int]:
+    """Get the support size of a returned distribution (or (support, probabilities) tuple), or None"""
+    if isinstance(result, DiscreteDistribution):
+        return len(result)
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], np.ndarray):
+        return len(result[0])
+    return None
+
+
+class Profiler:
+    """
+    The statistics collected while profiling is enabled
+    """
+
+    def __init__(self, trace: bool = False, max_events: int = DEFAULT_MAX_EVENTS):
+        self.trace = trace
+        self.max_events = max_events
+        self.stats: Dict[str, FunctionStats] = {}
+        self.events: List[Dict] = []   # Chrome trace events, if tracing
+        self.dropped_events = 0
+        self.start_cache_info = {info.name: info for info in harvest.get_cache_info()}
+        self.start_time = time.perf_counter()
+        self.originals = {}   # The functions replaced by the wrappers, by name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, stage: str, function: Callable) -> Callable:
+        stats = self.stats.setdefault(name, FunctionStats(stage))
+        local = self._local
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stack = getattr(local, "stack", None)
+            if stack is None:
+                stack = local.stack = []
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+            size = get_support_size(result)
+            with self._lock:
+                stats.calls += 1
+                stats.total_time += elapsed
+                stats.own_time += elapsed - child_time
+                if size is not None:
+                    stats.sized_calls += 1
+                    stats.total_size += size
+                    stats.max_size = max(stats.max_size, size)
+                if self.trace:
+                    self.add_event(name, stage, start, elapsed, size)
+            return result
+        return wrapper
+
+    def add_event(self, name: str, stage: str, start: float, elapsed: float, size: Optional[int]):
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        event = {"name": name, "cat": stage, "ph": "X", "ts": (start - self.start_time) * 1e6, "dur": elapsed * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        if size is not None:
+            event["args"] = {"support_size": size}
+        self.events.append(event)
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the hits, misses and hit rate of every cache of harvest.py since profiling was enabled"""
+        cache_stats = {}
+        for info in harvest.get_cache_info():
+            start = self.start_cache_info.get(info.name)
+            # Clearing a cache resets its statistics, so the start is only subtracted if it still applies
+            hits, misses = info.hits, info.misses
+            if start is not None and hits >= start.hits and misses >= start.misses:
+                hits, misses = hits - start.hits, misses - start.misses
+            lookups = hits + misses
+            cache_stats[info.name] = {"hits": hits, "misses": misses,
+                                      "hit_rate": hits / lookups if lookups else float("nan")}
+        return cache_stats
+
+    def summary(self) -> str:
+        """Get a table of the statistics of every called function by stage, and of every cache"""
+        lines = ["{:<20} {:<38} {:>8} {:>11} {:>11} {:>10} {:>9} {:>8}".format(
+            "stage", "function", "calls", "total ms", "own ms", "mean us", "mean size", "max size")]
+        for stage, names in STAGES.items():
+            for name in names:
+                stats = self.stats.get(name)
+                if stats is None or stats.calls == 0:
+                    continue
+                mean_size = "{:.1f}".format(stats.total_size / stats.sized_calls) if stats.sized_calls else "-"
+                max_size = str(stats.max_size) if stats.sized_calls else "-"
+                lines.append("{:<20} {:<38} {:>8} {:>11.3f} {:>11.3f} {:>10.2f} {:>9} {:>8}".format(
+                    stage, name, stats.calls, stats.total_time * 1000, stats.own_time * 1000,
+                    stats.total_time / stats.calls * 1e6, mean_size, max_size))
+        lines.append("")
+        lines.append("{:<28} {:>10} {:>10} {:>9}".format("cache", "hits", "misses", "hit rate"))
+        for name, cache_stats in self.get_cache_stats().items():
+            lines.append("{:<28} {:>10} {:>10} {:>9.1%}".format(name, cache_stats["hits"], cache_stats["misses"],
+                                                               cache_stats["hit_rate"]))
+        if self.dropped_events:
+            lines.append("{} trace events were dropped (max_events={})".format(self.dropped_events, self.max_events))
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path: str):
+        """Write the recorded calls in the Chrome trace event format"""
+        if not self.trace:
+            raise ValueError("Enable profiling with trace=True to record trace events")
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms",
+                       "otherData": {"caches": self.get_cache_stats()}}, file)
+
+
+def get_target(name: str):
+    """Get the object that holds an instrumented function and the attribute name of the function"""
+    if "." in name:
+        class_name, attribute = name.split(".")
+        return getattr(harvest, class_name), attribute
+    return harvest, name
+
+
+def enable(trace: bool = False, max_events: int = DEFAULT_MAX_EVENTS) -> Profiler:
+    """
+    Start instrumenting the harvest module
+    :param trace: Whether to record every call for export as a Chrome trace
+    :param max_events: The largest number of recorded calls
+    :return: The profiler that collects the statistics
+    """
+    global active_profiler
+    with enable_lock:
+        if active_profiler is not None:
+            raise ValueError("Profiling is already enabled")
+        profiler = Profiler(trace, max_events)
+        for stage, names in STAGES.items():
+            for name in names:
+                target, attribute = get_target(name)
+                original = target.__dict__[attribute]
+                profiler.originals[name] = original
+                if isinstance(original, staticmethod):
+                    setattr(target, attribute, staticmethod(profiler.wrap(name, stage, original.__func__)))
+                else:
+                    setattr(target, attribute, profiler.wrap(name, stage, original))
+        active_profiler = profiler
+        return profiler
+
+
+def disable() -> Optional[Profiler]:
+    """
+    Put the original functions back
+    :return: The profiler that was active, if any
+    """
+    global active_profiler
+    with enable_lock:
+        profiler = active_profiler
+        if profiler is not None:
+            for name, original in profiler.originals.items():
+                target, attribute = get_target(name)
+                setattr(target, attribute, original)
+            active_profiler = None
+        return profiler
+
+
+@contextlib.contextmanager
+def profile(trace: bool = False, max_events: int = DEFAULT_MAX_EVENTS):
+    """Instrument the harvest module within a with block"""
+    profiler = enable(trace, max_events)
+    try:
+        yield profiler
+    finally:
+        disable()
+
+
+if __name__ == "__main__":
+    # Profile a cold evaluation of the default settings, optionally writing a Chrome trace to the given path
+    harvest.clear_caches()
+    with profile(trace=len(sys.argv) > 1) as profiler:
+        harvest.get_overall_map_value(harvest.Settings())
+    print(profiler.summary())
+    if len(sys.argv) > 1:
+        profiler.export_chrome_trace(sys.argv[1])
@@ -0,0 +1,160 @@
+"""
+Full distributions of the harvest value of a map and of a session of many maps
+
+harvest.get_overall_map_value only gives the expected value. Here, the value of a map is built as a mixture over
+whether a sacred grove spawns and how many crop pairs it has, with the value of every pair drawn independently from
+the crop pair distribution. The value of a session of N maps is the N-fold convolution of the map distribution,
+computed on a fixed grid of values with FFT convolutions and exponentiation by squaring, dropping negligible tails
+after every step so that the cost stays small even for N = 1000.
+
+As in harvest.py, the lifeforce of a plot is its expected value given the seeds of the plot, so the randomness of
+individual lifeforce drops (see harvest_simulation.py) is not part of these distributions.
+"""
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+from harvest import DiscreteDistribution, Settings
+
+DEFAULT_MAP_GRID = 0.1   # Chaos
+SESSION_BINS_PER_STD = 1000
+TAIL_TOLERANCE = 1e-12
+DIRECT_CONVOLUTION_SIZE = 1 << 16
+
+
+@dataclass
+class ProfitSummary:
+    mean: float
+    std: float
+    percentiles: Dict[float, float]
+    loss_probability: float   # Chance that the value is below the cost
+
+
+def to_dense(distribution: DiscreteDistribution, grid: float) -> Tuple[int, np.ndarray]:
+    """
+    Get the probabilities of a distribution on every multiple of the grid between its smallest and largest value
+    :return: The index of the first grid point (the value divided by the grid) and the probabilities
+    """
+    bins = np.round(distribution.support / grid).astype(np.int64)
+    offset = int(bins[0])
+    return offset, np.bincount(bins - offset, weights=distribution.probabilities)
+
+
+def from_dense(offset: int, pmf: np.ndarray, grid: float) -> DiscreteDistribution:
+    nonzero = np.flatnonzero(pmf)
+    return DiscreteDistribution((offset + nonzero) * grid, pmf[nonzero], grid)
+
+
+def trim_tails(offset: int, pmf: np.ndarray, tolerance: float = TAIL_TOLERANCE) -> Tuple[int, np.ndarray]:
+    """Drop the grid points at either end whose total probability is below the tolerance"""
+    cdf = np.cumsum(pmf)
+    first = int(np.searchsorted(cdf, tolerance, side="right"))
+    last = int(np.searchsorted(cdf, cdf[-1] - tolerance, side="left"))
+    first, last = min(first, last), min(last, len(pmf) - 1)
+    return offset + first, pmf[first:last + 1]
+
+
+def convolve_dense(pmf_1: np.ndarray, pmf_2: np.ndarray) -> np.ndarray:
+    """Convolve two probability vectors, with an FFT unless they are small"""
+    size = len(pmf_1) + len(pmf_2) - 1
+    if len(pmf_1) * len(pmf_2) <= DIRECT_CONVOLUTION_SIZE:
+        return np.convolve(pmf_1, pmf_2)
+    fft_size = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(pmf_1, fft_size) * np.fft.rfft(pmf_2, fft_size), fft_size)[:size]
+    # Rounding errors of the FFT can produce tiny negative probabilities
+    return np.maximum(result, 0.0)
+
+
+def power_dense(offset: int, pmf: np.ndarray, power: int,
+                tolerance: float = TAIL_TOLERANCE) -> Tuple[int, np.ndarray]:
+    """Get the distribution of the sum of `power` independent copies by exponentiation by squaring"""
+    result_offset, result = 0, np.ones(1)
+    while power > 0:
+        if power & 1:
+            result_offset, result = trim_tails(result_offset + offset, convolve_dense(result, pmf), tolerance)
+        power >>= 1
+        if power > 0:
+            offset, pmf = trim_tails(2 * offset, convolve_dense(pmf, pmf), tolerance)
+    return result_offset, result
+
+
+def get_map_value_distribution(settings: Settings, grid: float = DEFAULT_MAP_GRID) -> DiscreteDistribution:
+    """
+    Get the distribution of the harvest value of a single map
+    :param settings: The settings
+    :param grid: The spacing of the values of the distribution (in chaos)
+    :return: The distribution of the map value, with mean close to harvest.get_overall_map_value (unless the spawn
+        chance of the settings is above 1, which is capped at 1 here)
+    """
+    if settings.crop_rotation:
+        raise ValueError("Value distributions are not available with crop rotation")
+    area_iiq, pack_size = harvest.get_area_stats(settings)
+    pair = harvest.get_crop_pair_value_distribution(area_iiq, pack_size, settings, grid)
+    pair_offset, pair_pmf = to_dense(pair, grid)
+
+    num_pairs = harvest.get_harvest_count_distribution(settings)
+    if np.any(num_pairs.probabilities < 0) or not np.isclose(np.sum(num_pairs.probabilities), 1):
+        raise ValueError("The harvest count chances must be non-negative and sum to 1")
+    spawn_chance = harvest.get_harvest_spawn_chance(settings)
+    if spawn_chance < 0:
+        raise ValueError("The sacred grove spawn chance must not be negative")
+    # At most one sacred grove spawns in a map, so a larger chance from the passives is capped
+    spawn_chance = min(spawn_chance, 1.0)
+    max_pairs = int(num_pairs.support[-1])
+    map_offset = pair_offset
+    map_pmf = np.zeros(max_pairs * (pair_offset + len(pair_pmf) - 1) - map_offset + 1)
+    grove_offset, grove_pmf = 0, np.ones(1)
+    for count in range(1, max_pairs + 1):
+        # The value of a grove with this many pairs is the sum of independent crop pair values
+        grove_offset, grove_pmf = grove_offset + pair_offset, convolve_dense(grove_pmf, pair_pmf)
+        chance = spawn_chance * np.sum(num_pairs.probabilities[num_pairs.support == count])
+        start = grove_offset - map_offset
+        map_pmf[start:start + len(grove_pmf)] += chance * grove_pmf
+
+    # Maps without a sacred grove have no harvest value
+    no_harvest_chance = 1 - spawn_chance
+    support = np.concatenate([(map_offset + np.arange(len(map_pmf))) * grid, [0.0]])
+    return DiscreteDistribution(support, np.concatenate([map_pmf, [no_harvest_chance]]), grid)
+
+
+def get_session_value_distribution(settings: Settings, num_maps: int, map_grid: float = DEFAULT_MAP_GRID,
+                                   grid: Optional[float] = None) -> DiscreteDistribution:
+    """
+    Get the distribution of the total harvest value of a session of maps
+    :param settings: The settings
+    :param num_maps: The number of maps in the session
+    :param map_grid: The spacing of the values of the single map distribution
+    :param grid: The spacing of the values of the session distribution (by default, a multiple of the map grid
+        with about a thousand points per standard deviation of the session value)
+    :return: The distribution of the session value
+    """
+    if num_maps <= 0:
+        raise ValueError("A session must contain at least one map")
+    map_distribution = get_map_value_distribution(settings, map_grid)
+    if grid is None:
+        session_std = map_distribution.std() * math.sqrt(num_maps)
+        grid = map_grid * max(1, math.floor(session_std / SESSION_BINS_PER_STD / map_grid))
+    offset, pmf = to_dense(map_distribution.binned(grid), grid)
+    offset, pmf = power_dense(offset, pmf, num_maps)
+    return from_dense(offset, pmf / np.sum(pmf), grid)
+
+
+def summarize(distribution: DiscreteDistribution, cost: float = 0.0,
+              percentiles: Sequence[float] = (5, 50, 95)) -> ProfitSummary:
+    """
+    Summarize the profit of a value distribution
+    :param distribution: The distribution of the value (of a map or a session)
+    :param cost: The total cost (for example, of the sextants and scarabs used), subtracted from the value
+    :param percentiles: The percentiles of the profit to report
+    :return: The summary of the profit
+    """
+    loss_probability = float(np.sum(distribution.probabilities[distribution.support < cost]))
+    return ProfitSummary(
+        mean=distribution.mean() - cost,
+        std=distribution.std(),
+        percentiles={q: distribution.quantile(q / 100) - cost for q in percentiles},
+        loss_probability=loss_probability,
+    )
@@ -0,0 +1,364 @@
+"""
+Exact expected value of sacred groves with the Crop Rotation atlas notable
+
+With crop rotation, every plot starts with T1 seeds only, and harvesting a crop gives every seed of the remaining
+crops of other colors a chance to upgrade by one tier. Since every seed upgrades independently, the seeds of a plot
+of color c only depend on how many crops of other colors were harvested before it, which is the total number of
+harvests minus the number of harvests of color c. A grove is therefore described exactly by the pairs that are left
+and the number of harvests of each color so far, and its value is computed by dynamic programming over these states
+with memoized pair outcomes (the seed compositions of the two plots of a pair are sorted once per plot state, and
+every choice threshold of that state then takes two binary searches).
+
+Within a pair, the crop to harvest is chosen from its actual seeds, and with Heart of the Grove the other crop is
+harvested afterwards if it does not wilt. By default, the choice also takes into account which crops the harvest
+upgrades (the crop with the higher value is not always the best choice), and the order in which the pairs are harvested
+is chosen to maximize the expected value of the grove given the colors of all pairs (the seeds of later pairs are not
+taken into account).
+
+The first evaluation for an area and a set of settings takes about 0.17 s without a sextant (about 5000 pair outcomes,
+one per plot state and choice threshold of the best order and choices), about 0.04 s in the order the pairs appear or
+with a sextant, and is cached afterwards (grove_value_cache). Batches of crop rotation scenarios therefore cost about
+0.17 s per distinct scenario.
+"""
+import functools
+import itertools
+import math
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+import harvest
+from harvest import Settings
+from harvest_cache import LRUCache
+
+COLORS = ("yellow", "purple", "blue")
+PAIR_TYPES = tuple(itertools.combinations_with_replacement(range(len(COLORS)), 2))
+LOG_FACTORIALS = np.array([math.lgamma(count + 1) for count in range(harvest.SEEDS_PER_PLOT + 1)])
+
+CROP_ROTATION_FIELDS = harvest.CROP_VALUE_FIELDS + harvest.COLOR_VALUE_FIELDS + (
+    "t1_crop_rotation_upgrade_chance", "t2_crop_rotation_upgrade_chance", "t3_crop_rotation_upgrade_chance",
+    "reduced_yellow_chance", "reduced_purple_chance", "reduced_blue_chance", "yellow_sextant", "purple_sextant",
+    "blue_sextant", "sextant_reroll_implementation") + harvest.HARVEST_COUNT_FIELDS
+
+grove_value_cache = LRUCache("crop_rotation_groves", maxsize=256)
+
+
+@dataclass
+class PairOutcome:
+    first_chosen_chance: float   # Chance that the first crop of the pair is harvested
+    expected_chosen_value: float   # Expected value of the crop that is harvested
+    expected_second_companion_value: float   # Expected value of the second crop if it is harvested after the first
+    expected_first_companion_value: float   # Expected value of the first crop if it is harvested after the second
+
+
+def get_seed_compositions() -> np.ndarray:
+    """Get every way to split the seeds of a plot into [T4, T3, T2, T1] seeds"""
+    compositions = [(t4, t3, t2, harvest.SEEDS_PER_PLOT - t4 - t3 - t2)
+                    for t4 in range(harvest.SEEDS_PER_PLOT + 1)
+                    for t3 in range(harvest.SEEDS_PER_PLOT + 1 - t4)
+                    for t2 in range(harvest.SEEDS_PER_PLOT + 1 - t4 - t3)]
+    return np.array(compositions)
+
+
+SEED_COMPOSITIONS = get_seed_compositions()
+
+
+def get_upgrade_matrix(settings: Settings) -> np.ndarray:
+    """Get the chance of a seed of every tier becoming every other tier in one upgrade, in the order [T4, T3, T2, T1]"""
+    t1, t2, t3 = (settings.t1_crop_rotation_upgrade_chance, settings.t2_crop_rotation_upgrade_chance,
+                  settings.t3_crop_rotation_upgrade_chance)
+    return np.array([[1, 0, 0, 0],
+                     [t3, 1 - t3, 0, 0],
+                     [0, t2, 1 - t2, 0],
+                     [0, 0, t1, 1 - t1]])
+
+
+def get_pair_type_chances(settings: Settings) -> np.ndarray:
+    """Get the chance of a pair having each combination of colors in PAIR_TYPES"""
+    random_weights = harvest.get_random_crop_color_weights(settings)
+    random_weights = random_weights / np.sum(random_weights)
+    chances = np.zeros(len(PAIR_TYPES))
+    if harvest.has_sextant(settings):
+        first_colors = np.eye(len(COLORS))[harvest.get_sextant_color_index(settings)]
+    else:
+        first_colors = random_weights
+    for first, second in itertools.product(range(len(COLORS)), repeat=2):
+        chances[PAIR_TYPES.index(tuple(sorted((first, second))))] += first_colors[first] * random_weights[second]
+    return chances
+
+
+@dataclass
+class PairCrop:
+    """The seed compositions of one crop of a pair with a non-zero probability, sorted by score"""
+    scores: np.ndarray
+    probabilities: np.ndarray
+    weighted_values: np.ndarray   # The probability times the value of every composition
+    weighted_upgraded: np.ndarray   # The probability times the value after one more upgrade
+    total_upgraded: float
+    cdf: np.ndarray   # The cumulative probabilities, starting at 0
+
+    @classmethod
+    def create(cls, scores: np.ndarray, values: np.ndarray, upgraded_values: np.ndarray,
+               probabilities: np.ndarray) -> "PairCrop":
+        order = np.flatnonzero(probabilities > 0)
+        order = order[np.argsort(scores[order], kind="stable")]
+        probabilities = probabilities[order]
+        weighted_upgraded = probabilities * upgraded_values[order]
+        return cls(scores[order], probabilities, probabilities * values[order], weighted_upgraded,
+                   float(np.sum(weighted_upgraded)), np.concatenate([[0.0], np.cumsum(probabilities)]))
+
+    def get_cdf_at(self, points: np.ndarray, side: str) -> np.ndarray:
+        """Get P(score <= point) (side="right") or P(score < point) (side="left") for every point"""
+        return self.cdf[np.searchsorted(self.scores, points, side=side)]
+
+
+class CropRotationEngine:
+    """
+    Expected values of crop rotation groves for one area and one set of settings
+    """
+
+    def __init__(self, area_iiq: int, pack_size: int, settings: Settings, optimal_choices: bool = True):
+        """
+        :param optimal_choices: Whether the crop harvested from each pair maximizes the value of the whole grove
+            (otherwise the crop with the higher value is harvested)
+        """
+        self.settings = settings
+        self.optimal_choices = optimal_choices
+        tiers = harvest.get_seed_tiers(settings)
+        seed_lifeforce = np.array([harvest.get_expected_lifeforce(1, tier, area_iiq, pack_size, settings)
+                                   for tier in tiers])
+        sacred_value = np.array([settings.sacred_blossom_value * settings.sacred_blossom_dropchance, 0, 0, 0])
+        self.seed_values = [seed_lifeforce * getattr(settings, name) + sacred_value
+                            for name in harvest.COLOR_VALUE_FIELDS]
+        self.upgrade_matrix = get_upgrade_matrix(settings)
+        self.no_wilt_chance = harvest.get_no_wilt_chance(settings) / 100
+        self.plots = {}
+        self.pair_states = {}   # The sorted crops of every plot state of a pair
+        self.pairs = {}   # The outcome of every plot state of a pair and threshold
+        self.grove_values = {}
+        self.thresholds = {}
+
+    def get_plot(self, color: int, upgrades: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the distribution of the value of a plot after the given number of upgrades
+        :return: The values of every seed composition, the expected values after one more upgrade and the probabilities
+        """
+        key = (color, upgrades)
+        if key not in self.plots:
+            tier_chances = np.linalg.matrix_power(self.upgrade_matrix, upgrades)[3]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                log_terms = np.where(SEED_COMPOSITIONS > 0, SEED_COMPOSITIONS * np.log(tier_chances), 0.0)
+            log_pmf = LOG_FACTORIALS[-1] - np.sum(LOG_FACTORIALS[SEED_COMPOSITIONS], axis=1) + np.sum(log_terms, axis=1)
+            probabilities = np.exp(log_pmf)
+            values = SEED_COMPOSITIONS @ self.seed_values[color]
+            upgraded_values = SEED_COMPOSITIONS @ (self.upgrade_matrix @ self.seed_values[color])
+            self.plots[key] = (values, upgraded_values, probabilities)
+        return self.plots[key]
+
+    def get_score_vector(self, color: int, other_color: int) -> np.ndarray:
+        """
+        Get the score of every seed of a crop, for choosing between it and a crop of the other color
+        The first crop of a pair is harvested when its score minus the score of the second crop is at least the
+        threshold of get_choice_threshold.
+        """
+        if not self.optimal_choices:
+            return self.seed_values[color]
+        # Harvesting this crop gives up its value as the companion of the other crop (after one upgrade)
+        companion_values = self.upgrade_matrix @ self.seed_values[color] if color != other_color \
+            else self.seed_values[color]
+        return self.seed_values[color] - self.no_wilt_chance * companion_values
+
+    def get_pair_state(self, first_color: int, first_upgrades: int, second_color: int,
+                       second_upgrades: int) -> Tuple[PairCrop, PairCrop]:
+        """Get the two crops of a pair, sorted by score, for every threshold of get_pair_outcome"""
+        key = (first_color, first_upgrades, second_color, second_upgrades)
+        if key not in self.pair_states:
+            first_values, first_upgraded, first_probabilities = self.get_plot(first_color, first_upgrades)
+            second_values, second_upgraded, second_probabilities = self.get_plot(second_color, second_upgrades)
+            # A crop harvested after a crop of the same color is not upgraded by it
+            if first_color == second_color:
+                first_upgraded, second_upgraded = first_values, second_values
+            self.pair_states[key] = (
+                PairCrop.create(SEED_COMPOSITIONS @ self.get_score_vector(first_color, second_color),
+                                first_values, first_upgraded, first_probabilities),
+                PairCrop.create(SEED_COMPOSITIONS @ self.get_score_vector(second_color, first_color),
+                                second_values, second_upgraded, second_probabilities))
+        return self.pair_states[key]
+
+    def get_pair_outcome(self, first_color: int, first_upgrades: int, second_color: int,
+                         second_upgrades: int, threshold: float = 0.0) -> PairOutcome:
+        key = (first_color, first_upgrades, second_color, second_upgrades, threshold)
+        if key not in self.pairs:
+            # The crops are sorted once per plot state, so every threshold only takes two binary searches
+            first, second = self.get_pair_state(first_color, first_upgrades, second_color, second_upgrades)
+            # The first crop is chosen on ties
+            second_at_most_first = second.get_cdf_at(first.scores - threshold, "right")
+            first_below_second = first.get_cdf_at(second.scores + threshold, "left")
+            self.pairs[key] = PairOutcome(
+                first_chosen_chance=float(np.dot(first.probabilities, second_at_most_first)),
+                expected_chosen_value=float(np.dot(first.weighted_values, second_at_most_first) +
+                                            np.dot(second.weighted_values, first_below_second)),
+                expected_second_companion_value=float(
+                    second.total_upgraded - np.dot(second.weighted_upgraded, first_below_second)),
+                expected_first_companion_value=float(
+                    first.total_upgraded - np.dot(first.weighted_upgraded, second_at_most_first)),
+            )
+        return self.pairs[key]
+
+    def get_choice_threshold(self, pair_type: int, harvest_counts: Tuple[int, int, int], future_value) -> float:
+        """
+        Get the score difference above which the first crop of a pair should be harvested
+        :param pair_type: The index of the colors of the pair in PAIR_TYPES
+        :param harvest_counts: The number of crops of every color harvested so far
+        :param future_value: A function from the harvest counts after this pair to the value of the rest of the grove
+        """
+        first_color, second_color = PAIR_TYPES[pair_type]
+        if not self.optimal_choices or first_color == second_color:
+            return 0.0
+        return self.get_threshold_from_values(first_color, second_color,
+                                              future_value(add_harvests(harvest_counts, first_color)),
+                                              future_value(add_harvests(harvest_counts, second_color)))
+
+    def get_threshold_from_values(self, first_color: int, second_color: int, after_first: float,
+                                  after_second: float) -> float:
+        """Get the threshold of get_choice_threshold from the values of the rest of the grove after either crop"""
+        if not self.optimal_choices or first_color == second_color:
+            return 0.0
+        # If the other crop does not wilt, both colors are harvested whichever crop is chosen
+        return (1 - self.no_wilt_chance) * (after_second - after_first)
+
+    def get_pair_value(self, pair_type: int, harvest_counts: Tuple[int, int, int], future_value) -> float:
+        """
+        Get the expected value of harvesting a pair now, plus the value of the rest of the grove afterwards
+        :param pair_type: The index of the colors of the pair in PAIR_TYPES
+        :param harvest_counts: The number of crops of every color harvested so far
+        :param future_value: A function from the harvest counts after this pair to the value of the rest of the grove
+        """
+        first_color, second_color = PAIR_TYPES[pair_type]
+        total_harvests = sum(harvest_counts)
+        # Every future value is looked up once, since the threshold and the value of the pair both use them
+        after_first = future_value(add_harvests(harvest_counts, first_color))
+        after_second = future_value(add_harvests(harvest_counts, second_color))
+        outcome = self.get_pair_outcome(first_color, total_harvests - harvest_counts[first_color],
+                                        second_color, total_harvests - harvest_counts[second_color],
+                                        self.get_threshold_from_values(first_color, second_color, after_first,
+                                                                       after_second))
+
+        value = outcome.expected_chosen_value + self.no_wilt_chance * (
+            outcome.expected_second_companion_value + outcome.expected_first_companion_value)
+        value += (1 - self.no_wilt_chance) * (outcome.first_chosen_chance * after_first +
+                                              (1 - outcome.first_chosen_chance) * after_second)
+        if self.no_wilt_chance > 0:
+            value += self.no_wilt_chance * future_value(add_harvests(harvest_counts, first_color, second_color))
+        return value
+
+    def get_grove_value(self, remaining: Tuple[int, ...], harvest_counts: Tuple[int, int, int] = (0, 0, 0)) -> float:
+        """
+        Get the expected value of the remaining pairs of a grove, harvested in the best order
+        :param remaining: The sorted indices (into PAIR_TYPES) of the colors of the remaining pairs
+        :param harvest_counts: The number of crops of every color harvested so far
+        """
+        return self.get_best_pair(remaining, harvest_counts)[1]
+
+    def get_best_pair(self, remaining: Tuple[int, ...],
+                      harvest_counts: Tuple[int, int, int] = (0, 0, 0)) -> Tuple[int, float]:
+        """
+        Get the pair that should be harvested next
+        :return: The index (into PAIR_TYPES) of the colors of the best pair, and the expected value of the grove
+        """
+        key = (remaining, harvest_counts)
+        if key not in self.grove_values:
+            best_pair, best_value = -1, 0.0
+            for pair_type in sorted(set(remaining)):
+                rest = list(remaining)
+                rest.remove(pair_type)
+                rest = tuple(rest)
+                future_value = functools.partial(self.get_grove_value, rest)
+                value = self.get_pair_value(pair_type, harvest_counts, future_value)
+                self.thresholds[(rest, harvest_counts, pair_type)] = self.get_choice_threshold(
+                    pair_type, harvest_counts, future_value)
+                if best_pair < 0 or value > best_value:
+                    best_pair, best_value = pair_type, value
+            self.grove_values[key] = (best_pair, best_value)
+        return self.grove_values[key]
+
+    def get_in_order_value(self, num_pairs: int, harvest_counts: Tuple[int, int, int] = (0, 0, 0)) -> float:
+        """Get the expected value of a grove whose pairs are harvested in the order they appear"""
+        key = (num_pairs, harvest_counts)
+        if key not in self.grove_values:
+            value = 0.0
+            if num_pairs > 0:
+                for pair_type, chance in enumerate(get_pair_type_chances(self.settings)):
+                    if chance > 0:
+                        value += chance * self.get_pair_value(
+                            pair_type, harvest_counts, functools.partial(self.get_in_order_value, num_pairs - 1))
+            self.grove_values[key] = value
+        return self.grove_values[key]
+
+    def get_expected_grove_value(self, optimal_order: bool = True) -> float:
+        """Get the expected value of a sacred grove over the number of pairs and the colors of every pair"""
+        num_pairs = harvest.get_harvest_count_distribution(self.settings)
+        pair_type_chances = get_pair_type_chances(self.settings)
+        total_value = 0.0
+        for count, count_chance in zip(num_pairs.support.astype(int), num_pairs.probabilities):
+            if not optimal_order:
+                total_value += count_chance * self.get_in_order_value(count)
+                continue
+            for pair_types in itertools.combinations_with_replacement(range(len(PAIR_TYPES)), count):
+                multiplicities = [pair_types.count(pair_type) for pair_type in set(pair_types)]
+                chance = math.factorial(count) / math.prod(math.factorial(m) for m in multiplicities)
+                chance *= math.prod(pair_type_chances[pair_type] for pair_type in pair_types)
+                if chance > 0:
+                    total_value += count_chance * chance * self.get_grove_value(pair_types)
+        return total_value
+
+    def plan_harvest_order(self, pairs: Sequence[Tuple[str, str]]) -> List[int]:
+        """
+        Get the best order to harvest the given pairs, assuming the more likely choice is made for each pair
+        :param pairs: The colors of each pair, for example [("yellow", "blue"), ("purple", "purple")]
+        :return: The indices of the pairs, in the order they should be harvested
+        """
+        pair_types = [PAIR_TYPES.index(tuple(sorted(COLORS.index(color) for color in pair))) for pair in pairs]
+        remaining = list(range(len(pairs)))
+        harvest_counts = (0, 0, 0)
+        order = []
+        while remaining:
+            best_type, _ = self.get_best_pair(tuple(sorted(pair_types[index] for index in remaining)), harvest_counts)
+            index = next(index for index in remaining if pair_types[index] == best_type)
+            order.append(index)
+            remaining.remove(index)
+            first_color, second_color = PAIR_TYPES[best_type]
+            total_harvests = sum(harvest_counts)
+            rest = tuple(sorted(pair_types[index] for index in remaining))
+            outcome = self.get_pair_outcome(first_color, total_harvests - harvest_counts[first_color],
+                                            second_color, total_harvests - harvest_counts[second_color],
+                                            self.thresholds[(rest, harvest_counts, best_type)])
+            harvested_color = first_color if outcome.first_chosen_chance >= 0.5 else second_color
+            harvest_counts = add_harvests(harvest_counts, harvested_color)
+        return order
+
+
+def add_harvests(harvest_counts: Tuple[int, int, int], *colors: int) -> Tuple[int, int, int]:
+    counts = list(harvest_counts)
+    for color in colors:
+        counts[color] += 1
+    return tuple(counts)
+
+
+def get_crop_rotation_grove_value(area_iiq: int, pack_size: int, settings: Settings, optimal_order: bool = True,
+                                  optimal_choices: bool = True) -> float:
+    """
+    Get the expected value of a sacred grove with crop rotation
+    :param area_iiq: The increased item quantity of the area
+    :param pack_size: The increased pack size of the area
+    :param settings: The settings
+    :param optimal_order: Whether the pairs are harvested in the best order (otherwise in the order they appear)
+    :param optimal_choices: Whether the crop harvested from each pair maximizes the value of the whole grove
+        (otherwise the crop with the higher value is harvested)
+    :return: The expected value of the sacred grove
+    """
+    key = (area_iiq, pack_size, optimal_order, optimal_choices, settings.frozen(CROP_ROTATION_FIELDS))
+    return grove_value_cache.get_or_compute(
+        key, lambda: CropRotationEngine(area_iiq, pack_size, settings, optimal_choices).get_expected_grove_value(
+            optimal_order))
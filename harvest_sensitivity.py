@@ -0,0 +1,225 @@
+"""
+Sensitivity of the map value to every numeric Settings field, and the value of discrete upgrades
+
+The map value is the product of the sacred grove spawn chance, the mean number of crop pairs and the crop pair value
+(harvest.get_overall_map_value). The spawn chance and the mean number of crop pairs are affine in their fields, so
+their derivatives are exact: the slope of an affine function is its value at 1 minus its value at 0. Every other
+numeric field (prices, lifeforce constants, quantities) goes through the maximum of two crops, so its derivative is
+a finite difference: a central difference for float fields, and the change from one more point for integer fields
+(such as quantity or increased chance percentages). The perturbed settings of every field of every scenario are
+evaluated together in a single harvest_batch call.
+
+Crop rotation groves are evaluated with a dynamic program (harvest_rotation) for every perturbed point instead, which
+takes up to about 0.17 s per point (see harvest_rotation): the sensitivity to every field of a crop rotation scenario
+takes several seconds. To halve the number of points, crop rotation scenarios use forward differences (which share the
+point of the scenario itself) instead of central differences; pass the fields of interest to get_sensitivities to
+limit the cost further.
+
+Discrete upgrades (every sextant, Heart of the Grove, Bumper Crop, ...) are evaluated with harvest.py, whose caches
+keep the seed tiers and color distributions that an upgrade does not change (for example, the three sextants share
+the same doubled color distributions). Upgrades that only change the spawn chance or the number of crop pairs reuse
+the crop pair value of the scenario.
+
+Example:
+    sensitivity = get_sensitivity(WANDERING_PATH_ATLAS_SETTINGS)
+    print(sensitivity.summary())
+    print(sensitivity.upgrades["yellow_sextant"])   # The profit of a yellow sextant, before its price
+"""
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+import harvest
+import harvest_batch
+from harvest import Settings, HARVEST_COUNT_FIELDS, SPAWN_FIELDS
+
+NUMERIC_FIELDS = tuple(field.name for field in dataclasses.fields(Settings) if field.type in (int, float))
+RELATIVE_STEP = 1e-4   # The step of a central difference, relative to the value of the field
+ZERO_STEP = 1e-6   # The step of a forward difference for a float field that is 0 (which may not go below 0)
+ANALYTIC, CENTRAL, FORWARD, UNIT = "analytic", "central", "forward", "+1"
+
+# The overrides that apply every discrete upgrade
+UPGRADES = {
+    "yellow_sextant": {"yellow_sextant": True, "purple_sextant": False, "blue_sextant": False},
+    "purple_sextant": {"yellow_sextant": False, "purple_sextant": True, "blue_sextant": False},
+    "blue_sextant": {"yellow_sextant": False, "purple_sextant": False, "blue_sextant": True},
+    "heart_of_the_grove": {"heart_of_the_grove": True},
+    "bumper_crop": {"bumper_crop": True},
+    "doubling_season": {"doubling_season": True},
+    "stream_of_consciousness": {"stream_of_consciousness": True},
+}
+
+
+@dataclass
+class MapValueFactors:
+    spawn_chance: float
+    harvest_count: float   # The mean number of crop pairs in a sacred grove
+    crop_pair_value: Optional[float]   # None if crops are rotated, as the grove value does not use it
+    grove_value: float   # The mean number of crop pairs times the crop pair value, unless crops are rotated
+
+    @property
+    def value(self) -> float:
+        return self.spawn_chance * self.grove_value
+
+
+@dataclass
+class Sensitivity:
+    value: float   # The map value of the scenario
+    derivatives: Dict[str, float]   # The change of the map value per unit of every numeric field
+    methods: Dict[str, str]   # How every derivative was computed
+    upgrades: Dict[str, float]   # The change of the map value from every discrete upgrade (0 if it is already applied)
+
+    def summary(self) -> str:
+        lines = ["Map value: {:.4f}".format(self.value), "", "{:<36} {:>14} {:>9}".format("field", "derivative",
+                                                                                           "method")]
+        for name in sorted(self.derivatives, key=lambda name: -abs(self.derivatives[name])):
+            lines.append("{:<36} {:>14.6g} {:>9}".format(name, self.derivatives[name], self.methods[name]))
+        lines.append("")
+        lines.append("{:<36} {:>14}".format("upgrade", "value"))
+        for name, value in self.upgrades.items():
+            lines.append("{:<36} {:>14.4f}".format(name, value))
+        return "\n".join(lines)
+
+
+def get_map_value_factors(settings: Settings, crop_pair_value: Optional[float] = None) -> MapValueFactors:
+    """
+    Get the factors of the map value of harvest.get_overall_map_value
+    :param settings: The settings
+    :param crop_pair_value: The crop pair value, if it is known not to differ from that of these settings
+    :return: The spawn chance, mean number of crop pairs, crop pair value and grove value
+    """
+    if settings.crop_rotation:
+        crop_pair_value = None
+    elif crop_pair_value is None:
+        area_iiq, pack_size = harvest.get_area_stats(settings)
+        crop_pair_value = harvest.get_crop_pair_value(area_iiq, pack_size, settings)
+    return MapValueFactors(
+        spawn_chance=float(harvest.get_harvest_spawn_chance(settings)),
+        harvest_count=float(harvest.get_harvest_count_distribution(settings).mean()),
+        crop_pair_value=None if crop_pair_value is None else float(crop_pair_value),
+        grove_value=float(harvest.get_sacred_grove_value(crop_pair_value, settings)),
+    )
+
+
+def get_affine_slope(function, settings: Settings, name: str) -> float:
+    """Get the slope of a function of the settings that is affine in one field"""
+    return function(dataclasses.replace(settings, **{name: 1})) - function(dataclasses.replace(settings, **{name: 0}))
+
+
+def get_analytic_derivatives(settings: Settings, factors: MapValueFactors, fields: Sequence[str]) -> Dict[str, float]:
+    """Get the exact derivatives of the fields that only affect the spawn chance or the number of crop pairs"""
+    derivatives = {}
+    for name in fields:
+        if name in SPAWN_FIELDS:
+            slope = get_affine_slope(harvest.get_harvest_spawn_chance, settings, name)
+            derivatives[name] = float(slope * factors.grove_value)
+        elif name in HARVEST_COUNT_FIELDS and not settings.crop_rotation:
+            # Crop rotation groves are not made of independent crop pairs, so their value is not affine
+            slope = get_affine_slope(lambda settings: harvest.get_harvest_count_distribution(settings).mean(),
+                                     settings, name)
+            derivatives[name] = float(factors.spawn_chance * slope * factors.crop_pair_value)
+    return derivatives
+
+
+def get_steps(settings: Settings, name: str):
+    """
+    Get the perturbed values of a field for a finite difference
+    :return: The lower and upper values, and the method
+    """
+    value = getattr(settings, name)
+    if isinstance(value, int):
+        return value, value + 1, UNIT
+    if value == 0:
+        return 0.0, ZERO_STEP, FORWARD
+    if settings.crop_rotation:
+        # Every point of a crop rotation scenario is expensive, and forward differences share the unperturbed point
+        return value, value + RELATIVE_STEP * abs(value), FORWARD
+    step = RELATIVE_STEP * abs(value)
+    return value - step, value + step, CENTRAL
+
+
+def get_upgrade_values(settings: Settings, factors: MapValueFactors,
+                       upgrades: Mapping[str, Mapping[str, object]] = UPGRADES) -> Dict[str, float]:
+    """
+    Get the change of the map value from every discrete upgrade
+    :param settings: The settings
+    :param factors: The factors of the map value of the settings
+    :param upgrades: A mapping from upgrade names to the overrides that apply them
+    :return: A mapping from upgrade names to the change of the map value
+    """
+    crop_pair_fields = set(harvest.SETTINGS_FIELDS) - set(SPAWN_FIELDS) - set(HARVEST_COUNT_FIELDS)
+    values = {}
+    for upgrade, overrides in upgrades.items():
+        upgraded = dataclasses.replace(settings, **overrides)
+        if upgraded == settings:
+            values[upgrade] = 0.0
+            continue
+        changed_fields = {name for name in overrides if getattr(upgraded, name) != getattr(settings, name)}
+        if changed_fields & crop_pair_fields:
+            upgraded_factors = get_map_value_factors(upgraded)
+        else:
+            upgraded_factors = get_map_value_factors(upgraded, factors.crop_pair_value)
+        values[upgrade] = float(upgraded_factors.value - factors.value)
+    return values
+
+
+def get_sensitivities(settings_list: Sequence[Settings], fields: Optional[Sequence[str]] = None,
+                      upgrades: Mapping[str, Mapping[str, object]] = UPGRADES) -> List[Sensitivity]:
+    """
+    Get the derivatives of the map value and the value of discrete upgrades for every scenario
+    Crop rotation scenarios take up to about 0.17 s per numeric field (see the module documentation).
+    :param settings_list: The scenarios
+    :param fields: The numeric fields to differentiate with respect to (every numeric field by default)
+    :param upgrades: A mapping from upgrade names to the overrides that apply them
+    :return: The sensitivity of every scenario
+    """
+    fields = NUMERIC_FIELDS if fields is None else list(fields)
+    unknown_fields = set(fields) - set(NUMERIC_FIELDS)
+    if unknown_fields:
+        raise ValueError("Fields that are not numeric: {}".format(", ".join(sorted(unknown_fields))))
+
+    factors_list, derivatives_list, methods_list, upgrades_list = [], [], [], []
+    perturbed, differences = [], []   # differences: (scenario, field, lower point, upper point, step)
+    for index, settings in enumerate(settings_list):
+        factors = get_map_value_factors(settings)
+        derivatives = get_analytic_derivatives(settings, factors, fields)
+        methods = dict.fromkeys(derivatives, ANALYTIC)
+        base_point = None
+        for name in fields:
+            if name in derivatives:
+                continue
+            low, high, methods[name] = get_steps(settings, name)
+            if methods[name] == CENTRAL:
+                low_point = len(perturbed)
+                perturbed.append(dataclasses.replace(settings, **{name: low}))
+            else:
+                # Forward differences of every field of a scenario share the point of the scenario itself
+                if base_point is None:
+                    base_point = len(perturbed)
+                    perturbed.append(settings)
+                low_point = base_point
+            differences.append((index, name, low_point, len(perturbed), high - low))
+            perturbed.append(dataclasses.replace(settings, **{name: high}))
+        factors_list.append(factors)
+        derivatives_list.append(derivatives)
+        methods_list.append(methods)
+        upgrades_list.append(get_upgrade_values(settings, factors, upgrades))
+
+    values = harvest_batch.get_overall_map_values(perturbed) if perturbed else np.zeros(0)
+    for index, name, low_point, high_point, step in differences:
+        derivatives_list[index][name] = float(values[high_point] - values[low_point]) / step
+    return [Sensitivity(value=float(factors.value), derivatives={name: derivatives[name] for name in fields},
+                        methods={name: methods[name] for name in fields}, upgrades=upgrade_values)
+            for factors, derivatives, methods, upgrade_values
+            in zip(factors_list, derivatives_list, methods_list, upgrades_list)]
+
+
+def get_sensitivity(settings: Settings, fields: Optional[Sequence[str]] = None,
+                    upgrades: Mapping[str, Mapping[str, object]] = UPGRADES) -> Sensitivity:
+    return get_sensitivities([settings], fields, upgrades)[0]
+
+
+if __name__ == "__main__":
+    print(get_sensitivity(Settings()).summary())
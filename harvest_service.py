@@ -0,0 +1,266 @@
+"""
+Local HTTP service that evaluates map values, for dashboards that query the model interactively
+
+Endpoints (JSON in and out):
+* POST /evaluate with a JSON object of Settings overrides returns the value, area IIQ, pack size and spawn chance
+  (the same fields as harvest_cli)
+* GET /metrics returns request, batch, latency, throughput and cache statistics
+* GET /health returns {"status": "ok"}
+
+Requests are validated before they are queued, and requests that arrive close together are collected into
+micro-batches (up to max_batch_size requests, waiting at most max_wait seconds after the first one) and evaluated
+together with harvest_batch in a worker thread, so the event loop keeps accepting requests meanwhile. If a batch fails,
+its requests are evaluated one at a time, so that one failing scenario does not fail the others. At most
+max_queue_size requests wait for a batch; beyond that, requests are rejected with 503 until the queue drains.
+
+The results of recent scenarios are kept in an LRU cache of results (service_results): harvest_batch computes every
+distribution of a batch from scratch, without the distribution caches of harvest.py. Only crop rotation scenarios,
+which harvest_batch evaluates with harvest.py, use (and keep warm) the caches of harvest.py. The server only listens on
+localhost.
+
+Example: python harvest_service.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import harvest
+import harvest_cli
+from harvest_cache import LRUCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT = 0.002   # Seconds
+DEFAULT_MAX_QUEUE_SIZE = 4096   # Requests waiting for a batch
+LATENCY_WINDOW = 10000   # Number of recent requests used for the latency percentiles
+MAX_BODY_SIZE = 1 << 20
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                  500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class EvaluationService:
+    """
+    Evaluates Settings overrides in micro-batches
+    """
+
+    def __init__(self, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait: float = DEFAULT_MAX_WAIT,
+                 cache_size: int = 65536, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.results = LRUCache("service_results", cache_size)
+        self.queue = None
+        self.batcher = None
+        self.start_time = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.evaluated = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.max_queue_size)
+        self.batcher = asyncio.ensure_future(self.run_batches())
+        # Evaluate once before the first request, so that its latency does not include the first use of numpy
+        await self.evaluate({})
+
+    async def stop(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+
+    async def evaluate(self, overrides: Dict) -> Dict:
+        """
+        Evaluate one set of Settings overrides
+        Raises ValueError if the overrides are not valid, and asyncio.QueueFull if too many requests are waiting.
+        """
+        start = time.perf_counter()
+        self.requests += 1
+        overrides = harvest_cli.validate_overrides(overrides)
+        key = tuple(sorted(overrides.items()))
+        result = self.results.get(key)
+        if result is None:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self.queue.put_nowait((key, overrides, future))
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise
+            result = await future
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            # Identical requests in a batch are only evaluated once
+            unique = {key: overrides for key, overrides, _ in batch}
+            errors = {}
+            try:
+                results = await loop.run_in_executor(None, harvest_cli.evaluate_overrides, list(unique.values()))
+                results = dict(zip(unique, results))
+            except Exception:
+                # Evaluate the requests one at a time, so that only the failing ones fail
+                self.failed_batches += 1
+                results = {}
+                for key, overrides in unique.items():
+                    try:
+                        results[key], = await loop.run_in_executor(None, harvest_cli.evaluate_overrides, [overrides])
+                    except Exception as error:
+                        errors[key] = error
+            self.batches += 1
+            self.evaluated += len(unique)
+            for key, result in results.items():
+                self.results.put(key, result)
+            for key, _, future in batch:
+                if future.done():
+                    continue
+                if key in errors:
+                    future.set_exception(errors[key])
+                else:
+                    future.set_result(results[key])
+
+    def get_metrics(self) -> Dict:
+        uptime = time.monotonic() - self.start_time
+        latencies = np.array(self.latencies) * 1000
+        percentiles = {"p{}".format(q): float(np.percentile(latencies, q)) if len(latencies) else None
+                       for q in (50, 95, 99)}
+        return {
+            "uptime_seconds": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "requests_per_second": self.requests / uptime if uptime > 0 else 0.0,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "evaluated": self.evaluated,
+            "mean_batch_size": self.evaluated / self.batches if self.batches else 0.0,
+            "latency_ms": percentiles,
+            "caches": [info._asdict() for info in [self.results.info()] + harvest.get_cache_info()],
+        }
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Read one HTTP request, or return None if the connection was closed"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_SIZE:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], headers, body
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, content: Dict, keep_alive: bool):
+    body = json.dumps(content).encode()
+    head = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n".format(
+        status, STATUS_REASONS[status], len(body), "keep-alive" if keep_alive else "close")
+    writer.write(head.encode("latin-1") + body)
+
+
+async def handle_request(service: EvaluationService, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+    if path == "/evaluate":
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            overrides = json.loads(body or b"{}")
+            return 200, await service.evaluate(overrides)
+        except ValueError as error:
+            service.errors += 1
+            return 400, {"error": str(error)}
+        except asyncio.QueueFull:
+            return 503, {"error": "Too many requests are waiting, retry later"}
+    if path == "/metrics":
+        return 200, service.get_metrics()
+    if path == "/health":
+        return 200, {"status": "ok"}
+    return 404, {"error": "Unknown path: {}".format(path)}
+
+
+async def handle_connection(service: EvaluationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError) as error:
+                write_response(writer, 400, {"error": str(error)}, False)
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+            try:
+                status, content = await handle_request(service, method, path, body)
+            except Exception as error:
+                service.errors += 1
+                status, content = 500, {"error": str(error)}
+            write_response(writer, status, content, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int = DEFAULT_PORT, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                max_wait: float = DEFAULT_MAX_WAIT, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+    """
+    Run the service on localhost until it is cancelled
+    :param port: The port to listen on
+    :param max_batch_size: The largest number of requests evaluated together
+    :param max_wait: The longest time (in seconds) a request waits for other requests to join its batch
+    :param max_queue_size: The largest number of requests waiting for a batch
+    """
+    service = EvaluationService(max_batch_size, max_wait, max_queue_size=max_queue_size)
+    await service.start()
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer),
+                                        DEFAULT_HOST, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve map values over HTTP on localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT, help="Seconds to wait for a batch to fill")
+    parser.add_argument("--max-queue-size", type=int, default=DEFAULT_MAX_QUEUE_SIZE,
+                        help="Requests waiting for a batch beyond which requests are rejected")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.max_batch_size, args.max_wait, args.max_queue_size))
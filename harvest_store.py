@@ -0,0 +1,302 @@
+"""
+Persistent store of computed results, shared by processes and kept between runs
+
+Results are stored in a SQLite database, keyed by a kind (such as "map_value"), a canonical hash of the inputs and a
+fingerprint of the source code of every module the results depend on (harvest_cache.MODEL_FILES). When the model code
+changes, the fingerprint changes, so the results of the old code are never read again. They are not deleted when the
+store is opened (several checkouts of different versions may share a store), but since they are no longer used, they
+are the first results to be evicted.
+
+The database is opened in write-ahead logging mode, so several processes (for example the workers of a sweep) can
+read while one of them writes, and writers wait for each other instead of failing. Lookups only read: the access
+times used for eviction are buffered and written together with the next put (or when the store is closed). When the
+stored values exceed the size limit, the least recently used results are evicted.
+
+Example:
+    with ResultStore() as store:
+        values = get_overall_map_values(settings_list, store)   # Only the settings not in the store are evaluated
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+import harvest
+import harvest_batch
+from harvest import DiscreteDistribution, Settings, CROP_VALUE_FIELDS
+from harvest_cache import get_model_fingerprint
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(BASE_DIR, ".harvest_store.sqlite")
+DEFAULT_MAX_BYTES = 256 << 20
+EVICTION_SLACK = 0.1   # Evict down to this fraction below the size limit, so that eviction does not run on every put
+QUERY_CHUNK_SIZE = 500   # Below the limit on the number of parameters of a SQLite query
+DEFAULT_TIMEOUT = 60.0   # Seconds to wait for another process to finish writing
+MAX_PENDING_TOUCHES = 10000   # The number of buffered access times above which they are written without a put
+MAP_VALUE_KIND = "map_value"
+CROP_VALUE_KIND = "crop_value_distribution"
+FLOAT_FIELDS = frozenset(field.name for field in dataclasses.fields(Settings) if field.type in (float, "float"))
+
+StoreInfo = namedtuple("StoreInfo", ["path", "model", "entries", "bytes", "hits", "misses", "evictions",
+                                     "stale_entries"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (kind, key, model)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def get_key(*parts) -> str:
+    """Get a canonical hash of JSON-compatible parts (such as the items of frozen settings)"""
+    text = json.dumps(parts, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_settings_key(settings: Settings, fields: Optional[Sequence[str]] = None) -> str:
+    """
+    Get a canonical hash of (some of) the fields of the settings
+    Float fields are hashed as floats, so that for example 240 and 240.0 give the same key.
+    """
+    return get_key([[name, float(value) if name in FLOAT_FIELDS else value]
+                    for name, value in settings.frozen(fields)])
+
+
+class ResultStore:
+    """
+    A persistent mapping from (kind, key) pairs to picklable values, for the current model code
+
+    The store can be passed to worker processes: every process opens its own connection to the database.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES, model: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param path: The path of the SQLite database (created if it does not exist)
+        :param max_bytes: The largest total size of the stored values
+        :param model: The fingerprint of the model (get_model_fingerprint() by default)
+        :param timeout: The number of seconds to wait for another process to finish writing
+        """
+        if max_bytes <= 0:
+            raise ValueError("The size limit of the store must be positive")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.model = model if model is not None else get_model_fingerprint()
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._pid = None
+        self._pending_touches = {}   # The access times that are not written yet, by (kind, key)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        state["_pending_touches"] = {}
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # A connection cannot be shared with a forked process, so every process opens its own
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # The schema is only created if it is missing, so that opening a store to read never waits for writers
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone() \
+                    is None:
+                with Transaction(connection):
+                    for statement in SCHEMA.split(";"):
+                        if statement.strip():
+                            connection.execute(statement)
+            self._connection, self._pid, self._pending_touches = connection, os.getpid(), {}
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self.flush()
+            self._connection.close()
+        self._connection, self._pid = None, None
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, object]:
+        """
+        Get the stored values of several keys
+        :return: A mapping from the keys that are in the store to their values
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        connection = self.connection
+        for start in range(0, len(keys), QUERY_CHUNK_SIZE):
+            chunk = keys[start:start + QUERY_CHUNK_SIZE]
+            rows = connection.execute(
+                "SELECT key, value FROM results WHERE kind = ? AND model = ? AND key IN ({})".format(
+                    ",".join("?" * len(chunk))), [kind, self.model] + chunk).fetchall()
+            found.update((key, pickle.loads(value)) for key, value in rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        self.touch(kind, found)
+        return found
+
+    def put_many(self, kind: str, items: Mapping[str, object]):
+        """Store several values, evicting the least recently used values if the store exceeds its size limit"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((kind, key, self.model, data, len(data), now))
+        connection = self.connection
+        with Transaction(connection):
+            self.write_touches(connection)
+            connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.evict(self.max_bytes)
+
+    def get(self, kind: str, key: str, default=None):
+        return self.get_many(kind, [key]).get(key, default)
+
+    def put(self, kind: str, key: str, value):
+        self.put_many(kind, {key: value})
+
+    def touch(self, kind: str, keys: Iterable[str]):
+        """Mark values as recently used (the access times are written with the next put, or by flush)"""
+        now = time.time()
+        self._pending_touches.update(((kind, key), now) for key in keys)
+        if len(self._pending_touches) >= MAX_PENDING_TOUCHES:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered access times"""
+        if self._pending_touches:
+            connection = self.connection
+            with Transaction(connection):
+                self.write_touches(connection)
+
+    def write_touches(self, connection: sqlite3.Connection):
+        # Only called within a write transaction
+        connection.executemany("UPDATE results SET accessed = ? WHERE kind = ? AND key = ? AND model = ?",
+                               [(accessed, kind, key, self.model)
+                                for (kind, key), accessed in self._pending_touches.items()])
+        self._pending_touches = {}
+
+    def get_size(self) -> int:
+        """Get the total size of the stored values, in bytes"""
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self, max_bytes: int):
+        """
+        If the stored values exceed the given size, remove the least recently used values
+        The results of other versions of the model code are only removed here, when they are the least recently used.
+        """
+        connection = self.connection
+        with Transaction(connection):
+            size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if size <= max_bytes:
+                return
+            target = max_bytes * (1 - EVICTION_SLACK)
+            evicted_rowids = []
+            rows = connection.execute("SELECT rowid, size FROM results ORDER BY accessed").fetchall()
+            for rowid, value_size in rows:
+                if size <= target:
+                    break
+                evicted_rowids.append((rowid,))
+                size -= value_size
+            connection.executemany("DELETE FROM results WHERE rowid = ?", evicted_rowids)
+        self.evictions += len(evicted_rowids)
+
+    def info(self) -> StoreInfo:
+        entries, size, stale_entries = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(model != ?), 0) FROM results",
+            (self.model,)).fetchone()
+        return StoreInfo(self.path, self.model, entries, size, self.hits, self.misses, self.evictions, stale_entries)
+
+    def clear(self):
+        """Remove every stored value and reset the statistics"""
+        connection = self.connection
+        with Transaction(connection):
+            connection.execute("DELETE FROM results")
+        self._pending_touches = {}
+        self.hits = self.misses = self.evictions = 0
+
+
+class Transaction:
+    """
+    A write transaction that takes the write lock when it starts, so that concurrent writers wait for each other
+    instead of failing when they try to upgrade a read lock
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+def get_overall_map_values(settings_list: Sequence[Settings], store: ResultStore) -> np.ndarray:
+    """
+    Get the map value of every settings, evaluating (with harvest_batch) and storing only those not in the store
+    :param settings_list: The settings to evaluate
+    :param store: The store of results
+    :return: The map values
+    """
+    keys = [get_settings_key(settings) for settings in settings_list]
+    found = store.get_many(MAP_VALUE_KIND, keys)
+    missing = {}
+    for key, settings in zip(keys, settings_list):
+        if key not in found:
+            missing.setdefault(key, settings)
+    if missing:
+        values = harvest_batch.get_overall_map_values(list(missing.values()))
+        computed = {key: float(value) for key, value in zip(missing, values)}
+        store.put_many(MAP_VALUE_KIND, computed)
+        found.update(computed)
+    return np.array([found[key] for key in keys], dtype=float)
+
+
+def get_overall_map_value(settings: Settings, store: ResultStore) -> float:
+    return float(get_overall_map_values([settings], store)[0])
+
+
+def get_crop_value_distribution(area_iiq: int, pack_size: int, color_value: float, settings: Settings,
+                                store: ResultStore) -> DiscreteDistribution:
+    """
+    Get the distribution of the value of a crop of one color (as harvest.get_crop_value_distribution_directly),
+    computing and storing it only if it is not in the store
+    """
+    key = get_key(int(area_iiq), int(pack_size), float(color_value), bool(harvest.has_sextant(settings)),
+                  get_settings_key(settings, CROP_VALUE_FIELDS))
+    distribution = store.get(CROP_VALUE_KIND, key)
+    if distribution is None:
+        distribution = harvest.get_crop_value_distribution_directly(area_iiq, pack_size, color_value, settings)
+        store.put(CROP_VALUE_KIND, key, distribution)
+    return distribution.read_only()
+
+
+if __name__ == "__main__":
+    print(ResultStore().info())
@@ -0,0 +1,125 @@
+"""
+Parameter sweeps over Settings, evaluated in parallel
+
+A sweep takes base settings (or several named presets) and named axes of values, evaluates the map value of every
+combination and returns a tidy table with one row per combination. Identical points are only evaluated once, and the
+unique points are split into chunks that are evaluated with harvest_batch on a pool of worker processes. With a
+harvest_store.ResultStore, points evaluated by earlier sweeps (with the same model code) are read from the store.
+"""
+import dataclasses
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+import harvest_batch
+import harvest_store
+from harvest import Settings, SETTINGS_FIELDS
+
+# A pseudo-axis selecting the sextant color (None, "yellow", "purple" or "blue")
+SEXTANT_AXIS = "sextant"
+SEXTANT_FIELDS = {"yellow": "yellow_sextant", "purple": "purple_sextant", "blue": "blue_sextant"}
+PRESET_COLUMN = "preset"
+VALUE_COLUMN = "value"
+DEFAULT_CHUNK_SIZE = 1024
+
+
+@dataclass
+class SweepResult:
+    columns: Dict[str, np.ndarray]   # One column per axis (and preset), plus the map value of every row
+
+    def __len__(self):
+        return len(self.columns[VALUE_COLUMN])
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.columns[VALUE_COLUMN]
+
+    def where(self, **conditions) -> "SweepResult":
+        """Get the rows where every given column has the given value"""
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            mask &= np.array([row_value == value for row_value in self.columns[name]])
+        return SweepResult({name: column[mask] for name, column in self.columns.items()})
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns)
+
+
+def apply_axis_value(settings: Settings, name: str, value) -> Settings:
+    if name == SEXTANT_AXIS:
+        if value is not None and value not in SEXTANT_FIELDS:
+            raise ValueError("Unknown sextant color: {}".format(value))
+        overrides = {field: color == value for color, field in SEXTANT_FIELDS.items()}
+    elif name in SETTINGS_FIELDS:
+        overrides = {name: value}
+    else:
+        raise ValueError("Unknown sweep axis: {}".format(name))
+    return dataclasses.replace(settings, **overrides)
+
+
+def evaluate_chunk(settings_list: List[Settings]) -> np.ndarray:
+    return harvest_batch.get_overall_map_values(settings_list)
+
+
+def sweep(base: Union[Settings, Mapping[str, Settings]], axes: Mapping[str, Sequence],
+          processes: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+          store: Optional[harvest_store.ResultStore] = None) -> SweepResult:
+    """
+    Evaluate the map value of every combination of the given axes
+    :param base: The base settings, or a mapping from preset names to base settings (adds a "preset" column)
+    :param axes: A mapping from Settings field names (or "sextant") to the values to sweep over
+    :param processes: The number of worker processes (all cores by default, 1 to evaluate in this process)
+    :param chunk_size: The number of points sent to a worker at once
+    :param store: A harvest_store.ResultStore to read and write the values of the points (none by default)
+    :return: A table with one row per combination, in the order of itertools.product over the presets and axes
+    """
+    presets = dict(base) if isinstance(base, Mapping) else {None: base}
+    axis_names = list(axes)
+    rows = []
+    unique_points = {}
+    point_indices = []
+    for preset_name, preset in presets.items():
+        for axis_values in itertools.product(*(axes[name] for name in axis_names)):
+            settings = preset
+            for name, value in zip(axis_names, axis_values):
+                settings = apply_axis_value(settings, name, value)
+            point_indices.append(unique_points.setdefault(settings.frozen(), len(unique_points)))
+            rows.append((preset_name,) + axis_values)
+    unique_settings = [Settings(**dict(key)) for key in unique_points]
+    unique_values = np.zeros(len(unique_settings))
+    missing_indices = list(range(len(unique_settings)))
+    if store is not None:
+        keys = [harvest_store.get_settings_key(settings) for settings in unique_settings]
+        stored_values = store.get_many(harvest_store.MAP_VALUE_KIND, keys)
+        missing_indices = [index for index, key in enumerate(keys) if key not in stored_values]
+        unique_values[:] = [stored_values.get(key, 0.0) for key in keys]
+    missing_settings = [unique_settings[index] for index in missing_indices]
+
+    chunks = [missing_settings[start:start + chunk_size] for start in range(0, len(missing_settings), chunk_size)]
+    if processes is None:
+        processes = min(os.cpu_count() or 1, len(chunks))
+    if processes <= 1 or len(chunks) <= 1:
+        chunk_values = [evaluate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunk_values = list(executor.map(evaluate_chunk, chunks))
+    if chunk_values:
+        missing_values = np.concatenate(chunk_values)
+        unique_values[missing_indices] = missing_values
+        if store is not None:
+            store.put_many(harvest_store.MAP_VALUE_KIND,
+                           {keys[index]: float(value) for index, value in zip(missing_indices, missing_values)})
+
+    columns = {}
+    column_names = ([PRESET_COLUMN] if isinstance(base, Mapping) else []) + axis_names
+    offset = 0 if isinstance(base, Mapping) else 1
+    for index, name in enumerate(column_names):
+        column = [row[index + offset] for row in rows]
+        columns[name] = np.array(column, dtype=object if any(value is None for value in column) else None)
+    columns[VALUE_COLUMN] = unique_values[np.array(point_indices, dtype=np.int64)]
+    return SweepResult(columns)
@@ -0,0 +1,260 @@
+"""
+Goodness of fit of the seed and lifeforce models of harvest.py to the experimental data in data/*.csv
+
+For every level 83 plot of the plot data, the number of T4, T3 and T2 seeds is compared with the seed tiers of
+harvest.get_seed_tiers (the tiers used by get_crop_value_distribution_directly), with the Heart of the Grove and
+increased T3 chance passives of the plot applied. For every crop of the map data, the total normalized lifeforce of its
+stacks is compared with harvest.get_expected_lifeforce for its seeds and pack size (normalized lifeforce does not
+include the quantity of lifeforce or sextant bonuses, so neither does the prediction).
+
+The predictions are computed once per combination of passives and indexed for all plots at once, so validating every
+plot takes a few milliseconds after the datasets are loaded. The report has:
+* for every seed tier, the log likelihood of the observed counts and a chi-square test of the histogram of counts
+* for every combination of the harvest_* passive columns, the observed and predicted mean of every quantity with a
+  standardized residual, which shows which passives the model does not account for
+
+Example:
+    report = validate(Settings())
+    print(report.summary())
+"""
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import harvest
+import harvest_data
+from harvest import Settings
+from harvest_calibration import CALIBRATION_LEVEL, TIERS, get_column, get_crop_seeds, get_crops, get_sacred_drops
+
+SEED_TIERS = TIERS[:3]   # The number of T1 seeds is whatever is left of the plot
+MIN_EXPECTED_COUNT = 5   # Bins of the chi-square tests are pooled until they are expected to have this many plots
+# The harvest_* columns of the data and their default values for leagues without them
+PASSIVE_COLUMNS = {
+    "harvest_t4_wilt": False,
+    "harvest_increased_t3": 0,
+    "harvest_additional_monster": 0,
+    "harvest_duplicate_monsters": 0,
+    "harvest_duplicate_lifeforce": 0,
+    "harvest_yellow_sextant": False,
+}
+# The settings used for the lifeforce of the normalized stacks. The monster duplication passive is left out on
+# purpose, as it did not work when the 3.20 data was collected
+NORMALIZED_SETTINGS = {"increased_quantity_of_lifeforce": 0, "duplicated_monsters_chance": 0,
+                       "yellow_sextant": False, "blue_sextant": False, "purple_sextant": False}
+
+
+@dataclass
+class TierFit:
+    tier: str
+    plots: int
+    log_likelihood: float
+    observed: np.ndarray   # The number of plots with every number of seeds
+    expected: np.ndarray   # The predicted number of plots with every number of seeds
+    chi_square: float
+    degrees_of_freedom: int   # After pooling bins with small expected counts
+    p_value: float
+
+
+@dataclass
+class GroupResidual:
+    quantity: str   # "t4", "t3" or "t2" seeds per plot, or "lifeforce" per crop
+    passives: Dict[str, object]   # The values of the harvest_* columns of the group
+    count: int   # The number of plots or crops
+    observed_mean: float
+    predicted_mean: float
+    standardized_residual: float
+
+
+@dataclass
+class ValidationReport:
+    tiers: Dict[str, TierFit]
+    residuals: List[GroupResidual]
+    plot_log_likelihoods: np.ndarray   # The log likelihood of the seeds of every tier of every plot, (plots, tiers)
+    crop_residuals: np.ndarray   # Observed minus predicted normalized lifeforce of every crop
+
+    def summary(self) -> str:
+        lines = []
+        for fit in self.tiers.values():
+            lines.append("{} seeds: {} plots, log likelihood {:.1f}, chi-square {:.2f} with {} degrees of freedom "
+                         "(p = {:.3g})".format(fit.tier.upper(), fit.plots, fit.log_likelihood, fit.chi_square,
+                                               fit.degrees_of_freedom, fit.p_value))
+        for residual in self.residuals:
+            passives = ", ".join("{}={}".format(name[len("harvest_"):], value)
+                                 for name, value in residual.passives.items())
+            lines.append("{} ({}; {}): observed {:.3f}, predicted {:.3f}, z = {:+.2f}".format(
+                residual.quantity, passives, residual.count, residual.observed_mean, residual.predicted_mean,
+                residual.standardized_residual))
+        return "\n".join(lines)
+
+
+def get_passives(dataset: harvest_data.ColumnarDataset, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Get the harvest_* columns of a dataset (with their defaults if missing) as a (rows, columns) float array"""
+    columns = [get_column(dataset, name, default) for name, default in PASSIVE_COLUMNS.items()]
+    passives = np.stack(columns, axis=1).astype(float)
+    return passives if rows is None else passives[rows]
+
+
+def get_passive_groups(passives: np.ndarray):
+    """
+    Group rows by their passives, ignoring the passives that are the same for every row
+    :return: The passives of every group (as dictionaries) and the group of every row
+    """
+    varying = np.flatnonzero(np.any(passives != passives[:1], axis=0))
+    unique_passives, groups = np.unique(passives[:, varying], axis=0, return_inverse=True)
+    names = [list(PASSIVE_COLUMNS)[index] for index in varying]
+    descriptions = [{name: type(PASSIVE_COLUMNS[name])(value) for name, value in zip(names, row)}
+                    for row in unique_passives]
+    return descriptions, groups.reshape(-1)
+
+
+def get_group_residuals(quantity: str, descriptions: Sequence[Dict], groups: np.ndarray, observed: np.ndarray,
+                        predicted: np.ndarray, variances: np.ndarray) -> List[GroupResidual]:
+    """Compare the observed and predicted sums of a quantity in every group, relative to the predicted variances"""
+    num_groups = len(descriptions)
+    counts = np.bincount(groups, minlength=num_groups)
+    observed_sums = np.bincount(groups, weights=observed, minlength=num_groups)
+    predicted_sums = np.bincount(groups, weights=predicted, minlength=num_groups)
+    variance_sums = np.bincount(groups, weights=variances, minlength=num_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (observed_sums - predicted_sums) / np.sqrt(variance_sums)
+    return [GroupResidual(quantity, descriptions[index], int(counts[index]), observed_sums[index] / counts[index],
+                          predicted_sums[index] / counts[index], float(z[index]))
+            for index in range(num_groups) if counts[index] > 0]
+
+
+def get_chi_square(observed: np.ndarray, expected: np.ndarray):
+    """
+    Pearson's chi-square test of a histogram, pooling neighbouring bins until every bin is expected to have at least
+    MIN_EXPECTED_COUNT observations
+    :return: The statistic, the degrees of freedom and the p-value
+    """
+    import scipy.stats
+    pooled_observed, pooled_expected = [], []
+    observed_total, expected_total = 0.0, 0.0
+    for observed_count, expected_count in zip(observed, expected):
+        observed_total += observed_count
+        expected_total += expected_count
+        if expected_total >= MIN_EXPECTED_COUNT:
+            pooled_observed.append(observed_total)
+            pooled_expected.append(expected_total)
+            observed_total, expected_total = 0.0, 0.0
+    if pooled_expected:
+        pooled_observed[-1] += observed_total
+        pooled_expected[-1] += expected_total
+    pooled_observed, pooled_expected = np.array(pooled_observed), np.array(pooled_expected)
+    degrees_of_freedom = len(pooled_expected) - 1
+    if degrees_of_freedom < 1:
+        return 0.0, 0, 1.0
+    statistic = float(np.sum((pooled_observed - pooled_expected) ** 2 / pooled_expected))
+    return statistic, degrees_of_freedom, float(scipy.stats.chi2.sf(statistic, degrees_of_freedom))
+
+
+def validate_seeds(settings: Settings, plot_seeds: np.ndarray, passives: np.ndarray):
+    """
+    Compare the seeds of every plot with the seed tiers
+    :param plot_seeds: The number of seeds of every tier of every plot, (plots, tiers in the order of TIERS)
+    :param passives: The harvest_* columns of every plot
+    :return: The fit of every tier, the residuals by passives, and the log likelihood of every plot and tier
+    """
+    names = list(PASSIVE_COLUMNS)
+    tier_settings, settings_index = np.unique(
+        passives[:, [names.index("harvest_t4_wilt"), names.index("harvest_increased_t3")]], axis=0,
+        return_inverse=True)
+    settings_index = settings_index.reshape(-1)
+    all_tiers = [harvest.get_seed_tiers(dataclasses.replace(settings, heart_of_the_grove=bool(t4_wilt),
+                                                            increased_t3_crop_chance=int(increased_t3)))
+                 for t4_wilt, increased_t3 in tier_settings]
+    descriptions, groups = get_passive_groups(passives)
+
+    fits, residuals = {}, []
+    log_likelihoods = np.zeros((len(plot_seeds), len(SEED_TIERS)))
+    for tier_index, tier in enumerate(SEED_TIERS):
+        # The probability of every number of seeds for every combination of passives, padded to the same length
+        max_count = max(int(plot_seeds[:, tier_index].max(initial=0)),
+                        max(len(tiers[tier_index].support) for tiers in all_tiers) - 1)
+        pmfs = np.zeros((len(all_tiers), max_count + 1))
+        for index, tiers in enumerate(all_tiers):
+            pmfs[index, :len(tiers[tier_index].probabilities)] = tiers[tier_index].probabilities
+        counts = plot_seeds[:, tier_index]
+        with np.errstate(divide="ignore"):
+            log_likelihoods[:, tier_index] = np.log(pmfs[settings_index, counts])
+        observed = np.bincount(counts, minlength=max_count + 1)
+        expected = np.bincount(settings_index, minlength=len(all_tiers)) @ pmfs
+        chi_square, degrees_of_freedom, p_value = get_chi_square(observed, expected)
+        fits[tier] = TierFit(tier, len(counts), float(np.sum(log_likelihoods[:, tier_index])), observed, expected,
+                             chi_square, degrees_of_freedom, p_value)
+
+        support = np.arange(max_count + 1)
+        means = pmfs @ support
+        variances = pmfs @ support ** 2 - means ** 2
+        residuals += get_group_residuals(tier, descriptions, groups, counts.astype(float), means[settings_index],
+                                         variances[settings_index])
+    return fits, residuals, log_likelihoods
+
+
+def predict_crop_lifeforce(settings: Settings, crop_seeds: np.ndarray, pack_size: np.ndarray,
+                           passives: np.ndarray):
+    """
+    Predict the total normalized lifeforce of every crop from its seeds
+    :return: The expected lifeforce of every crop and an estimate of its variance (Poisson numbers of stacks)
+    """
+    names = list(PASSIVE_COLUMNS)
+    doubling_season = passives[:, names.index("harvest_duplicate_lifeforce")] > 0
+    predicted, variances = np.zeros(len(crop_seeds)), np.zeros(len(crop_seeds))
+    for doubling in np.unique(doubling_season):
+        rows = doubling_season == doubling
+        crop_settings = dataclasses.replace(settings, doubling_season=bool(doubling), **NORMALIZED_SETTINGS)
+        for tier_index, tier in enumerate(harvest.get_seed_tiers(crop_settings)):
+            lifeforce = harvest.get_expected_lifeforce(crop_seeds[rows, tier_index], tier, 0, pack_size[rows],
+                                                       crop_settings)
+            predicted[rows] += lifeforce
+            variances[rows] += lifeforce * tier.base_drop
+    return predicted, variances
+
+
+def validate(settings: Optional[Settings] = None, data_dir: str = harvest_data.DATA_DIR) -> ValidationReport:
+    """
+    Compare the seed and lifeforce models with every level 83 plot and crop of the data
+    :param settings: The settings with the constants to validate (the default settings by default); the passives
+        recorded with the data replace the corresponding atlas passives of the settings
+    :param data_dir: The directory with the CSV files
+    :return: The report
+    """
+    settings = settings if settings is not None else Settings()
+    plot_seeds, plot_passives = [], []
+    for dataset in harvest_data.load_datasets("plot_data", data_dir).values():
+        dataset = dataset.view(level=CALIBRATION_LEVEL)
+        plot_seeds.append(np.stack([get_column(dataset, tier, 0) for tier in TIERS], axis=1).astype(np.int64))
+        plot_passives.append(get_passives(dataset))
+    if not plot_seeds:
+        raise ValueError("No plot data in {}".format(data_dir))
+    plot_passives = np.concatenate(plot_passives)
+    fits, residuals, log_likelihoods = validate_seeds(settings, np.concatenate(plot_seeds), plot_passives)
+
+    crop_seeds, crop_pack_size, crop_passives, crop_lifeforce = [], [], [], []
+    for dataset in harvest_data.load_datasets("map_data", data_dir).values():
+        dataset = dataset.view(level=CALIBRATION_LEVEL)
+        if len(dataset) == 0:
+            continue
+        first_rows, crops = get_crops(dataset)
+        lifeforce = np.where(get_sacred_drops(dataset) > 0, 0.0, get_column(dataset, "normalized", 0.0))
+        crop_lifeforce.append(np.bincount(crops, weights=lifeforce, minlength=len(first_rows)))
+        crop_seeds.append(get_crop_seeds(dataset, first_rows))
+        crop_pack_size.append(get_column(dataset, "pack_size", 0)[first_rows].astype(float))
+        crop_passives.append(get_passives(dataset, first_rows))
+    crop_residuals = np.zeros(0)
+    if crop_seeds:
+        crop_passives = np.concatenate(crop_passives)
+        predicted, variances = predict_crop_lifeforce(settings, np.concatenate(crop_seeds),
+                                                      np.concatenate(crop_pack_size), crop_passives)
+        observed = np.concatenate(crop_lifeforce)
+        descriptions, groups = get_passive_groups(crop_passives)
+        residuals += get_group_residuals("lifeforce", descriptions, groups, observed, predicted, variances)
+        crop_residuals = observed - predicted
+    return ValidationReport(fits, residuals, log_likelihoods, crop_residuals)
+
+
+if __name__ == "__main__":
+    print(validate().summary())
@@ -0,0 +1,31 @@
+import math
+
+import numpy as np
+import pytest
+
+import harvest
+from harvest import Settings
+
+
+def test_binomial_pmf_matches_the_formula():
+    for n, p in ((0, 0.3), (1, 0.016), (3, 0.325), (8, 0.75), (23, 0.5)):
+        expected = [math.comb(n, k) * p ** k * (1 - p) ** (n - k) for k in range(n + 1)]
+        assert np.allclose(harvest.get_binomial_pmf(np.arange(n + 1), n, p), expected, rtol=1e-12, atol=0)
+    assert harvest.get_binomial_pmf(4, 3, 0.5) == 0
+    assert harvest.get_binomial_pmf(-1, 3, 0.5) == 0
+
+
+def test_binomial_pmf_accepts_whole_floats_and_rejects_other_trials():
+    assert harvest.get_binomial_pmf(2, 8.0, 0.75) == pytest.approx(harvest.get_binomial_pmf(2, 8, 0.75))
+    for n in (8.5, -1, [3, 2.5]):
+        with pytest.raises(ValueError):
+            harvest.get_binomial_pmf(1, n, 0.5)
+
+
+def test_cached_distributions_are_read_only():
+    harvest.clear_caches()
+    area_iiq, pack_size = harvest.get_area_stats(Settings())
+    distribution = harvest.get_crop_value_distribution_directly(area_iiq, pack_size, 0.1, Settings())
+    with pytest.raises(ValueError):
+        distribution.probabilities[0] = 1.0
+
@@ -0,0 +1,49 @@
+import dataclasses
+import itertools
+
+import numpy as np
+
+import harvest
+import harvest_batch
+from harvest import Settings
+from harvest_presets import BASE_NO_ATLAS_SETTINGS, GRAND_DESIGN_ATLAS_SETTINGS, REGULAR_ATLAS_SETTINGS, \
+    WANDERING_PATH_ATLAS_SETTINGS
+
+PRESETS = (BASE_NO_ATLAS_SETTINGS, REGULAR_ATLAS_SETTINGS, GRAND_DESIGN_ATLAS_SETTINGS, WANDERING_PATH_ATLAS_SETTINGS)
+SEXTANTS = ({}, {"yellow_sextant": True}, {"purple_sextant": True}, {"blue_sextant": True},
+            {"blue_sextant": True, "sextant_reroll_implementation": True})
+
+
+def get_scenarios():
+    scenarios = []
+    for preset, sextant, quantity, (t2_n, t3_n) in itertools.product(PRESETS, SEXTANTS, (0, 100),
+                                                                    ((8, 3), (12, 5))):
+        scenarios.append(dataclasses.replace(preset, base_map_quantity=quantity, t2_binom_n=t2_n, t3_binom_n=t3_n,
+                                             **sextant))
+    return scenarios
+
+
+def test_batch_matches_harvest_for_every_scenario():
+    scenarios = get_scenarios()
+    expected = [harvest.get_overall_map_value(settings) for settings in scenarios]
+    assert np.allclose(harvest_batch.get_overall_map_values(scenarios), expected, rtol=1e-12, atol=0)
+
+
+def test_chunks_and_columns_give_the_same_values():
+    scenarios = get_scenarios()
+    values = harvest_batch.get_overall_map_values(scenarios)
+    assert np.allclose(harvest_batch.get_overall_map_values(scenarios, chunk_size=7), values, rtol=1e-12, atol=0)
+    columns = {"base_map_quantity": np.arange(0, 120, 20), "yellow_sextant": np.arange(6) % 2 == 0}
+    expected = [harvest.get_overall_map_value(Settings(base_map_quantity=int(quantity), yellow_sextant=bool(sextant)))
+                for quantity, sextant in zip(*columns.values())]
+    assert np.allclose(harvest_batch.get_overall_map_values(columns), expected, rtol=1e-12, atol=0)
+
+
+def test_crop_rotation_rows_fall_back_to_harvest():
+    scenarios = [Settings(), Settings(crop_rotation=True), Settings(crop_rotation=True, yellow_sextant=True)]
+    expected = [harvest.get_overall_map_value(settings) for settings in scenarios]
+    assert np.allclose(harvest_batch.get_overall_map_values(scenarios), expected, rtol=1e-12, atol=0)
+
+
+def test_empty_table():
+    assert len(harvest_batch.get_overall_map_values([])) == 0
@@ -0,0 +1,27 @@
+import pytest
+
+import harvest_benchmark
+
+
+def test_optimized_code_matches_the_reference():
+    errors = harvest_benchmark.run_checks(harvest_benchmark.SUPPORT_SIZES[:1])
+    assert errors
+    assert max(errors.values()) <= harvest_benchmark.CHECK_TOLERANCE
+
+
+def test_reference_binomial():
+    assert harvest_benchmark.reference_binomial_pmf(1, 3, 0.5) == pytest.approx(0.375)
+
+
+def test_baselines_skip_other_machines_and_failed_runs():
+    runs = [{"machine": "a", "times": {"x": 1.0}}, {"machine": "a", "times": {"x": 3.0}, "passed": True},
+            {"machine": "a", "times": {"x": 100.0}, "passed": False}, {"machine": "b", "times": {"x": 50.0}},
+            {"machine": "a", "times": {"x": 2.0, "y": 5.0}, "passed": True}]
+    assert harvest_benchmark.get_baselines(runs, "a") == {"x": 2.0, "y": 5.0}
+    assert harvest_benchmark.get_baselines(runs, "a", window=1) == {"x": 2.0, "y": 5.0}
+
+
+def test_cold_start_is_within_budget_without_scipy():
+    cold_start, scipy_loaded = harvest_benchmark.measure_cold_start(repeats=1)
+    assert not scipy_loaded
+    assert cold_start < harvest_benchmark.COLD_START_BUDGET
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import harvest
+import harvest_bootstrap
+import harvest_calibration
+from harvest import Settings
+
+SCENARIOS = {"default": Settings(), "yellow": Settings(yellow_sextant=True)}
+
+
+@pytest.fixture(scope="module")
+def data():
+    return harvest_calibration.load_calibration_data()
+
+
+def test_replicates_are_reproducible(data):
+    options = dict(max_replicates=32, fields=harvest_bootstrap.LOW_CONFIDENCE_FIELDS, data=data, seed=3, processes=1,
+                   batch_size=8)
+    result = harvest_bootstrap.bootstrap(SCENARIOS, **options)
+    assert len(result) == 32 and result.values.shape == (32, 2)
+    assert np.array_equal(harvest_bootstrap.bootstrap(SCENARIOS, **options).values, result.values)
+
+    # Every replicate is the map value with its refitted constants
+    constants = {name: result.constants[name][0] for name in harvest_bootstrap.LOW_CONFIDENCE_FIELDS}
+    settings = Settings(yellow_sextant=True, **constants)
+    assert result.get_values("yellow")[0] == pytest.approx(harvest.get_overall_map_value(settings))
+
+    low, high = result.interval("default")
+    assert low < np.median(result.get_values("default")) < high
+    assert np.allclose(result.rank_probabilities().sum(axis=1), 1)
+    assert 0 <= result.win_probability("yellow", "default") <= 1
+
+
+def test_percentile_interval():
+    assert harvest_bootstrap.get_percentile_interval(np.arange(101.0), 0.9) == pytest.approx((5.0, 95.0))
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import harvest_cache
+from harvest_cache import LRUCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache("test", maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    info = cache.info()
+    assert (info.hits, info.evictions, info.currsize) == (1, 1, 2)
+    assert cache.get("b", "missing") == "missing"
+
+
+def test_values_are_computed_once():
+    cache = LRUCache("test")
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("key", lambda: calls.append(1) or len(calls)) == 1
+    assert len(calls) == 1
+    cache.clear()
+    assert len(cache) == 0 and cache.info().hits == 0
+
+
+def test_threads_share_the_cache():
+    cache = LRUCache("test", maxsize=50)
+
+    def work():
+        for key in range(200):
+            assert cache.get_or_compute(key % 60, lambda key=key: key % 60) == key % 60
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) <= 50
+
+
+def test_the_size_must_be_positive():
+    with pytest.raises(ValueError):
+        LRUCache("test", maxsize=0)
+
+
+def test_the_fingerprint_changes_with_the_model_code(tmp_path, monkeypatch):
+    for name in harvest_cache.MODEL_FILES:
+        (tmp_path / name).write_text("# {}\n".format(name))
+    monkeypatch.setattr(harvest_cache, "BASE_DIR", str(tmp_path))
+    fingerprint = harvest_cache.get_model_fingerprint.__wrapped__()
+    (tmp_path / "harvest_rotation.py").write_text("# changed\n")
+    assert harvest_cache.get_model_fingerprint.__wrapped__() != fingerprint
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import harvest_calibration
+
+
+@pytest.fixture(scope="module")
+def calibration():
+    return harvest_calibration.calibrate()
+
+
+def test_binomial_p_without_multipliers_is_the_success_rate():
+    p = harvest_calibration.fit_binomial_p(np.array([30.0, 10.0]), np.array([100.0, 100.0]), np.array([1.0, 1.0]))
+    assert p == pytest.approx(0.2, abs=1e-12)
+
+
+def test_binomial_fit_recovers_the_distribution():
+    rng = np.random.default_rng(0)
+    multipliers = np.where(np.arange(20000) % 2 == 0, 1.0, 1.3)
+    counts = rng.binomial(8, 0.3 * multipliers)
+    n, p, p_error = harvest_calibration.fit_binomial(counts, multipliers)
+    assert n == 8
+    assert 0 < p_error < 0.01
+    assert abs(p - 0.3) < 4 * p_error
+    assert harvest_calibration.fit_binomial(counts, multipliers, 8)[:2] == (n, pytest.approx(p))
+
+
+def test_calibrated_constants_have_errors(calibration):
+    for name in harvest_calibration.CALIBRATED_FIELDS:
+        estimate = calibration.estimates[name]
+        assert estimate.samples > 0
+        if name.endswith("_binom_n"):
+            assert estimate.value == int(estimate.value)
+        else:
+            assert 0 < estimate.standard_error < abs(estimate.value)
+        assert getattr(calibration.settings, name) == estimate.value
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import harvest
+import harvest_cli
+from harvest import Settings
+
+
+@pytest.mark.parametrize("overrides", [
+    [], {"unknown": 1}, {"yellow_sextant": 1}, {"map_quality": 1.5}, {"map_quality": True}, {"t2_lifeforce": "18"},
+    {"increased_quantity": -1}, {"t2_lifeforce": -0.5}, {"t2_binom_p": 1.01}, {"base_sacred_grove_chance": -0.1},
+    {"t1_crop_rotation_upgrade_chance": 2}, {"t3_binom_n": 3.5}, {"t2_binom_n": -8}, {"t2_lifeforce": float("nan")},
+    {"reduced_blue_chance": 150}, {"reduced_yellow_chance": 100, "reduced_purple_chance": 100,
+                                   "reduced_blue_chance": 100},
+    {"base_three_harvest_chance": 0.7}, {"increased_t3_crop_chance": 400}, {"t4_seed_chance": 0.7},
+    {"base_sacred_grove_chance": 0.9},
+])
+def test_invalid_overrides_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        harvest_cli.validate_overrides(overrides)
+
+
+def test_valid_overrides_are_normalized():
+    overrides = harvest_cli.validate_overrides({"t2_binom_n": 12.0, "t2_binom_p": 1, "increased_t3_crop_chance": 130,
+                                                "yellow_sextant": True})
+    assert overrides == {"t2_binom_n": 12, "t2_binom_p": 1, "increased_t3_crop_chance": 130, "yellow_sextant": True}
+    assert isinstance(overrides["t2_binom_n"], int)
+
+
+def test_percentages_are_not_probabilities():
+    assert "additional_sacred_grove_chance" not in harvest_cli.PROBABILITY_FIELDS
+    assert "t2_binom_p" in harvest_cli.PROBABILITY_FIELDS and "t4_dropchance" in harvest_cli.PROBABILITY_FIELDS
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_lines_are_evaluated_in_order_with_error_flags(workers):
+    lines = ['{"map_quality": 0}', "", '{"t2_binom_n": 2.5}', "not json", '{"yellow_sextant": true}']
+    outputs = list(harvest_cli.evaluate_stream(lines, chunk_size=2, workers=workers))
+    assert [is_error for _, is_error in outputs] == [False, True, True, False]
+    assert json.loads(outputs[0][0])["value"] == pytest.approx(harvest.get_overall_map_value(Settings(map_quality=0)))
+    assert json.loads(outputs[1][0])["line"] == 3
+    assert json.loads(outputs[2][0])["line"] == 4
+    assert json.loads(outputs[3][0])["value"] == pytest.approx(
+        harvest.get_overall_map_value(Settings(yellow_sextant=True)))
+
+
+def test_main_counts_invalid_lines(tmp_path, capsys):
+    input_path, output_path = tmp_path / "input.jsonl", tmp_path / "output.jsonl"
+    input_path.write_text('{}\n{"map_quality": -1}\n')
+    assert harvest_cli.main([str(input_path), "-o", str(output_path)]) == 1
+    assert len(output_path.read_text().splitlines()) == 2
+    assert "1 invalid lines" in capsys.readouterr().err
+    input_path.write_text('{}\n')
+    assert harvest_cli.main([str(input_path), "-o", str(output_path)]) == 0
+
+
+def test_main_stops_quietly_when_the_output_is_closed():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, "-m", "harvest"], cwd=root, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.stdin.write(b"{}\n" * 20000)
+    process.stdin.close()
+    assert json.loads(process.stdout.readline())["value"] > 0
+    process.stdout.close()
+    assert process.wait(timeout=60) == 0
+    assert b"Error" not in process.stderr.read()
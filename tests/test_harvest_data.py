@@ -0,0 +1,42 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import harvest_data
+
+
+def copy_data(tmp_path):
+    shutil.copy(harvest_data.get_csv_path("320", "plot_data"), str(tmp_path))
+    return str(tmp_path)
+
+
+def test_columns_match_the_csv(tmp_path):
+    data_dir = copy_data(tmp_path)
+    dataset = harvest_data.load_dataset("320", "plot_data", data_dir)
+    frame = pd.read_csv(harvest_data.get_csv_path("320", "plot_data", data_dir), keep_default_na=False)
+    assert len(dataset) == len(frame)
+    # Rows are sorted by level and plot, so compare them in the order of the CSV
+    order = np.argsort(dataset[harvest_data.ROW_COLUMN], kind="stable")
+    for name in ("t1", "t2", "t3", "t4", "quantity", "pack_size"):
+        assert np.array_equal(np.asarray(dataset[name])[order], frame[name].to_numpy())
+    assert list(dataset.labels("type")[order]) == list(frame["type"])
+
+
+def test_views_select_rows(tmp_path):
+    dataset = harvest_data.load_dataset("320", "plot_data", copy_data(tmp_path))
+    view = dataset.view(level=83, plot=1)
+    assert len(view) == np.sum((np.asarray(dataset["level"]) == 83) & (np.asarray(dataset["plot"]) == 1)) > 0
+    assert np.all(np.asarray(view["plot"]) == 1)
+
+
+def test_changed_files_are_parsed_again(tmp_path):
+    data_dir = copy_data(tmp_path)
+    path = harvest_data.get_csv_path("320", "plot_data", data_dir)
+    length = len(harvest_data.load_dataset("320", "plot_data", data_dir))
+    with open(path) as file:
+        last_line = file.read().splitlines()[-1]
+    with open(path, "a") as file:
+        file.write("{},{}\n".format(length, last_line.split(",", 1)[1]))
+    dataset = harvest_data.load_dataset("320", "plot_data", data_dir)
+    assert len(dataset) == length + 1
@@ -0,0 +1,52 @@
+import dataclasses
+
+import pytest
+
+import harvest
+from harvest import Settings
+from harvest_graph import SettingsGraph
+
+
+def test_updates_give_the_values_of_the_model():
+    graph = SettingsGraph(Settings())
+    settings = Settings()
+    for changes in ({"yellow_sextant": True}, {"map_quality": 0}, {"yellow_sextant": False, "blue_sextant": True},
+                    {"additional_sacred_grove_chance": 10}, {"yellow_value": 0.3}):
+        graph.update(**changes)
+        settings = dataclasses.replace(settings, **changes)
+        assert graph.get("map_value") == pytest.approx(harvest.get_overall_map_value(settings), rel=1e-12)
+
+
+def test_only_affected_nodes_are_recomputed():
+    graph = SettingsGraph(Settings())
+    graph.get("map_value")
+    graph.update(additional_sacred_grove_chance=10)
+    graph.get("map_value")
+    assert "crop_pair_value" not in graph.recomputed and "map_value" in graph.recomputed
+    # Moving the sextant keeps the color distributions, which only depend on whether there is a sextant
+    graph.update(yellow_sextant=True)
+    graph.get("map_value")
+    graph.update(yellow_sextant=False, blue_sextant=True)
+    graph.get("map_value")
+    assert not set(graph.recomputed) & {"yellow_distribution", "purple_distribution", "blue_distribution"}
+    assert "crop_pair_value" in graph.recomputed
+
+
+def test_color_distributions_record_the_fields_harvest_reads():
+    graph = SettingsGraph(Settings())
+    graph.get("map_value")
+    fields = graph.nodes["yellow_distribution"].fields
+    assert set(harvest.CROP_VALUE_FIELDS) | {"yellow_value"} <= set(fields)
+    assert not set(fields) & {"yellow_sextant", "purple_sextant", "blue_sextant"}
+    graph.update(sacred_blossom_value=100)
+    assert graph.get("map_value") == pytest.approx(
+        harvest.get_overall_map_value(Settings(sacred_blossom_value=100)), rel=1e-12)
+    assert "yellow_distribution" in graph.recomputed
+
+
+def test_unknown_names_are_rejected():
+    graph = SettingsGraph(Settings())
+    with pytest.raises(ValueError):
+        graph.update(unknown=1)
+    with pytest.raises(ValueError):
+        graph.get("unknown")
@@ -0,0 +1,22 @@
+import pytest
+
+import harvest
+import harvest_optimizer
+from harvest import Settings
+
+
+@pytest.mark.parametrize("budget", [0, 3, 8])
+def test_search_finds_the_best_allocation(budget):
+    base = Settings(yellow_sextant=True)
+    exhaustive = harvest_optimizer.optimize_allocation(base, budget, exhaustive=True)
+    searched = harvest_optimizer.optimize_allocation(base, budget)
+    assert exhaustive.points <= budget and searched.points <= budget
+    assert searched.value == pytest.approx(exhaustive.value, rel=1e-9)
+    assert exhaustive.value == pytest.approx(harvest.get_overall_map_value(exhaustive.settings), rel=1e-9)
+
+
+def test_incremental_evaluator_reuses_crop_pair_values():
+    evaluator = harvest_optimizer.IncrementalEvaluator()
+    for settings in (Settings(), Settings(additional_sacred_grove_chance=0), Settings(bumper_crop=False)):
+        assert evaluator.evaluate(settings) == pytest.approx(harvest.get_overall_map_value(settings))
+    assert evaluator.reused == 2
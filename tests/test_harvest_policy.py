@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+import harvest
+import harvest_policy
+from harvest import Settings
+
+ROTATION_SETTINGS = Settings(crop_rotation=True)
+
+
+@pytest.fixture(scope="module")
+def rotation_table():
+    area_iiq, pack_size = harvest.get_area_stats(ROTATION_SETTINGS)
+    return harvest_policy.solve_policy(area_iiq, pack_size, ROTATION_SETTINGS)
+
+
+def test_without_crop_rotation_the_more_valuable_crop_is_harvested():
+    area_iiq, pack_size = harvest.get_area_stats(Settings())
+    table = harvest_policy.solve_policy(area_iiq, pack_size, Settings())
+    assert not table.thresholds
+    # A T4 seed is worth much more than anything else, whatever the color
+    assert table.choose("blue", [1, 0, 0, 22], "yellow", [0, 3, 6, 14]) == 0
+    assert table.choose("yellow", [0, 3, 6, 14], "blue", [1, 0, 0, 22]) == 1
+    # Yellow lifeforce is worth the most per unit, so equal crops favor yellow
+    assert table.choose("purple", [0, 0, 0, 23], "yellow", [0, 0, 0, 23]) == 1
+
+
+def test_the_last_pair_of_a_rotation_grove_is_decided_by_value(rotation_table):
+    assert rotation_table.thresholds
+    assert rotation_table.choose("blue", [1, 0, 0, 22], "yellow", [0, 0, 0, 23]) == 0
+    assert rotation_table.choose("purple", [0, 0, 0, 23], "yellow", [0, 0, 0, 23]) == 1
+
+
+def test_unreachable_states_are_rejected(rotation_table):
+    with pytest.raises(ValueError):
+        rotation_table.choose("yellow", [0, 0, 0, 23], "blue", [0, 0, 0, 23], remaining_pairs=[("yellow", "blue")],
+                              harvested_colors=["yellow"] * 10)
+
+
+def test_saved_tables_round_trip(rotation_table, tmp_path):
+    path = str(tmp_path / "table.npz")
+    with open(path, "wb") as file:
+        harvest_policy.save_policy_table(rotation_table, file)
+    loaded = harvest_policy.load_policy_table(path)
+    assert loaded.crop_rotation
+    assert np.array_equal(loaded.score_vectors, rotation_table.score_vectors)
+    assert loaded.thresholds == rotation_table.thresholds
+
+
+def test_saved_tables_are_reused_until_the_model_changes(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    harvest_policy.policy_table_cache.clear()
+    table = harvest_policy.get_policy_table(ROTATION_SETTINGS, cache_dir)
+    [saved] = os.listdir(cache_dir)
+    assert saved.endswith(".npz")
+
+    harvest_policy.policy_table_cache.clear()
+    monkeypatch.setattr(harvest_policy, "solve_policy", lambda *args: pytest.fail("The saved table was not used"))
+    assert harvest_policy.get_policy_table(ROTATION_SETTINGS, cache_dir).thresholds == table.thresholds
+
+    # Tables solved by another version of the model code are not loaded
+    harvest_policy.policy_table_cache.clear()
+    monkeypatch.setattr(harvest_policy, "get_model_fingerprint", lambda: "another model")
+    area_iiq, pack_size = harvest.get_area_stats(ROTATION_SETTINGS)
+    key = (area_iiq, pack_size, ROTATION_SETTINGS.frozen(harvest_policy.harvest_rotation.CROP_ROTATION_FIELDS
+                                                         + ("crop_rotation",)))
+    assert os.path.basename(harvest_policy.get_policy_path(cache_dir, key)) != saved
+    with pytest.raises(pytest.fail.Exception):
+        harvest_policy.get_policy_table(ROTATION_SETTINGS, cache_dir)
+    harvest_policy.policy_table_cache.clear()
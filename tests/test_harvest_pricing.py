@@ -0,0 +1,27 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import harvest
+import harvest_pricing
+from harvest import Settings
+
+SCENARIOS = [Settings(), Settings(yellow_sextant=True), Settings(blue_sextant=True, sextant_reroll_implementation=True),
+             Settings(heart_of_the_grove=False, reduced_blue_chance=45)]
+PRICES = [{}, {"yellow_value": 0.05, "blue_value": 0.2}, {"purple_value": 0.5, "sacred_blossom_value": 10.0}]
+
+
+@pytest.mark.parametrize("overrides", PRICES)
+def test_repricing_matches_the_model(overrides):
+    for settings in SCENARIOS:
+        repriced = dataclasses.replace(settings, **overrides)
+        value = harvest_pricing.reprice(harvest_pricing.compile_scenario(settings), harvest_pricing.get_prices(repriced))
+        assert float(value) == pytest.approx(harvest.get_overall_map_value(repriced), rel=1e-9)
+
+
+def test_stacked_scenarios_are_repriced_together():
+    compiled = harvest_pricing.stack_scenarios([harvest_pricing.compile_scenario(settings) for settings in SCENARIOS])
+    prices = harvest_pricing.get_prices(Settings(yellow_value=0.2))
+    expected = [harvest.get_overall_map_value(dataclasses.replace(settings, **prices)) for settings in SCENARIOS]
+    assert np.allclose(harvest_pricing.reprice(compiled, prices), expected, rtol=1e-9, atol=0)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import harvest
+import harvest_profile
+from harvest import Settings
+
+
+def test_profiling_counts_calls_and_restores_the_functions():
+    originals = {name: harvest_profile.get_target(name)[0].__dict__[harvest_profile.get_target(name)[1]]
+                 for names in harvest_profile.STAGES.values() for name in names}
+    harvest.clear_caches()
+    with harvest_profile.profile() as profiler:
+        value = harvest.get_overall_map_value(Settings())
+        with pytest.raises(ValueError):
+            harvest_profile.enable()
+    assert value == pytest.approx(harvest.get_overall_map_value(Settings()))
+    for name, original in originals.items():
+        target, attribute = harvest_profile.get_target(name)
+        assert target.__dict__[attribute] is original
+    assert harvest_profile.active_profiler is None
+
+    stats = profiler.stats
+    assert stats["get_overall_map_value"].calls == 1
+    assert stats["get_crop_value_distribution_directly"].calls >= 3
+    assert stats["get_overall_map_value"].total_time >= stats["get_crop_pair_value"].total_time
+    assert 0 <= stats["get_overall_map_value"].own_time <= stats["get_overall_map_value"].total_time
+    assert stats["get_crop_value_distribution_directly"].max_size > 0
+    assert "get_crop_pair_value" in profiler.summary()
+
+
+def test_cache_statistics_start_when_profiling_starts():
+    harvest.get_overall_map_value(Settings())
+    with harvest_profile.profile() as profiler:
+        harvest.get_overall_map_value(Settings())
+    cache_stats = profiler.get_cache_stats()
+    assert all(stats["misses"] == 0 for stats in cache_stats.values())
+    assert sum(stats["hits"] for stats in cache_stats.values()) > 0
+
+
+def test_chrome_trace_export(tmp_path):
+    with harvest_profile.profile() as profiler:
+        harvest.get_overall_map_value(Settings())
+    with pytest.raises(ValueError):
+        profiler.export_chrome_trace(str(tmp_path / "trace.json"))
+
+    harvest.clear_caches()
+    with harvest_profile.profile(trace=True, max_events=5) as profiler:
+        harvest.get_overall_map_value(Settings())
+    profiler.export_chrome_trace(str(tmp_path / "trace.json"))
+    with open(str(tmp_path / "trace.json")) as file:
+        trace = json.load(file)
+    assert len(trace["traceEvents"]) == 5 and profiler.dropped_events > 0
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in trace["traceEvents"])
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import harvest
+import harvest_risk
+from harvest import Settings
+
+
+@pytest.mark.parametrize("settings", [Settings(), Settings(yellow_sextant=True), Settings(heart_of_the_grove=False)])
+def test_map_distribution_has_the_mean_of_the_model(settings):
+    distribution = harvest_risk.get_map_value_distribution(settings, grid=0.01)
+    assert np.sum(distribution.probabilities) == pytest.approx(1)
+    assert distribution.mean() == pytest.approx(harvest.get_overall_map_value(settings), rel=1e-3)
+
+
+def test_maps_without_a_grove_are_worth_nothing():
+    settings = Settings(additional_sacred_grove_chance=0, additional_extra_content_chance=0)
+    distribution = harvest_risk.get_map_value_distribution(settings)
+    no_grove = np.sum(distribution.probabilities[distribution.support == 0])
+    assert no_grove == pytest.approx(1 - harvest.get_harvest_spawn_chance(settings))
+
+
+def test_spawn_chances_above_one_are_capped():
+    settings = Settings(additional_sacred_grove_chance=80, additional_extra_content_chance=50)
+    assert harvest.get_harvest_spawn_chance(settings) > 1
+    distribution = harvest_risk.get_map_value_distribution(settings)
+    assert np.all(distribution.probabilities >= 0)
+    assert np.sum(distribution.probabilities[distribution.support == 0]) == 0
+    assert np.sum(distribution.probabilities) == pytest.approx(1)
+
+
+def test_invalid_settings_are_rejected():
+    for settings in (Settings(crop_rotation=True), Settings(base_three_harvest_chance=0.7),
+                     Settings(base_sacred_grove_chance=-1, additional_sacred_grove_chance=0,
+                              additional_extra_content_chance=0)):
+        with pytest.raises(ValueError):
+            harvest_risk.get_map_value_distribution(settings)
+
+
+def test_session_distribution_adds_independent_maps():
+    settings = Settings()
+    map_distribution = harvest_risk.get_map_value_distribution(settings)
+    session = harvest_risk.get_session_value_distribution(settings, 50)
+    assert session.mean() == pytest.approx(50 * map_distribution.mean(), rel=1e-3)
+    assert session.std() == pytest.approx(np.sqrt(50) * map_distribution.std(), rel=1e-2)
+    summary = harvest_risk.summarize(session, cost=session.mean())
+    assert summary.mean == pytest.approx(0, abs=1e-6 * session.mean())
+    assert summary.percentiles[5] < 0 < summary.percentiles[95]
+    with pytest.raises(ValueError):
+        harvest_risk.get_session_value_distribution(settings, 0)
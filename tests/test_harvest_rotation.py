@@ -0,0 +1,40 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import harvest
+import harvest_rotation
+import harvest_simulation
+from harvest import Settings
+
+SETTINGS = Settings(crop_rotation=True, guaranteed_harvest_spawn=True)
+
+
+def test_dynamic_program_matches_the_simulation():
+    # The simulation harvests the pairs in order and chooses the more valuable crop
+    area_iiq, pack_size = harvest.get_area_stats(SETTINGS)
+    expected = harvest_rotation.get_crop_rotation_grove_value(area_iiq, pack_size, SETTINGS, optimal_order=False,
+                                                              optimal_choices=False)
+    values = harvest_simulation.simulate_map_values(SETTINGS, 200000, seed=1)
+    assert abs(np.mean(values) - expected) < 4 * np.std(values) / np.sqrt(len(values))
+
+
+def test_optimal_strategies_are_at_least_as_good():
+    area_iiq, pack_size = harvest.get_area_stats(SETTINGS)
+    values = {(order, choices): harvest_rotation.get_crop_rotation_grove_value(area_iiq, pack_size, SETTINGS, order,
+                                                                               choices)
+              for order in (False, True) for choices in (False, True)}
+    assert values[True, True] >= max(values[False, True], values[True, False]) - 1e-9
+    assert min(values[False, True], values[True, False]) >= values[False, False] - 1e-9
+    assert harvest.get_sacred_grove_value(None, SETTINGS) == pytest.approx(values[True, True])
+
+
+def test_without_upgrades_the_grove_is_independent_pairs():
+    settings = dataclasses.replace(SETTINGS, t1_crop_rotation_upgrade_chance=0.0, t2_crop_rotation_upgrade_chance=0.0,
+                                   t3_crop_rotation_upgrade_chance=0.0)
+    area_iiq, pack_size = harvest.get_area_stats(settings)
+    # Crop rotation groves only contain T1 plants, which never upgrade here
+    t1_only = dataclasses.replace(settings, crop_rotation=False, t4_seed_chance=0.0, t3_binom_p=0.0, t2_binom_p=0.0)
+    expected = harvest.get_sacred_grove_value(harvest.get_crop_pair_value(area_iiq, pack_size, t1_only), t1_only)
+    assert harvest_rotation.get_crop_rotation_grove_value(area_iiq, pack_size, settings) == pytest.approx(expected)
@@ -0,0 +1,56 @@
+import dataclasses
+
+import pytest
+
+import harvest
+import harvest_sensitivity
+from harvest import Settings
+
+
+def test_derivatives_match_finite_differences():
+    settings = Settings(yellow_sextant=True)
+    fields = ["additional_sacred_grove_chance", "base_four_harvest_chance", "yellow_value", "t3_lifeforce",
+              "increased_quantity", "t4_seed_chance"]
+    sensitivity = harvest_sensitivity.get_sensitivity(settings, fields)
+    assert sensitivity.value == pytest.approx(harvest.get_overall_map_value(settings))
+    assert sensitivity.methods["additional_sacred_grove_chance"] == harvest_sensitivity.ANALYTIC
+    assert sensitivity.methods["increased_quantity"] == harvest_sensitivity.UNIT
+    for name in fields:
+        value = getattr(settings, name)
+        step = 1 if isinstance(value, int) else 1e-3 * value
+        low = value if isinstance(value, int) else value - step
+        difference = harvest.get_overall_map_value(dataclasses.replace(settings, **{name: low + step})) - \
+            harvest.get_overall_map_value(dataclasses.replace(settings, **{name: low}))
+        assert sensitivity.derivatives[name] == pytest.approx(difference / step, rel=1e-3, abs=1e-9)
+
+
+def test_upgrade_values_are_changes_of_the_map_value():
+    settings = Settings()
+    sensitivity = harvest_sensitivity.get_sensitivity(settings, fields=[])
+    base_value = harvest.get_overall_map_value(settings)
+    for name, overrides in harvest_sensitivity.UPGRADES.items():
+        expected = harvest.get_overall_map_value(dataclasses.replace(settings, **overrides)) - base_value
+        assert sensitivity.upgrades[name] == pytest.approx(expected, abs=1e-9)
+    assert sensitivity.upgrades["bumper_crop"] == 0   # Already in the default settings
+
+
+def test_results_are_plain_floats():
+    for settings in (Settings(), Settings(crop_rotation=True)):
+        sensitivity = harvest_sensitivity.get_sensitivity(settings, ["yellow_value", "base_sacred_grove_chance"])
+        values = [sensitivity.value] + list(sensitivity.derivatives.values()) + list(sensitivity.upgrades.values())
+        assert all(type(value) is float for value in values)
+
+
+def test_crop_rotation_uses_forward_differences():
+    settings = Settings(crop_rotation=True)
+    sensitivity = harvest_sensitivity.get_sensitivity(settings, ["yellow_value"], upgrades={})
+    assert sensitivity.methods["yellow_value"] == harvest_sensitivity.FORWARD
+    step = harvest_sensitivity.RELATIVE_STEP * settings.yellow_value
+    expected = (harvest.get_overall_map_value(dataclasses.replace(settings, yellow_value=settings.yellow_value + step))
+                - harvest.get_overall_map_value(settings)) / step
+    assert sensitivity.derivatives["yellow_value"] == pytest.approx(expected)
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        harvest_sensitivity.get_sensitivity(Settings(), ["yellow_sextant"])
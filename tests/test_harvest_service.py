@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+import harvest
+import harvest_cli
+import harvest_service
+from harvest import Settings
+
+
+def run_service(coroutine_function, **options):
+    async def run():
+        service = harvest_service.EvaluationService(**options)
+        await service.start()
+        try:
+            return await coroutine_function(service)
+        finally:
+            await service.stop()
+    return asyncio.run(run())
+
+
+def post(service, overrides):
+    return harvest_service.handle_request(service, "POST", "/evaluate", json.dumps(overrides).encode())
+
+
+def test_concurrent_requests_are_evaluated_in_batches():
+    qualities = list(range(20)) * 2
+
+    async def evaluate_all(service):
+        results = await asyncio.gather(*[post(service, {"map_quality": quality}) for quality in qualities])
+        return results, service.get_metrics()
+
+    results, metrics = run_service(evaluate_all, max_wait=0.05)
+    for quality, (status, result) in zip(qualities, results):
+        assert status == 200
+        assert result["value"] == pytest.approx(harvest.get_overall_map_value(Settings(map_quality=quality)))
+    # One warm-up batch, then the requests in few batches where identical requests are evaluated once
+    assert metrics["batches"] <= 3
+    assert metrics["evaluated"] == 1 + len(set(qualities))
+
+
+def test_invalid_requests_are_rejected_before_they_are_queued():
+    async def evaluate_invalid(service):
+        return [await post(service, {"t2_binom_p": 2}), await post(service, {"unknown": 1}),
+                await post(service, {"reduced_blue_chance": 150}),
+                await post(service, {"base_three_harvest_chance": 0.7}),
+                await harvest_service.handle_request(service, "POST", "/evaluate", b"{"), service.batches]
+
+    *responses, batches = run_service(evaluate_invalid)
+    assert [status for status, _ in responses] == [400, 400, 400, 400, 400]
+    assert batches == 1
+
+
+def test_a_failing_request_does_not_fail_its_batch(monkeypatch):
+    evaluate_overrides = harvest_cli.evaluate_overrides
+
+    def fail_on_quality_7(overrides_list):
+        if any(overrides.get("map_quality") == 7 for overrides in overrides_list):
+            raise RuntimeError("Evaluation failed")
+        return evaluate_overrides(overrides_list)
+
+    monkeypatch.setattr(harvest_cli, "evaluate_overrides", fail_on_quality_7)
+
+    async def evaluate_all(service):
+        return await asyncio.gather(*[post(service, {"map_quality": quality}) for quality in (6, 7, 8)],
+                                    return_exceptions=True), service.failed_batches
+
+    (first, failed, last), failed_batches = run_service(evaluate_all, max_wait=0.05)
+    assert first[0] == 200 and last[0] == 200
+    assert isinstance(failed, RuntimeError)
+    assert failed_batches == 1
+
+
+def test_a_full_queue_is_rejected_with_503():
+    async def flood(service):
+        responses = await asyncio.gather(*[post(service, {"map_quality": quality}) for quality in range(6)])
+        return responses, service.get_metrics()
+
+    responses, metrics = run_service(flood, max_wait=0.05, max_queue_size=2)
+    statuses = [status for status, _ in responses]
+    assert statuses.count(200) == 2 and statuses.count(503) == 4
+    assert metrics["rejected"] == 4
@@ -0,0 +1,16 @@
+import pytest
+
+import harvest_simulation
+from harvest import Settings
+
+
+@pytest.mark.parametrize("settings", [Settings(), Settings(purple_sextant=True, heart_of_the_grove=False)])
+def test_simulated_mean_matches_the_model(settings):
+    model, mean, standard_error = harvest_simulation.compare_with_model(settings, 200000, seed=2)
+    assert abs(mean - model) < 4 * standard_error
+
+
+def test_simulation_is_reproducible():
+    values = harvest_simulation.simulate_map_values(Settings(), 1000, seed=5, chunk_size=300)
+    assert (values == harvest_simulation.simulate_map_values(Settings(), 1000, seed=5, chunk_size=300)).all()
+    assert len(values) == 1000 and (values >= 0).all()
@@ -0,0 +1,92 @@
+import multiprocessing
+import sqlite3
+
+import numpy as np
+import pytest
+
+import harvest
+import harvest_store
+from harvest import Settings
+from harvest_store import ResultStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store.sqlite")
+
+
+def test_map_values_are_evaluated_once(path, monkeypatch):
+    scenarios = [Settings(), Settings(yellow_sextant=True), Settings()]
+    expected = [harvest.get_overall_map_value(settings) for settings in scenarios]
+    with ResultStore(path) as store:
+        assert np.allclose(harvest_store.get_overall_map_values(scenarios, store), expected, rtol=1e-12, atol=0)
+        assert store.info().entries == 2
+    monkeypatch.setattr(harvest_store.harvest_batch, "get_overall_map_values",
+                        lambda settings_list: pytest.fail("A stored value was evaluated again"))
+    with ResultStore(path) as store:
+        assert harvest_store.get_overall_map_values(scenarios, store).tolist() == pytest.approx(expected)
+        assert store.hits == 2
+
+
+def test_equal_settings_have_equal_keys():
+    assert harvest_store.get_settings_key(Settings(t2_lifeforce=18)) == \
+        harvest_store.get_settings_key(Settings(t2_lifeforce=18.0))
+    assert harvest_store.get_settings_key(Settings()) != harvest_store.get_settings_key(Settings(map_quality=0))
+
+
+def test_results_of_another_model_are_not_read(path):
+    with ResultStore(path, model="old") as store:
+        store.put("kind", "key", 1.0)
+    with ResultStore(path, model="new") as store:
+        assert store.get("kind", "key") is None
+        assert store.info().stale_entries == 1
+        store.put("kind", "key", 2.0)
+    # Checkouts of both versions can share the store
+    with ResultStore(path, model="old") as store:
+        assert store.get("kind", "key") == 1.0
+
+
+def test_least_recently_used_results_are_evicted(path):
+    value = b"x" * 1000
+    with ResultStore(path, max_bytes=10000) as store:
+        store.put_many("kind", {str(key): value for key in range(8)})
+        store.get("kind", "0")   # The oldest result is used again, so it is kept
+        store.put_many("kind", {str(key): value for key in range(8, 12)})
+        info = store.info()
+        assert info.bytes <= 10000 and info.evictions > 0
+        assert store.get("kind", "0") == value
+        assert store.get("kind", "1") is None
+
+
+def test_lookups_do_not_write(path):
+    with ResultStore(path) as store:
+        store.put("kind", "key", 1.0)
+    connection = sqlite3.connect(path)
+    [(accessed,)] = connection.execute("SELECT accessed FROM results").fetchall()
+    with ResultStore(path) as store:
+        # Another connection holds the write lock, yet lookups still succeed
+        connection.execute("BEGIN IMMEDIATE")
+        store.timeout = 0.1
+        assert store.get("kind", "key") == 1.0
+        connection.execute("COMMIT")
+    # The access time is written when the store is closed
+    assert connection.execute("SELECT accessed FROM results").fetchone()[0] > accessed
+    connection.close()
+
+
+def write_and_read(store, worker):
+    for round_index in range(20):
+        store.put_many("kind", {"{}/{}".format(worker, key): (worker, round_index) for key in range(10)})
+        found = store.get_many("kind", ["{}/{}".format(other, key) for other in range(4) for key in range(10)])
+        assert found["{}/0".format(worker)] == (worker, round_index)
+    store.close()
+    return worker
+
+
+def test_processes_share_the_store(path):
+    store = ResultStore(path)
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        assert sorted(pool.starmap(write_and_read, [(store, worker) for worker in range(4)])) == [0, 1, 2, 3]
+    assert store.get("kind", "3/9") == (3, 19)
+    assert store.info().entries == 40
+    store.close()
@@ -0,0 +1,46 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import harvest
+import harvest_store
+import harvest_sweep
+from harvest import Settings
+
+AXES = {"sextant": [None, "yellow", "blue"], "map_quality": [0, 20]}
+
+
+def get_expected(base):
+    return [harvest.get_overall_map_value(harvest_sweep.apply_axis_value(
+        harvest_sweep.apply_axis_value(base, "sextant", sextant), "map_quality", quality))
+        for sextant, quality in itertools.product(*AXES.values())]
+
+
+def test_sweep_rows_follow_the_axes():
+    result = harvest_sweep.sweep({"a": Settings(), "b": Settings(heart_of_the_grove=False)}, AXES, processes=1)
+    assert len(result) == 12
+    assert list(result.columns["preset"][:6]) == ["a"] * 6
+    assert list(result.columns["sextant"][:3]) == [None, None, "yellow"]
+    expected = get_expected(Settings()) + get_expected(Settings(heart_of_the_grove=False))
+    assert np.allclose(result.values, expected, rtol=1e-12, atol=0)
+    assert len(result.where(preset="b", sextant="blue")) == 2
+
+
+def test_processes_and_store_give_the_same_values(tmp_path):
+    expected = get_expected(Settings())
+    assert np.allclose(harvest_sweep.sweep(Settings(), AXES, processes=2, chunk_size=2).values, expected,
+                       rtol=1e-12, atol=0)
+    with harvest_store.ResultStore(str(tmp_path / "store.sqlite")) as store:
+        harvest_sweep.sweep(Settings(), AXES, processes=1, store=store)
+        assert store.info().entries == 6
+        assert np.allclose(harvest_sweep.sweep(Settings(), AXES, processes=1, store=store).values, expected,
+                           rtol=1e-12, atol=0)
+        assert store.hits == 6
+
+
+def test_unknown_axes_are_rejected():
+    with pytest.raises(ValueError):
+        harvest_sweep.sweep(Settings(), {"unknown": [1]}, processes=1)
+    with pytest.raises(ValueError):
+        harvest_sweep.sweep(Settings(), {"sextant": ["green"]}, processes=1)
@@ -0,0 +1,35 @@
+import math
+
+import numpy as np
+import pytest
+
+import harvest_calibration
+import harvest_validation
+from harvest import Settings
+
+
+def test_calibrated_seeds_fit_at_least_as_well_as_the_defaults():
+    # The seed constants are maximum likelihood estimates
+    default = harvest_validation.validate(Settings())
+    calibrated = harvest_validation.validate(harvest_calibration.calibrate().settings)
+    for tier, fit in calibrated.tiers.items():
+        assert fit.log_likelihood >= default.tiers[tier].log_likelihood - 1e-9
+        assert fit.observed.sum() == fit.plots == pytest.approx(fit.expected.sum())
+        assert 0 <= fit.p_value <= 1
+    assert np.isfinite(calibrated.plot_log_likelihoods).all()
+
+
+def test_chi_square_of_a_histogram():
+    statistic, degrees_of_freedom, p_value = harvest_validation.get_chi_square(np.array([10, 5, 0]),
+                                                                              np.array([5.0, 5.0, 5.0]))
+    assert (statistic, degrees_of_freedom) == (pytest.approx(10.0), 2)
+    assert p_value == pytest.approx(math.exp(-5))   # The chi-square survival function with 2 degrees of freedom
+    assert harvest_validation.get_chi_square(np.array([5, 5]), np.array([5.0, 5.0]))[::2] == (0.0, 1.0)
+
+
+def test_chi_square_pools_small_bins():
+    # The first bins are pooled until 5 plots are expected, and the small last bin joins the previous one
+    statistic, degrees_of_freedom, _ = harvest_validation.get_chi_square(np.array([1, 1, 1, 2, 6, 1]),
+                                                                         np.array([1.0, 1.0, 1.0, 2.0, 5.0, 1.0]))
+    assert (statistic, degrees_of_freedom) == (pytest.approx(1 / 6), 1)
+    assert harvest_validation.get_chi_square(np.array([3, 1]), np.array([2.0, 2.0])) == (0.0, 0, 1.0)